@@ -0,0 +1,196 @@
+"""
+Signal evolution animations.
+
+Each frame is plotSignal's view of the first k measurements, for k every
+`interval` measurements. The frame spectra come from one pass of running
+sums (runningAverages at the frame ends) instead of re-summing every prefix,
+and the noise bands are reduced for all frames at once. Rendering reuses one
+Agg figure per process, updating the line and bands in place, and frames are
+split over a process pool; the RGB frames go straight to the GIF (Pillow) or
+MP4 (ffmpeg) writer in order, so no per-frame image files are written.
+"""
+import os
+import time
+import shutil
+import subprocess
+from multiprocessing import Pool
+
+import numpy as np
+
+from Utilities import runningAverages
+from SpectralGrid import spectralGrid
+
+global TEST_BOOL
+TEST_BOOL = True
+
+_FRAMES = None
+_FIGURE = None
+
+
+def evolutionFrames(n_measurements, interval):
+    """Measurement counts of the frames: interval, 2*interval, ... (as the old PLOT_EVOLUTION loop)."""
+    return np.arange(0, n_measurements, int(interval))[:-1] + int(interval)
+
+
+def _initWorker(frames):
+    global _FRAMES, _FIGURE
+    _FRAMES, _FIGURE = frames, None
+
+
+def _buildFigure(frames):
+    """plotSignal's figure, with artists kept for updating."""
+    from matplotlib.figure import Figure
+    from matplotlib.patches import Rectangle
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+    fig = Figure(figsize=frames['figsize'], facecolor='black', dpi=frames['dpi'])
+    FigureCanvasAgg(fig)
+    ax = fig.add_subplot()
+    ax.set_facecolor('black')
+    x, sigma = frames['axis'], frames['sigma']
+    line, = ax.plot(x, frames['signals'][:, 0], color='white', linewidth=1)
+
+    bands = []
+    for k, (color, label) in enumerate([('red', r'±1σ Noise Level'), ('orange', r'±2σ Noise Level'),
+                                        ('yellow', r'±3σ Noise Level')], start=1):
+        band = Rectangle((0, 0), 1, 0, transform=ax.get_yaxis_transform(), color=color, alpha=0.05, label=label)
+        ax.add_patch(band)
+        bands.append((k, band))
+    mean_line = ax.axhline(0, color='red', linestyle='--', linewidth=1, label='Mean Noise Level', alpha=0.6)
+    ax.axvspan(-sigma, +sigma, color='green', alpha=0.3, label=r'$\pm \sigma_{signal}$ Region')
+
+    ax.set_xlim(x.min(), x.max())
+    ax.set_xlabel('Frequency (MHz)', color='white')
+    ax.set_ylabel('Power (W)', color='white')
+    title = ax.set_title(frames['titles'][0] if frames['titles'] else '', color='white')   # two lines, for the layout
+    for spine in ax.spines.values(): spine.set_color('white')
+    ax.tick_params(colors='white')
+    ax.legend(facecolor='black', labelcolor='white')
+    fig.tight_layout()
+    return fig, ax, line, bands, mean_line, title
+
+
+def _renderFrame(k):
+    """Draw frame k on this process's figure and return it as an RGB array (a palette image for GIFs)."""
+    global _FIGURE
+    if _FIGURE is None:
+        _FIGURE = _buildFigure(_FRAMES)
+    fig, ax, line, bands, mean_line, title = _FIGURE
+
+    signal = _FRAMES['signals'][:, k]
+    mean, std = _FRAMES['means'][k], _FRAMES['stds'][k]
+    line.set_ydata(signal)
+    for n, band in bands:
+        band.set_y(mean - n * std)
+        band.set_height(2 * n * std)
+    mean_line.set_ydata([mean, mean])
+    title.set_text(_FRAMES['titles'][k])
+
+    low, high = min(signal.min(), mean - 3 * std), max(signal.max(), mean + 3 * std)
+    margin = 0.05 * (high - low) or abs(high) * 0.05 or 1
+    ax.set_ylim(low - margin, high + margin)
+
+    fig.canvas.draw()
+    frame = np.asarray(fig.canvas.buffer_rgba())[..., :3].copy()
+    if _FRAMES['palette']:
+        # Quantize here, in parallel, rather than in the (serial) GIF writer
+        from PIL import Image
+        return Image.fromarray(frame).quantize(method=Image.Quantize.FASTOCTREE)
+    return frame
+
+
+def _gifWriter(path, delay):
+    def write(frames):
+        frames = iter(frames)
+        first = next(frames, None)
+        if first is not None:
+            first.save(path, save_all=True, append_images=frames, duration=int(delay), loop=0)
+    return write
+
+
+def _mp4Writer(path, delay):
+    ffmpeg = shutil.which('ffmpeg')
+    if ffmpeg is None:
+        raise RuntimeError("MP4 output needs ffmpeg on the PATH; save as .gif instead")
+
+    def write(frames):
+        proc = None
+        for frame in frames:
+            if proc is None:
+                h, w = frame.shape[:2]
+                proc = subprocess.Popen([ffmpeg, '-y', '-loglevel', 'error', '-f', 'rawvideo', '-pix_fmt', 'rgb24',
+                                         '-s', f'{w}x{h}', '-r', f'{1000 / float(delay):g}', '-i', '-',
+                                         '-vf', 'pad=ceil(iw/2)*2:ceil(ih/2)*2', '-pix_fmt', 'yuv420p',
+                                         '-vcodec', 'libx264', path], stdin=subprocess.PIPE)
+            proc.stdin.write(frame.tobytes())
+        if proc is not None:
+            proc.stdin.close()
+            if proc.wait():
+                raise RuntimeError(f"ffmpeg failed writing {path}")
+    return write
+
+
+def renderEvolution(powers, spectral_axis, title, sigma, central_freq, pressures, interval, path,
+                    delay=1000, sum_data=True, workers=None, dpi=100, figsize=(10, 6)):
+    """
+    Animate the signal plot over growing numbers of measurements.
+
+    Args:
+        powers (np.array): 2D array of power readings (frequencies x measurements).
+        spectral_axis (np.array): 1D array of frequencies in Hz.
+        title (str): Plot title (the frame's measurement count is appended).
+        sigma (float): Width of the highlighted signal region (+/- sigma).
+        central_freq (float): Central frequency of the signal.
+        pressures (np.array): Pressure per measurement (the frame's last one is shown).
+        interval (int): Measurements added per frame.
+        path (str): Output .gif or .mp4 file.
+        delay (int): Milliseconds between frames.
+        sum_data (bool): Sum the measurements (else average), as plotSignal.
+        workers (int): Render processes (default: all cores; 1 renders in-process).
+        dpi (int): Resolution of the frames (plotSignal saves at 300, i.e. 3000x1800 at the default size).
+        figsize (tuple): Figure size in inches.
+
+    Returns:
+        n_frames (int): Number of frames written.
+    """
+    global _FRAMES, _FIGURE
+    if TEST_BOOL:
+        start = time.time()
+
+    ext = os.path.splitext(path)[1].lower()
+    if ext not in ('.gif', '.mp4'):
+        raise ValueError(f"Unsupported animation format: {ext}")
+    write = _gifWriter(path, delay) if ext == '.gif' else _mp4Writer(path, delay)
+
+    ends = evolutionFrames(powers.shape[1], interval)
+    signals = runningAverages(powers, ends, mean=not sum_data)
+    outside = spectralGrid(spectral_axis).outsideMask(central_freq, sigma)
+    frames = {
+        'axis': spectral_axis - central_freq,
+        'signals': signals,
+        'means': np.mean(signals[outside, :], axis=0),
+        'stds': np.std(signals[outside, :], axis=0),
+        'titles': [f"{title} - First {end} Measurements\nFinal Pressure: {np.round(pressures[end - 1], 4)} mbar"
+                   for end in ends],
+        'sigma': sigma,
+        'dpi': dpi,
+        'figsize': figsize,
+        'palette': ext == '.gif',
+    }
+
+    workers = min(workers or os.cpu_count() or 1, max(len(ends), 1))
+    if workers == 1:
+        previous = _FRAMES, _FIGURE
+        _initWorker(frames)
+        try:
+            write(_renderFrame(k) for k in range(len(ends)))
+        finally:
+            _FRAMES, _FIGURE = previous
+    else:
+        with Pool(workers, initializer=_initWorker, initargs=(frames,)) as pool:
+            chunksize = max(1, len(ends) // (4 * workers))
+            write(pool.imap(_renderFrame, range(len(ends)), chunksize=chunksize))
+
+    if TEST_BOOL:
+        print(f"Evolution animation ({len(ends)} frames) took {time.time() - start:.4f} seconds")
+    return len(ends)
@@ -0,0 +1,128 @@
+"""
+Frequency binning: bin edges, binned axes and a prefix-sum pyramid.
+
+binData (Utilities) bins one factor in a single pass. For trying several
+bin factors on the same data, BinPyramid keeps the cumulative sum of the
+powers along the frequency axis; the sum over any bin is then the difference
+of two prefix rows, so every factor costs O(bins x measurements) without
+reading the raw powers again. The common factors are binned up front and
+every factor asked for is kept.
+
+Remainder frequencies that do not fill a last bin are handled as:
+    'drop'   left out (binData's behaviour)
+    'keep'   summed into a smaller last bin
+    'scale'  summed into a last bin that is scaled up to n points
+Optional per-frequency weights (e.g. 0 to leave a spur out) give weighted
+sums and weighted mean frequencies.
+"""
+import numpy as np
+
+from SpectralGrid import spectralGrid
+
+COMMON_FACTORS = (5, 10, 15, 20, 40)
+REMAINDER_MODES = ('drop', 'keep', 'scale')
+
+
+def binEdges(n_freq, n, remainder='drop'):
+    """
+    Row indices where bins start, plus the end of the last bin.
+
+    Args:
+        n_freq (int): Number of frequencies.
+        n (int): Frequencies per bin.
+        remainder (str): One of REMAINDER_MODES.
+
+    Returns:
+        edges (np.array): n_bins + 1 increasing row indices.
+    """
+    if n < 1:
+        raise ValueError(f"Bin factor must be at least 1, got {n}")
+    if remainder not in REMAINDER_MODES:
+        raise ValueError(f"Invalid remainder handling: {remainder}")
+    n_full = n_freq // n
+    edges = np.arange(n_full + 1) * n
+    if remainder != 'drop' and n_freq % n:
+        edges = np.append(edges, n_freq)
+    return edges
+
+
+def binAxis(spectral_axis, n, remainder='drop', weights=None):
+    """Mean (or weighted mean) frequency of each bin."""
+    if weights is None and (remainder == 'drop' or len(spectral_axis) % n == 0):
+        # Same bins binData has always used: shared, built once per axis
+        return spectralGrid(spectral_axis).binned(n).axis.copy()
+
+    edges = binEdges(len(spectral_axis), n, remainder)
+    if len(edges) < 2:
+        return np.zeros(0)
+    if weights is None:
+        return np.add.reduceat(spectral_axis, edges[:-1]) / np.diff(edges)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return (np.add.reduceat(weights * spectral_axis, edges[:-1])
+                / np.add.reduceat(np.asarray(weights, dtype=float), edges[:-1]))
+
+
+def scaleRemainder(binned, edges, n, remainder):
+    """Scale a short last bin up to n points ('scale' mode)."""
+    if remainder == 'scale' and len(edges) > 1 and edges[-1] - edges[-2] != n:
+        binned[-1] *= n / (edges[-1] - edges[-2])
+    return binned
+
+
+class BinPyramid:
+    """
+    Binned views of one (frequencies x measurements) power matrix for any bin
+    factor, from frequency-axis prefix sums. Bin sums are differences of
+    prefix rows, so they match binData to rounding of the column total
+    rather than bit for bit.
+
+    Args:
+        powers (np.array): 2D array of power readings (frequencies x measurements).
+        spectral_axis (np.array): 1D array of frequencies in Hz.
+        weights (np.array): Optional per-frequency weights.
+        factors (tuple): Bin factors to bin up front.
+        remainder (str): Default remainder handling (see REMAINDER_MODES).
+    """
+
+    def __init__(self, powers, spectral_axis, weights=None, factors=COMMON_FACTORS, remainder='drop'):
+        self.spectral_axis = np.asarray(spectral_axis, dtype=float)
+        self.weights = None if weights is None else np.asarray(weights, dtype=float)
+        self.remainder = remainder
+        self.n_meas = powers.shape[1]
+
+        # prefix[k] = sum of the first k frequency rows (row 0 is zero)
+        self.prefix = np.zeros((powers.shape[0] + 1, powers.shape[1]))
+        if self.weights is None:
+            np.cumsum(powers, axis=0, out=self.prefix[1:])
+        else:
+            np.cumsum(powers * self.weights[:, None], axis=0, out=self.prefix[1:])
+
+        self._levels = {}
+        for n in factors:
+            if n <= len(self.spectral_axis):
+                self.bin(n)
+
+    def bin(self, n, remainder=None):
+        """
+        Binned powers and frequencies for bin factor n.
+
+        Returns:
+            binned_powers (np.array): 2D array of binned power values (bins x measurements), read-only.
+            binned_freqs (np.array): 1D array of mean frequencies for each bin, read-only.
+        """
+        remainder = remainder or self.remainder
+        key = (n, remainder)
+        if key not in self._levels:
+            edges = binEdges(len(self.spectral_axis), n, remainder)
+            binned = self.prefix[edges[1:]] - self.prefix[edges[:-1]]
+            binned = scaleRemainder(binned, edges, n, remainder)
+            axis = binAxis(self.spectral_axis, n, remainder, self.weights)
+            binned.setflags(write=False)
+            axis.setflags(write=False)
+            self._levels[key] = (binned, axis)
+        return self._levels[key]
+
+    @property
+    def factors(self):
+        """Bin factors binned so far."""
+        return sorted({n for n, _ in self._levels})
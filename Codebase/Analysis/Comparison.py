@@ -1,9 +1,10 @@
 """ 
 methods for taking in n measurements and comparing them
 """
-from Utilities import *
-from Graphing import *
-from SignalSim import *
+import os
+
+from Utilities import loadData, binData, subtractBaseline
+from SpectralGrid import spectralGrid
 
 from matplotlib import pyplot as plt
 import numpy as np
@@ -128,14 +129,15 @@ class Comparison:
 
         for exp in self.refs:
             powers = self.data[exp]['powers']
-            spectral_axis = self.data[exp]['freqs'] - float(self.data[exp]['meta']['Center Frequency (Hz)'])
+            center_freq = float(self.data[exp]['meta']['Center Frequency (Hz)'])
+            spectral_axis = self.data[exp]['freqs'] - center_freq
             sigma = self.processing_settings['sigma']
 
             # Integrate or average across measurements
             signal = powers.sum(axis=1) if sum_data else powers.mean(axis=1)
 
             # Outside-central-region mask for noise statistics
-            outside_mask = (spectral_axis < -sigma) | (spectral_axis > sigma)
+            outside_mask = spectralGrid(self.data[exp]['freqs']).outsideMask(center_freq, sigma)
             signal_mean = np.mean(signal[outside_mask])
             signal_std = np.std(signal[outside_mask])
 
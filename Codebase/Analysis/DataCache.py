@@ -0,0 +1,194 @@
+"""
+Parsed-log cache for loadData.
+
+Entries are content addressed: a log is identified by a BLAKE2b hash of its
+bytes, so a log that is still being recorded (or was edited) never matches an
+old entry, while a copied or touched log reuses the existing one. Hashing a
+multi-GB log is not free, so the hash is remembered per (path, size, mtime)
+in a small index and only recomputed when one of those changes.
+
+Each entry is a folder of .npy arrays plus metadata.json; powers is opened
+with mmap_mode='r', so loading a cached run costs a page-in of whatever is
+actually used instead of a full read.
+
+Location and size are configurable through the environment:
+    HS_CACHE_DIR      cache folder (default ~/.hsreader_cache)
+    HS_CACHE_MAX_GB   total size before least recently used entries are evicted (default 20)
+"""
+import os
+import json
+import shutil
+import hashlib
+
+import numpy as np
+
+CACHE_DIR_ENV = 'HS_CACHE_DIR'
+CACHE_SIZE_ENV = 'HS_CACHE_MAX_GB'
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser('~'), '.hsreader_cache')
+DEFAULT_MAX_GB = 20
+
+_INDEX = 'index.json'
+_ARRAYS = ('powers', 'freqs', 'pressure')
+
+
+def cacheDir():
+    """Cache folder (created on first use)."""
+    path = os.environ.get(CACHE_DIR_ENV) or DEFAULT_CACHE_DIR
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def maxCacheBytes():
+    return int(float(os.environ.get(CACHE_SIZE_ENV, DEFAULT_MAX_GB)) * 2**30)
+
+
+def contentHash(path, block_size=8 * 2**20):
+    """BLAKE2b digest of the file contents."""
+    digest = hashlib.blake2b(digest_size=20)
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _readIndex(cache):
+    try:
+        with open(os.path.join(cache, _INDEX), 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _writeIndex(cache, index):
+    tmp = os.path.join(cache, f'{_INDEX}.{os.getpid()}.tmp')
+    with open(tmp, 'w') as f:
+        json.dump(index, f, indent=1)
+    os.replace(tmp, os.path.join(cache, _INDEX))
+
+
+def cacheKey(path):
+    """
+    Content hash of a log, reusing the remembered hash while the file's
+    path, size and mtime are unchanged.
+
+    Args:
+        path (str): Path to the experiment log.
+
+    Returns:
+        key (str): Hex digest identifying the log contents.
+    """
+    cache = cacheDir()
+    st = os.stat(path)
+    source = os.path.abspath(path)
+    index = _readIndex(cache)
+
+    known = index.get(source)
+    if known and known['size'] == st.st_size and known['mtime_ns'] == st.st_mtime_ns:
+        return known['hash']
+
+    key = contentHash(path)
+    index = _readIndex(cache)   # Re-read: hashing a big log takes a while
+    index[source] = {'size': st.st_size, 'mtime_ns': st.st_mtime_ns, 'hash': key}
+    _writeIndex(cache, index)
+    return key
+
+
+def loadEntry(key):
+    """
+    Open a cached entry.
+
+    Returns:
+        (powers, spectral_axis, pressure, metadata), with powers memory mapped
+        read-only, or None if the entry does not exist.
+    """
+    entry = os.path.join(cacheDir(), key)
+    meta_path = os.path.join(entry, 'metadata.json')
+    if not os.path.isfile(meta_path):
+        return None
+    try:
+        powers = np.load(os.path.join(entry, 'powers.npy'), mmap_mode='r')
+        spectral_axis = np.load(os.path.join(entry, 'freqs.npy'))
+        pressure = np.load(os.path.join(entry, 'pressure.npy'))
+        with open(meta_path, 'r') as f:
+            metadata = json.load(f)
+    except (OSError, ValueError):
+        # Half-deleted or corrupt entry: treat as a miss, it gets rewritten
+        return None
+
+    # metadata.json's mtime is the entry's last use for LRU eviction
+    os.utime(meta_path)
+    return powers, spectral_axis, pressure, metadata
+
+
+def storeEntry(key, powers, spectral_axis, pressure, metadata):
+    """Write an entry (atomically, via a temporary folder) and evict down to the size limit."""
+    cache = cacheDir()
+    entry = os.path.join(cache, key)
+    tmp = f'{entry}.{os.getpid()}.tmp'
+    os.makedirs(tmp, exist_ok=True)
+    try:
+        for name, arr in zip(_ARRAYS, (powers, spectral_axis, pressure)):
+            np.save(os.path.join(tmp, f'{name}.npy'), arr)
+        with open(os.path.join(tmp, 'metadata.json'), 'w') as f:
+            json.dump(metadata, f, indent=4)
+        if os.path.isdir(entry):
+            # Another process stored the same contents first
+            shutil.rmtree(tmp)
+        else:
+            os.replace(tmp, entry)
+    except BaseException:
+        shutil.rmtree(tmp, ignore_errors=True)
+        raise
+    evict(keep=key)
+    return entry
+
+
+def _entries(cache):
+    """(last_used, bytes, key) for every complete entry."""
+    out = []
+    for key in os.listdir(cache):
+        if key.endswith('.tmp'):
+            continue
+        entry = os.path.join(cache, key)
+        meta_path = os.path.join(entry, 'metadata.json')
+        if not os.path.isfile(meta_path):
+            continue
+        size = sum(os.path.getsize(os.path.join(entry, f)) for f in os.listdir(entry))
+        out.append((os.path.getmtime(meta_path), size, key))
+    return out
+
+
+def evict(max_bytes=None, keep=None, folder=None):
+    """
+    Remove least recently used entries until the cache fits in max_bytes.
+
+    Args:
+        max_bytes (int): Size limit (default: HS_CACHE_MAX_GB).
+        keep (str): Key that is never evicted (the entry just written).
+        folder (str): Sub folder of the cache to evict from (e.g. Stages' intermediates)
+            instead of the parsed logs.
+
+    Returns:
+        removed (list): Keys of the evicted entries.
+    """
+    cache = cacheDir() if folder is None else os.path.join(cacheDir(), folder)
+    max_bytes = maxCacheBytes() if max_bytes is None else max_bytes
+    entries = sorted(_entries(cache))
+    total = sum(size for _, size, _ in entries)
+
+    removed = []
+    for _, size, key in entries:
+        if total <= max_bytes:
+            break
+        if key == keep:
+            continue
+        shutil.rmtree(os.path.join(cache, key), ignore_errors=True)
+        total -= size
+        removed.append(key)
+
+    if removed and folder is None:
+        index = _readIndex(cache)
+        _writeIndex(cache, {src: v for src, v in index.items() if v['hash'] not in removed})
+    if removed:
+        print(f"Evicted {len(removed)} cache entries from {cache} (LRU, limit {max_bytes / 2**30:.1f} GB)")
+    return removed
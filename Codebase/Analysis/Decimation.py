@@ -0,0 +1,46 @@
+"""
+Shape-preserving decimation of long series before plotting.
+
+A line drawn at a given resolution only shows, per pixel column, the
+first, lowest, highest and last point that falls in it. minMaxDecimate
+keeps exactly those points for n_buckets columns across the x range
+(equal width in log10(x) for a log axis), so a line plotted from the
+decimated series covers the same pixels as the full one while the point
+count is bounded by 4 * n_buckets whatever the run length.
+"""
+import numpy as np
+
+
+def minMaxDecimate(x, y, n_buckets, log_x=False):
+    """
+    Indices of the first, min, max and last point of each x bucket.
+
+    Args:
+        x (np.array): 1D increasing x values.
+        y (np.array): 1D y values (non-finite values are dropped).
+        n_buckets (int): Buckets across the x range, e.g. the plot width in pixels.
+        log_x (bool): Equal-width buckets in log10(x) (for a log x axis; x <= 0 is dropped).
+
+    Returns:
+        indices (np.array): Sorted indices into x and y to plot.
+    """
+    x, y = np.asarray(x, dtype=float), np.asarray(y, dtype=float)
+    keep = np.isfinite(x) & np.isfinite(y)
+    if log_x:
+        keep &= x > 0
+    idx = np.flatnonzero(keep)
+    if len(idx) <= 4 * n_buckets:
+        return idx
+
+    u = np.log10(x[idx]) if log_x else x[idx]
+    span = u[-1] - u[0]
+    if span <= 0:
+        buckets = np.zeros(len(idx), dtype=int)
+    else:
+        buckets = np.minimum(((u - u[0]) / span * n_buckets).astype(int), n_buckets - 1)
+
+    # x is increasing, so each bucket is a contiguous run of idx
+    starts = np.flatnonzero(np.diff(buckets, prepend=-1))
+    ends = np.append(starts[1:], len(idx)) - 1
+    order = np.lexsort((y[idx], buckets))   # by bucket, then by y
+    return idx[np.unique(np.concatenate([starts, ends, order[starts], order[ends]]))]
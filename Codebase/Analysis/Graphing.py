@@ -1,19 +1,33 @@
 import argparse
+import json
 import os
 import time
 from pathlib import Path
 from datetime import datetime
 
-from Utilities import loadData, binData, subtractBaseline, computeNoiseIntegral, cleanData, truncData
+from Utilities import loadData, computeNoiseIntegral, logCheckpoints, runningAverages
+from SpectralGrid import spectralGrid
+from Decimation import minMaxDecimate
+from Stages import StageGraph, sourceKey, truncateEnds, truncateMeasurements, clean, iterativeClean, subtract, binPowers
 
-from matplotlib import pyplot as plt
 import numpy as np
-from scipy.signal import gauss_spline
 
 global TEST_BOOL
 TEST_BOOL = True
 
-def plotNoiseVsTimeAndMeasurement(powers, spectral_axis, meta, sigma, save_fig=False):
+def _checkpoints(checkpoints, n_measurements, first=1):
+    """Measurement counts to plot running statistics at: every one (None), log-spaced ('log') or the given ones."""
+    if checkpoints is None:
+        return np.arange(first, n_measurements + 1)
+    if isinstance(checkpoints, str):
+        if checkpoints != 'log':
+            raise ValueError(f"Invalid checkpoints: {checkpoints}")
+        return logCheckpoints(n_measurements, first=first)
+    checkpoints = np.asarray(checkpoints, dtype=int)
+    return checkpoints[(checkpoints >= first) & (checkpoints <= n_measurements)]
+
+def plotNoiseVsTimeAndMeasurement(powers, spectral_axis, meta, sigma, save_fig=False, checkpoints='log'):
+    from matplotlib import pyplot as plt  # deferred: only paid when plotting
 
     if TEST_BOOL:
         start = time.time()
@@ -22,10 +36,12 @@ def plotNoiseVsTimeAndMeasurement(powers, spectral_axis, meta, sigma, save_fig=F
     n_measurements = powers.shape[1]
     time_axis = np.arange(n_measurements) * sweep_time
 
+    # Running statistics only where the log axes can show them (from measurement 2)
+    meas_indices = _checkpoints(checkpoints, n_measurements, first=2)
     variance_integral, mean_integral = computeNoiseIntegral(
         powers, spectral_axis, 
         freq_center=float(meta['Center Frequency (Hz)']), 
-        sigma=sigma
+        sigma=sigma, checkpoints=meas_indices
     )
 
     std_integral = np.sqrt(variance_integral)
@@ -33,8 +49,7 @@ def plotNoiseVsTimeAndMeasurement(powers, spectral_axis, meta, sigma, save_fig=F
     fig, ax1 = plt.subplots(figsize=(12, 6), facecolor='black')
     ax1.set_facecolor('black')
 
-    meas_indices = np.arange(1, n_measurements + 1)
-    ax1.plot(meas_indices[1:], std_integral[1:], color='magenta', linewidth=2, label='Std Dev')
+    ax1.plot(meas_indices, std_integral, color='magenta', linewidth=2, label='Std Dev')
     ax1.set_xlabel('Measurement Number', color='white', fontsize=12)
     ax1.set_ylabel('Std Dev Integral (W)', color='cyan', fontsize=12)
     ax1.set_yscale('log')
@@ -65,14 +80,14 @@ def plotNoiseVsTimeAndMeasurement(powers, spectral_axis, meta, sigma, save_fig=F
     ax2 = ax1.twinx()
     # ax2.set_yscale('log')
     ax2.set_xscale('log')
-    ax2.plot(meas_indices[1:], mean_integral[1:], color='yellow', linewidth=2, alpha=0.6, label='Mean Power')
+    ax2.plot(meas_indices, mean_integral, color='yellow', linewidth=2, alpha=0.6, label='Mean Power')
     ax2.set_ylabel('Mean Power Integral (W)', color='yellow', fontsize=12)
     ax2.tick_params(axis='y', labelcolor='yellow')
     ax2.spines['right'].set_color('yellow')
 
     # Plot 1/sqrt(time) decay for reference
-    white_noise_line = std_integral[1] / np.sqrt(time_axis[1:] / time_axis[1])
-    ax1.plot(meas_indices[1:], white_noise_line, color='cyan', linestyle='--', linewidth=1.5, label=r'$\propto 1/\sqrt{t}$')
+    white_noise_line = std_integral[0] / np.sqrt(time_axis[meas_indices - 1] / time_axis[meas_indices[0] - 1])
+    ax1.plot(meas_indices, white_noise_line, color='cyan', linestyle='--', linewidth=1.5, label=r'$\propto 1/\sqrt{t}$')
     ax1.legend(loc='upper left', facecolor='black', labelcolor='white')
 
 
@@ -90,17 +105,19 @@ def plotNoiseVsTimeAndMeasurement(powers, spectral_axis, meta, sigma, save_fig=F
     plt.close()
 
 def plotSignal(powers, spectral_axis, title, sigma, central_freq, end_pressure, sum_data=True, save_fig=False, path=None):
+    from matplotlib import pyplot as plt
 
     if TEST_BOOL:
         start = time.time()
 
     signal = powers.sum(axis=1) if sum_data else powers.mean(axis=1)
+    outside = spectralGrid(spectral_axis).outsideMask(central_freq, sigma)
 
     # normalize spectral axis
     spectral_axis = spectral_axis - central_freq
 
-    signal_mean = np.mean(signal[(spectral_axis < -sigma) | (spectral_axis > sigma)], axis=0)
-    signal_std = np.std(signal[(spectral_axis < -sigma) | (spectral_axis > sigma)], axis=0)
+    signal_mean = np.mean(signal[outside], axis=0)
+    signal_std = np.std(signal[outside], axis=0)
 
     fig, ax = plt.subplots(figsize=(10, 6), facecolor='black')
     ax.set_facecolor('black')
@@ -136,21 +153,27 @@ def plotSignal(powers, spectral_axis, title, sigma, central_freq, end_pressure,
         plt.show()
     plt.close()
 
-def plotPeakVsTime(powers, freqs, center_freq, sigma=500e3, save_fig=False):
-    cumsum = np.cumsum(powers, axis=1)
-    rol_avrg = cumsum / np.arange(1, powers.shape[1] + 1)
-    peak_roll_avrg = rol_avrg[(freqs >= center_freq - sigma/2) & (freqs <= center_freq + sigma/2), :]
-    peak_indices = np.argmax(peak_roll_avrg, axis=0) + np.where((freqs >= center_freq - sigma/2) & (freqs <= center_freq + sigma/2))[0][0]
-    std = np.std(rol_avrg[((freqs <= center_freq - sigma/2) | (freqs >= center_freq + sigma/2)), :], axis=0)
-    mean_powers = np.mean(rol_avrg[((freqs <= center_freq - sigma/2) | (freqs >= center_freq + sigma/2)), :], axis=0)
-    power_ratio = (rol_avrg[peak_indices, np.arange(powers.shape[1])])[100:]
-    meas_axis = np.arange(1, powers.shape[1] + 1)[100:]
+def plotPeakVsTime(powers, freqs, center_freq, sigma=500e3, save_fig=False, checkpoints=None):
+    from matplotlib import pyplot as plt
+    # Running averages at the plotted measurement counts only (after the first 100).
+    # The x axis is linear, so by default every measurement is plotted: log-spaced
+    # checkpoints would leave the late run with a point per ~2% of the axis.
+    meas_axis = _checkpoints(checkpoints, powers.shape[1], first=101)
+    rol_avrg = runningAverages(powers, meas_axis)
+    grid = spectralGrid(freqs)
+    roi = grid.roi(center_freq, sigma/2)
+    outside = grid.outsideMask(center_freq, sigma/2, inclusive=True)
+    peak_roll_avrg = rol_avrg[roi, :]
+    peak_indices = np.argmax(peak_roll_avrg, axis=0) + roi.start
+    std = np.std(rol_avrg[outside, :], axis=0)
+    mean_powers = np.mean(rol_avrg[outside, :], axis=0)
+    power_ratio = rol_avrg[peak_indices, np.arange(len(meas_axis))]
     
     fig, ax = plt.subplots(figsize=(10, 6), facecolor='black')
     ax.set_facecolor('black')
-    ax.fill_between(meas_axis, mean_powers[100:] - 3*std[100:], mean_powers[100:] + 3*std[100:], alpha=0.2, color='blue', label='±3σ Baseline Error')
-    ax.fill_between(meas_axis, mean_powers[100:], alpha=0.4, label='Mean Power', color='blue')
-    ax.plot(meas_axis, mean_powers[100:], 'b-', linewidth=2)
+    ax.fill_between(meas_axis, mean_powers - 3*std, mean_powers + 3*std, alpha=0.2, color='blue', label='±3σ Baseline Error')
+    ax.fill_between(meas_axis, mean_powers, alpha=0.4, label='Mean Power', color='blue')
+    ax.plot(meas_axis, mean_powers, 'b-', linewidth=2)
     ax.fill_between(meas_axis, power_ratio, alpha=0.4, label='Peak/Mean Power Ratio', color='green')
     ax.plot(meas_axis, power_ratio, 'g-', linewidth=2)
     # ax.axhline(1, color='red', linestyle='--', label='Ratio = 1')
@@ -169,13 +192,11 @@ def plotPeakVsTime(powers, freqs, center_freq, sigma=500e3, save_fig=False):
     plt.close()
 
 def plotBaseline(powers, spectral_axis, center_freq, sigma=500e3, deg=3, n_sub=10, save_fig=False):
+    from matplotlib import pyplot as plt
     powers = np.mean(powers, axis=1)
-    power_mask = (spectral_axis >= center_freq - sigma) & (spectral_axis <= center_freq + sigma)
-    baseline_mask = ~power_mask
-    baseline_freqs = spectral_axis[baseline_mask]
-    baseline_powers = powers[baseline_mask]
-    coeffs = np.polyfit(baseline_freqs, baseline_powers, deg=deg)
-    baseline_fit = np.polyval(coeffs, spectral_axis)
+    grid = spectralGrid(spectral_axis)
+    coeffs = grid.projector(center_freq, sigma, deg) @ powers
+    baseline_fit = grid.vander(deg) @ coeffs
     fig, ax = plt.subplots(figsize=(10, 6), facecolor='black')
     ax.set_facecolor('black')
     ax.set_xlabel('Frequency (MHz)', color='white')
@@ -192,6 +213,75 @@ def plotBaseline(powers, spectral_axis, center_freq, sigma=500e3, deg=3, n_sub=1
         plt.show()
     plt.close()
 
+def plotPressures(pressures, meta, save_fig=False, width_px=3000):
+    from matplotlib import pyplot as plt
+    sweep_time = float(meta.get('Sweep Time (ms)', 0))  
+    time_axis = np.arange(len(pressures)) * sweep_time
+
+    # Only the points a line at this resolution can show (per log-time pixel column)
+    keep = minMaxDecimate(time_axis, pressures, width_px, log_x=True)
+    plt.figure(figsize=(10, 5))
+    plt.plot(time_axis[keep], np.asarray(pressures)[keep], marker='o')
+    plt.xlabel('Time (ms)')
+    plt.xscale('log')
+    plt.yscale('log')
+    plt.ylabel('Pressure (mbar)')
+    plt.title('Pressure vs Time')
+    plt.grid()
+    if save_fig:
+        plt.savefig(r'Codebase\Analysis\Figure Dump\pressure_vs_time.png', dpi=300)
+        plt.close()
+    else:
+        plt.show()
+
+def _initFigureWorker():
+    import matplotlib
+    matplotlib.use('Agg', force=True)
+    global TEST_BOOL
+    TEST_BOOL = False
+
+def _renderFigure(job):
+    name, args, kwargs = job
+    start = time.time()
+    globals()[name](*args, save_fig=True, **kwargs)
+    return name, time.time() - start
+
+def renderFigures(jobs, workers=None):
+    """
+    Render and save independent figures in parallel worker processes (Agg backend).
+
+    Args:
+        jobs (list): (plot function name, args, kwargs) per figure, e.g. ('plotSignal', (powers, freqs, ...), {}).
+        workers (int): Worker processes (default: one per figure, up to the core count; 1 renders in-process).
+
+    Returns:
+        timings (list): (plot function name, seconds) per figure, in the order of jobs.
+    """
+    from multiprocessing import Pool
+    global TEST_BOOL
+
+    if TEST_BOOL:
+        start = time.time()
+    workers = min(workers or os.cpu_count() or 1, len(jobs))
+    if workers <= 1:
+        from matplotlib import pyplot as plt
+        backend, verbose = plt.get_backend(), TEST_BOOL
+        plt.switch_backend('Agg')
+        TEST_BOOL = False
+        try:
+            timings = [_renderFigure(job) for job in jobs]
+        finally:
+            TEST_BOOL = verbose
+            plt.switch_backend(backend)
+    else:
+        with Pool(workers, initializer=_initFigureWorker) as pool:
+            timings = pool.map(_renderFigure, jobs, chunksize=1)
+
+    if TEST_BOOL:
+        print(f"Rendered {len(jobs)} figures ({', '.join(f'{n} {t:.2f} s' for n, t in timings)}) "
+              f"in {time.time() - start:.4f} seconds")
+    return timings
+
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
     parser.add_argument('--path', type=str, required=True)
@@ -215,6 +305,21 @@ if __name__ == "__main__":
         args.plot_noise, args.plot_signal, args.signal_sum, args.clean = True, True, False, False
         args.plot_baseline = True
     powers, freqs, pressures, meta = loadData(args.path)
+    n_measurements = powers.shape[1]
+
+    # Processing runs as memoized stages (see Stages): only the stages whose
+    # settings changed since a previous run, and those after them, are recomputed
+    graph = StageGraph()
+    stage = graph.source('load', sourceKey(args.path), powers=powers, freqs=freqs)
+
+    # Saved figures are queued and rendered together in worker processes (renderFigures);
+    # figures to show are drawn as they come
+    figures = []
+    def plot(name, *plot_args, **kwargs):
+        if args.save_fig:
+            figures.append((name, plot_args, kwargs))
+        else:
+            globals()[name](*plot_args, **kwargs)
 
     # --- TESTING FEATURES ---
     SIM_DATA = False
@@ -237,10 +342,8 @@ if __name__ == "__main__":
     
     # --- TEST: Truncate ends of spectrum to remove potential artifacts
     if TRUNCATE_ENDS:
-        n_trunc =  float(input('SPECTRUM TRUNACTION TEST: Input MHz on Each Side to Remove: ')) * 1e6
-        freqs_mask = (freqs >= freqs.min() + n_trunc) & (freqs <= freqs.max() - n_trunc)
-        freqs = freqs[freqs_mask]
-        powers = powers[freqs_mask, :]
+        n_trunc =  float(input('SPECTRUM TRUNACTION TEST: Input MHz on Each Side to Remove: '))
+        stage = graph.add('truncate_ends', truncateEnds, stage, mhz=n_trunc)
 
     # Interpolate pressures to match number of measurements if needed
     if np.isnan(pressures).any():
@@ -250,7 +353,7 @@ if __name__ == "__main__":
     # --- TEST: Interpolate pressures to match number of measurements if needed
     if INTERPOLATE_PRESSURES:
         from SignalSim import interpolatePressures
-        pressures = interpolatePressures(pressures, int(powers.shape[1]), float(meta.get('Sweep Time (ms)', 4)))
+        pressures = interpolatePressures(pressures, int(n_measurements), float(meta.get('Sweep Time (ms)', 4)))
 
     # --- TEST: Change initial CO concentration in metadata for testing ---
     if CHANGE_CONCENTRATION:
@@ -259,28 +362,15 @@ if __name__ == "__main__":
 
     # --- TEST: Plot pressures over time to verify interpolation if needed
     if PLOT_PRESSURES:
-        import matplotlib.pyplot as plt
-        sweep_time = float(meta.get('Sweep Time (ms)', 0))  
-        time_axis = np.arange(len(pressures)) * sweep_time
-        plt.figure(figsize=(10, 5))
-        plt.plot(time_axis, pressures, marker='o')
-        plt.xlabel('Time (ms)')
-        plt.xscale('log')
-        plt.yscale('log')
-        plt.ylabel('Pressure (mbar)')
-        plt.title('Pressure vs Time')
-        plt.grid()
-        if args.save_fig:
-            plt.savefig(r'Codebase\Analysis\Figure Dump\pressure_vs_time.png', dpi=300)
-            plt.close()
-        else:
-            plt.show()
+        plot('plotPressures', pressures, meta)
 
     # --- TEST: Generate synthetic Gaussian noise for testing
     if SIM_DATA:
         from SignalSim import getSimulatedData
         SIM_SIGNAL = input('TEST: SIMULATE CO SIGNAL? (y/n): ').lower() == 'y'
-        powers, freqs = getSimulatedData(powers, freqs, pressures, meta, sim_co=SIM_SIGNAL)
+        # Random each run: never cached, nor is anything downstream
+        stage = graph.add('simulate', lambda data: dict(zip(('powers', 'freqs'), getSimulatedData(
+            data['powers'], data['freqs'], pressures, meta, sim_co=SIM_SIGNAL))), stage, cache=False)
 
     # --- TEST: offset center
     if OFFSET_CENTER:
@@ -289,156 +379,92 @@ if __name__ == "__main__":
 
     if TRUNCATE_SIGNAL:
         # --- TEST: Truncate to the first n measurements
-        n = input(f'TEST: Total measurement length: {powers.shape[1]}. Input Data Truncation End Index: ')
-        powers = truncData(powers, n=int(n))
+        n = input(f'TEST: Total measurement length: {n_measurements}. Input Data Truncation End Index: ')
+        stage = graph.add('truncate', truncateMeasurements, stage, n=int(n))
 
     if args.plot_baseline:
-        plotBaseline(powers, freqs, float(meta['Center Frequency (Hz)']), args.sigma, args.deg, args.n_sub, args.save_fig)
+        data = graph.result(stage)
+        plot('plotBaseline', data['powers'], data['freqs'], float(meta['Center Frequency (Hz)']), args.sigma, args.deg, args.n_sub)
     
     if BRUTE_FORCE_CLEAN:
         cleaning_itterations = int(input('TEST: Input number of cleaning iterations; or \'0\' to run continously until rejection rate is 0: '))
         
-        # recursive clean:
-        if cleaning_itterations > 0:
-                powers, _ = cleanData(powers, freqs, float(meta['Center Frequency (Hz)']), args.sigma, deg=args.deg, n_sub=args.n_sub, cleaning_method=CLEANING_ROUTINES.get(CLEANING_ROUTINE))
-        else:
-            while True:
-                print(f"Cleaning iteration {cleaning_itterations+1}...", end='\r')
-                powers, mask = cleanData(powers, freqs, float(meta['Center Frequency (Hz)']), args.sigma, deg=args.deg, n_sub=args.n_sub, cleaning_method=CLEANING_ROUTINES.get(CLEANING_ROUTINE))
-                cleaning_itterations += 1
-                if mask.all():
-                    break
-        print("Data cleaning complete. Final shape:", powers.shape)
+        # recursive clean (state carried between passes, see IterativeCleaner):
+        stage = graph.add('brute_force_clean', iterativeClean, stage, freq_center=float(meta['Center Frequency (Hz)']), sigma=args.sigma,
+                          deg=args.deg, n_sub=args.n_sub, cleaning_method=CLEANING_ROUTINES.get(CLEANING_ROUTINE), max_iter=cleaning_itterations)
     
     # --- Preprocessing ---
 
     if args.clean:
         if GRAPH_REJECTS:
-            _, mask = cleanData(powers, freqs, float(meta['Center Frequency (Hz)']), args.sigma, deg=args.deg, n_sub=args.n_sub, cleaning_method=CLEANING_ROUTINES.get(CLEANING_ROUTINE))
-            powers = powers[:, ~mask]
-        elif not BRUTE_FORCE_CLEAN:
-            powers, _ = cleanData(powers, freqs, float(meta['Center Frequency (Hz)']), args.sigma, deg=args.deg, n_sub=args.n_sub)
+            stage = graph.add('clean', clean, stage, freq_center=float(meta['Center Frequency (Hz)']), sigma=args.sigma, deg=args.deg, n_sub=args.n_sub,
+                              cleaning_method=CLEANING_ROUTINES.get(CLEANING_ROUTINE), rejects=True)
         elif not BRUTE_FORCE_CLEAN:
-            powers, _ = cleanData(powers, freqs, float(meta['Center Frequency (Hz)']), args.sigma, deg=args.deg, n_sub=args.n_sub, cleaning_method=CLEANING_ROUTINES.get(CLEANING_ROUTINE))
+            stage = graph.add('clean', clean, stage, freq_center=float(meta['Center Frequency (Hz)']), sigma=args.sigma, deg=args.deg, n_sub=args.n_sub)
 
     if args.sub:
-        powers = subtractBaseline(powers, freqs, float(meta['Center Frequency (Hz)']), args.sigma, args.deg, args.n_sub)
+        stage = graph.add('subtract', subtract, stage, freq_center=float(meta['Center Frequency (Hz)']), sigma=args.sigma, deg=args.deg, n_sub=args.n_sub)
 
     if args.bin:
-        powers, freqs = binData(powers, freqs, n=args.bin_factor)
+        stage = graph.add('bin', binPowers, stage, bin_factor=args.bin_factor)
+
+    data = graph.result(stage)
+    powers, freqs = data['powers'], data['freqs']
 
     # --- TEST FEATURE: Plot frequency evolution over measurements ---
     if PLOT_EVOLUTION:
-        import glob
-        from PIL import Image
-        import shutil
-        
+        from Animation import renderEvolution
+
         interval = input('TEST: Plot signal evolution over rolling discrete intervals, n: ')
         ani_delay = input('TEST: Input animation delay between frames in milliseconds: ')
-        incl_imgs = input('TEST: Include Animation Only? (y/n): ').lower() == 'y'
 
         os.makedirs(r'Codebase\Analysis\Figure Dump\Evolution Plots', exist_ok=True)
-        if os.path.exists(r'Codebase\Analysis\Figure Dump\Evolution Plots'):
-            shutil.rmtree(r'Codebase\Analysis\Figure Dump\Evolution Plots')
-        os.makedirs(r'Codebase\Analysis\Figure Dump\Evolution Plots', exist_ok=True)
-        for j in np.arange(0, powers.shape[1], int(interval))[:-1]:
-            plotSignal(powers[:, :j+int(interval)], freqs, f"{meta['Experiment Description']} - First {j+int(interval)} Measurements", 
-                       args.sigma, float(meta['Center Frequency (Hz)']),
-                       sum_data=args.signal_sum, end_pressure=np.round(pressures[j+int(interval)-1], 4) ,save_fig=args.save_fig, 
-                       path=rf'Codebase\Analysis\Figure Dump\Evolution Plots\evolution_plot_{j+int(interval)}.png')
-        # Take in saved plots and produce an animation with a delay to 1 second between frames
-        # Load all evolution plot images
-        image_files = sorted(glob.glob(r'Codebase\Analysis\Figure Dump\Evolution Plots\evolution_plot_*.png'), 
-                             key=lambda x: int(x.split('_')[-1].split('.')[0]))
-        images = [Image.open(img) for img in image_files]
-
-        # Save as animated GIF with 1 second delay between frames
-        if images:
-            images[0].save(
-                r'Codebase\Analysis\Figure Dump\Evolution Plots\evolution_animation.gif',
-                save_all=True,
-                append_images=images[1:],
-                duration=int(ani_delay),
-                loop=0
-            )
+        # 300 dpi: the same 3000x1800 frames plotSignal saved
+        n_frames = renderEvolution(powers, freqs, meta['Experiment Description'], args.sigma, float(meta['Center Frequency (Hz)']),
+                                   pressures, int(interval), r'Codebase\Analysis\Figure Dump\Evolution Plots\evolution_animation.gif',
+                                   delay=int(ani_delay), sum_data=args.signal_sum, dpi=300)
+        if n_frames > 0:
             print("Animation saved as evolution_animation.gif")
-        
-        if not incl_imgs:
-            # Remove individual images after creating animation
-            for img_file in image_files:
-                os.remove(img_file)
-            print("Individual evolution plot images removed.")
+        else:
+            print(f"No animation frames: interval {interval} leaves no frame before the last of {powers.shape[1]} measurements")
 
     # --- Plotting ---
 
     if args.plot_noise:
-        plotNoiseVsTimeAndMeasurement(powers, freqs, meta, args.sigma, args.save_fig)
+        plot('plotNoiseVsTimeAndMeasurement', powers, freqs, meta, args.sigma)
     
     if args.plot_signal:
-        plotSignal(powers, freqs, meta['Experiment Description'], args.sigma, float(meta['Center Frequency (Hz)']), end_pressure=np.round(pressures[-1], 4), sum_data=args.signal_sum, save_fig=args.save_fig)
+        plot('plotSignal', powers, freqs, meta['Experiment Description'], args.sigma, float(meta['Center Frequency (Hz)']), end_pressure=np.round(pressures[-1], 4), sum_data=args.signal_sum)
+
+    if figures:
+        renderFigures(figures)
     
     if args.plot_signal or args.plot_noise or args.plot_baseline:
         out_dir = Path(r"Codebase\Analysis\Figure Dump")
         out_dir.mkdir(parents=True, exist_ok=True)
-        info_file = out_dir / "Analysis_Run_Info.txt"
-
-        lines = []
-        lines.append(f"Run Timestamp: {datetime.now().isoformat(timespec='seconds')}")
-        lines.append(f"Data Path: {args.path}")
-        lines.append("")
-        lines.append("[Arguments]")
-        for key, value in sorted(vars(args).items()):
-            lines.append(f"{key}: {value}")
-
-        lines.append("")
-        lines.append("[Testing Settings]")
-        lines.append(f"SIM_DATA: {SIM_DATA}")
-        if SIM_DATA:
-            lines.append(f"SIM_SIGNAL: {locals().get('SIM_SIGNAL', 'N/A')}")
+        info_file = out_dir / "Analysis_Run_Info.json"
 
-        lines.append(f"OFFSET_CENTER: {OFFSET_CENTER}")
+        testing = {'SIM_DATA': SIM_DATA, 'OFFSET_CENTER': OFFSET_CENTER, 'TRUNCATE_SIGNAL': TRUNCATE_SIGNAL,
+                   'TRUNCATE_ENDS': TRUNCATE_ENDS, 'BRUTE_FORCE_CLEAN': BRUTE_FORCE_CLEAN,
+                   'INTERPOLATE_PRESSURES': INTERPOLATE_PRESSURES, 'GRAPH_REJECTS': GRAPH_REJECTS}
+        if SIM_DATA:
+            testing['SIM_SIGNAL'] = locals().get('SIM_SIGNAL')
         if OFFSET_CENTER:
-            lines.append(f"offset_MHz: {locals().get('offset', 'N/A')}")
-            lines.append(f"center_freq_Hz_after_offset: {meta.get('Center Frequency (Hz)', 'N/A')}")
-
-        lines.append(f"TRUNCATE_SIGNAL: {TRUNCATE_SIGNAL}")
-        if TRUNCATE_SIGNAL:
-            lines.append(f"truncate_end_index: {locals().get('n', 'N/A')}")
-        
-        lines.append(f"BRUTE_FORCE_CLEAN: {BRUTE_FORCE_CLEAN}")
-        if BRUTE_FORCE_CLEAN:
-            BFC_factor = locals().get('cleaning_itterations', 'N/A')
-            lines.append(f"cleaning_itterations: {BFC_factor if BFC_factor > 0 else 'Until 0% Rejection Rate'}")
-
-        lines.append(f"INTERPOLATE_PRESSURES: {INTERPOLATE_PRESSURES}")
-
-        lines.append(f"GRAPH_REJECTS: {GRAPH_REJECTS}")
-
-        lines.append("")
-        lines.append("[Resolved Processing Settings]")
-        lines.append(f"baseline_subtraction_enabled: {args.sub}")
-        if args.sub:
-            lines.append(f"sub_deg: {args.deg}")
-            lines.append(f"sub_n_sub: {args.n_sub}")
-            lines.append(f"sub_sigma: {args.sigma}")
-
-        lines.append(f"binning_enabled: {args.bin}")
-        if args.bin:
-            lines.append(f"bin_factor: {args.bin_factor}")
-
-        lines.append(f"cleaning_enabled: {args.clean}")
-        if args.clean:
-            lines.append(f"clean_deg: {args.deg}")
-            lines.append(f"clean_n_sub: {args.n_sub}")
-            lines.append(f"clean_sigma: {args.sigma}")
-
-            lines.append(f"cleaning_method: {CLEANING_ROUTINES.get(CLEANING_ROUTINE)}")
-        lines.append("")
-        lines.append("[Data Summary]")
-        lines.append(f"powers_shape: {powers.shape}")
-        lines.append(f"freqs_shape: {freqs.shape}")
-        lines.append(f"n_pressures: {len(pressures) if hasattr(pressures, '__len__') else 'N/A'}")
-        lines.append(f"center_frequency_Hz: {meta.get('Center Frequency (Hz)', 'N/A')}")
-        lines.append(f"experiment_description: {meta.get('Experiment Description', 'N/A')}")
-
-        info_file.write_text("\n".join(lines), encoding="utf-8")
\ No newline at end of file
+            testing['offset_MHz'] = locals().get('offset')
+
+        # Provenance: settings plus every processing stage (parameters, cache key, cached/computed, timing)
+        manifest = {
+            'run_timestamp': datetime.now().isoformat(timespec='seconds'),
+            'data_path': args.path,
+            'arguments': vars(args),
+            'testing_settings': testing,
+            'stages': graph.manifest(),
+            'data_summary': {
+                'powers_shape': list(powers.shape),
+                'freqs_shape': list(freqs.shape),
+                'n_pressures': len(pressures) if hasattr(pressures, '__len__') else None,
+                'center_frequency_Hz': meta.get('Center Frequency (Hz)'),
+                'experiment_description': meta.get('Experiment Description'),
+            },
+        }
+        info_file.write_text(json.dumps(manifest, indent=4, default=str), encoding="utf-8")
\ No newline at end of file
@@ -0,0 +1,224 @@
+"""
+Fast reader for HSReader / ExperimentLog CSV files.
+
+The logs have a fixed layout: '#' comment metadata, one header row, then
+rows of a few scalar columns (Timestamp, Elapsed Time, Cycle Count, ...,
+Pressure, Pressure_Unit) followed by one column per frequency ("<f> Hz") and,
+in co-add mode, one "<f> SumSq" column per frequency. Knowing that, nothing
+has to be inferred: the column count and dtypes are fixed up front, only the
+Pressure and "<f> Hz" columns are converted, and the powers come out as
+float32 (what the analyzer sends) instead of float64.
+
+The data section is split into newline-aligned byte ranges that are parsed
+in parallel worker processes, each writing its measurements straight into a
+preallocated shared (frequencies x measurements) array.
+"""
+import io
+import os
+import csv
+import sys
+import time
+from multiprocessing import Pool, shared_memory, resource_tracker
+
+import numpy as np
+
+global TEST_BOOL
+TEST_BOOL = True
+
+# Below this much data the process pool costs more than it saves
+_MIN_PARALLEL_BYTES = 16 * 2**20
+
+
+def readLogHeader(path):
+    """
+    Read the comment metadata and the column header of a log.
+
+    Args:
+        path (str): Path to the experiment log (CSV with comment metadata).
+
+    Returns:
+        metadata (dict): Dictionary of configuration parameters.
+        columns (list): Column names of the data rows.
+        data_start (int): Byte offset of the first data row.
+    """
+    metadata = {}
+    with open(path, 'rb') as f:
+        line = f.readline()
+        while line.startswith(b'#'):
+            # Clean up the line and split by first colon
+            content = line.decode('utf-8', errors='replace').lstrip('#').strip()
+            if ':' in content:
+                key, val = content.split(':', 1)
+                metadata[key.strip()] = val.strip()
+            line = f.readline()
+        columns = next(csv.reader([line.decode('utf-8', errors='replace')]))
+        data_start = f.tell()
+    return metadata, columns, data_start
+
+
+def _layout(columns):
+    """Indices of the frequency columns and of the pressure column (or None)."""
+    freq_idx = [i for i, col in enumerate(columns) if 'Hz' in col]
+    if not freq_idx:
+        raise ValueError("Log has no frequency ('<f> Hz') columns")
+    pressure_idx = columns.index('Pressure') if 'Pressure' in columns else None
+    return freq_idx, pressure_idx
+
+
+def _chunkRanges(path, start, end, n_chunks):
+    """Split [start, end) into up to n_chunks byte ranges that begin on a row."""
+    bounds = [start]
+    with open(path, 'rb') as f:
+        for k in range(1, n_chunks):
+            pos = start + (end - start) * k // n_chunks
+            if pos <= bounds[-1]:
+                continue
+            f.seek(pos)
+            f.readline()
+            pos = f.tell()
+            if pos >= end:
+                break
+            if pos > bounds[-1]:
+                bounds.append(pos)
+    bounds.append(end)
+    return list(zip(bounds[:-1], bounds[1:]))
+
+
+def _readRange(path, start, end):
+    with open(path, 'rb') as f:
+        f.seek(start)
+        return f.read(end - start)
+
+
+def _maxRows(path, start, end):
+    """Upper bound on the data rows in a byte range (one per line)."""
+    data = _readRange(path, start, end)
+    return data.count(b'\n') + (0 if data.endswith(b'\n') else 1)
+
+
+def _parseRange(path, start, end, n_columns, freq_idx, pressure_idx, dtype):
+    """
+    Parse the data rows in a byte range.
+    Comment lines ('# GAP') and blank lines are skipped, a half-written last
+    row is NaN padded.
+
+    Returns:
+        powers (np.array): 2D array (rows x frequencies).
+        pressure (np.array): 1D array of pressure readings for each row.
+    """
+    import pandas as pd
+
+    data = _readRange(path, start, end)
+    usecols = freq_idx + ([pressure_idx] if pressure_idx is not None else [])
+    frame = pd.read_csv(io.BytesIO(data), header=None, names=range(n_columns), usecols=usecols,
+                        dtype={i: dtype for i in freq_idx}, comment='#', engine='c')
+
+    powers = frame[freq_idx].to_numpy(dtype=dtype)
+    if pressure_idx is None:
+        pressure = np.full(len(frame), np.nan)
+    else:
+        pressure = pd.to_numeric(frame[pressure_idx], errors='coerce').to_numpy(dtype=float)
+    return powers, pressure
+
+
+def _attachShared(name):
+    """
+    Open the parent's shared block without claiming it. The parent owns (and
+    unlinks) it. Workers normally inherit the parent's resource tracker (fork,
+    and spawn/forkserver on POSIX pass its fd on), and unregistering there
+    would drop the parent's own registration, so its unlink fails in the
+    tracker. Only a worker that had to start a tracker of its own unregisters,
+    so that tracker doesn't report the block as leaked.
+    """
+    if sys.version_info >= (3, 13):
+        return shared_memory.SharedMemory(name=name, track=False)
+    own_tracker = getattr(resource_tracker._resource_tracker, '_fd', None) is None
+    shm = shared_memory.SharedMemory(name=name)
+    if own_tracker:
+        resource_tracker.unregister(shm._name, 'shared_memory')
+    return shm
+
+
+def _parseChunk(job):
+    """Worker: parse one byte range into its slot of the shared powers array."""
+    path, start, end, row0, shm_name, shape, dtype, n_columns, freq_idx, pressure_idx = job
+    values, pressure = _parseRange(path, start, end, n_columns, freq_idx, pressure_idx, dtype)
+
+    shm = _attachShared(shm_name)
+    try:
+        powers = np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+        powers[:, row0:row0 + len(values)] = values.T
+        del powers
+    finally:
+        shm.close()
+    return row0, pressure, end - start
+
+
+def readLog(path, workers=None, progress=None, dtype=np.float32):
+    """
+    Parse an HSReader / ExperimentLog CSV.
+
+    Args:
+        path (str): Path to the experiment log (CSV with comment metadata).
+        workers (int): Worker processes (default: all cores; 1 parses in-process).
+        progress (callable): Called as progress(bytes_done, bytes_total) as chunks finish.
+        dtype: Element type of the powers array (float32 matches what the analyzer sends).
+
+    Returns:
+        powers (np.array): 2D array of power readings (frequencies x measurements).
+        spectral_axis (np.array): 1D array of frequencies in Hz.
+        pressure (np.array): 1D array of pressure readings for each measurement.
+        metadata (dict): Dictionary of configuration parameters.
+    """
+    if TEST_BOOL:
+        start = time.time()
+
+    metadata, columns, data_start = readLogHeader(path)
+    freq_idx, pressure_idx = _layout(columns)
+    spectral_axis = np.array([float(columns[i].split(' ')[0]) for i in freq_idx])
+
+    size = os.path.getsize(path)
+    total = size - data_start
+    workers = workers or os.cpu_count() or 1
+
+    if workers == 1 or total < _MIN_PARALLEL_BYTES:
+        values, pressure = _parseRange(path, data_start, size, len(columns), freq_idx, pressure_idx, dtype)
+        powers = np.ascontiguousarray(values.T)
+        if progress:
+            progress(total, total)
+    else:
+        ranges = _chunkRanges(path, data_start, size, workers * 4)
+        with Pool(workers) as pool:
+            # Each chunk gets a slot sized by its line count; comment lines
+            # leave a few unused columns that are dropped when compacting
+            bounds = pool.starmap(_maxRows, [(path, s, e) for s, e in ranges])
+            row0 = np.concatenate([[0], np.cumsum(bounds)]).astype(int)
+            shape = (len(freq_idx), int(row0[-1]))
+            itemsize = np.dtype(dtype).itemsize
+
+            shm = shared_memory.SharedMemory(create=True, size=max(1, shape[0] * shape[1] * itemsize))
+            try:
+                shared = np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+                jobs = [(path, s, e, int(r), shm.name, shape, dtype, len(columns), freq_idx, pressure_idx)
+                        for (s, e), r in zip(ranges, row0)]
+
+                pressures = {}
+                done = 0
+                for r, press, nbytes in pool.imap_unordered(_parseChunk, jobs):
+                    pressures[r] = press
+                    done += nbytes
+                    if progress:
+                        progress(done, total)
+
+                slots = sorted(pressures)
+                powers = np.concatenate([shared[:, r:r + len(pressures[r])] for r in slots], axis=1)
+                pressure = np.concatenate([pressures[r] for r in slots])
+                del shared
+            finally:
+                shm.close()
+                shm.unlink()
+
+    if TEST_BOOL:
+        print(f"Log parsing took {time.time() - start:.4f} seconds ({powers.shape[1]} measurements)")
+
+    return powers, spectral_axis, pressure, metadata
@@ -0,0 +1,263 @@
+"""
+Out-of-core processing of a run: truncate -> clean -> baseline subtract -> bin -> integrate.
+
+Graphing's main path holds the whole (frequencies x measurements) float64
+matrix in memory and every stage makes a full-size copy. Here the
+measurements are streamed through in column chunks instead:
+
+- The rolling baseline (n_sub) only needs n_sub neighbouring measurements, so
+  each chunk is read with that much overlap and fitted independently. These
+  fits are the expensive part and run in worker processes.
+- The cleaning detectors and the noise integral depend on every earlier
+  measurement (running sums / running std), so their state is carried from
+  chunk to chunk in order by the parent process.
+
+Per-chunk work reuses subtractBaseline and binData, and the running sums are
+accumulated in the same order as the in-memory cumsum, so the results match
+cleanData -> subtractBaseline -> binData -> computeNoiseIntegral (same
+rejected measurements, values to floating-point rounding).
+Memory is bounded by chunk size x chunks in flight; the input is typically the
+memory-mapped powers from loadData.
+"""
+import time
+from collections import deque
+from multiprocessing import Pool
+
+import numpy as np
+
+import Utilities
+from Utilities import subtractBaseline, binData, RunningNoiseIntegral, RunningRollingVar
+from SpectralGrid import spectralGrid
+
+global TEST_BOOL
+TEST_BOOL = True
+
+CLEANING_METHODS = (
+    'Single Itteration Variance Integral Clean',
+    'Mean Power Outlier Clean',
+    'Median Power Outlier Clean',
+    'True Rolling Variance Clean',
+)
+
+
+def _trim(deg, n):
+    """Measurements subtractBaseline drops at the start and end of a run."""
+    if deg == 0 or n <= 1:
+        return 0, 0
+    return n // 2, -(-n // 2)
+
+
+def _outputChunks(n_out, chunk):
+    return [(s, min(s + chunk, n_out)) for s in range(0, n_out, chunk)]
+
+
+def _initWorker():
+    # Per-chunk timing prints from Utilities would drown the progress output
+    Utilities.TEST_BOOL = False
+
+
+def _chunkJob(job):
+    """
+    Worker: baseline subtract one chunk (read with its overlap) and reduce it
+    to what the parent needs.
+    """
+    block, spectral_axis, freq_center, sigma, deg, n, what, bin_factor = job
+    sub = subtractBaseline(block, spectral_axis, freq_center, sigma, deg, n)
+    mask = spectralGrid(spectral_axis).outsideMask(freq_center, sigma)
+
+    if what == 'masked':
+        return sub[mask, :]
+    if what == 'mean':
+        return np.mean(sub[mask, :], axis=0)
+    if what == 'maxmed':
+        return (np.max(sub[mask, :], axis=0) / np.median(sub[mask, :], axis=0))**2
+    if bin_factor and bin_factor > 1:
+        sub, _ = binData(sub, spectral_axis, n=bin_factor)
+    return sub
+
+
+def _streamChunks(read_block, n_out, chunk, lead, tail, common, pool, depth, progress_label):
+    """
+    Yield (start, result) for consecutive output chunks, in order.
+    read_block(a, b) returns input measurements [a, b); chunks are submitted
+    to the pool a few at a time so only those are in memory.
+    """
+    ranges = _outputChunks(n_out, chunk)
+    in_flight = deque()
+    for k, (s, e) in enumerate(ranges):
+        job = (read_block(s, e + lead + tail),) + common
+        in_flight.append((s, pool.apply_async(_chunkJob, (job,)) if pool is not None else _chunkJob(job)))
+        while len(in_flight) >= depth or (k == len(ranges) - 1 and in_flight):
+            start, result = in_flight.popleft()
+            if TEST_BOOL:
+                print(f"{progress_label}: {min(start + chunk, n_out)}/{n_out} measurements", end='\r')
+            yield start, result.get() if pool is not None else result
+    if TEST_BOOL and ranges:
+        print()
+
+
+def _detectOutliers(source, n_meas, spectral_axis, freq_center, sigma, deg, n_sub, method, chunk, pool, depth):
+    """Outlier indices as cleanData would return them, computed chunk by chunk."""
+    if method not in CLEANING_METHODS:
+        raise ValueError(f"Invalid cleaning method: {method}")
+    if method == 'Mean Power Outlier Clean':
+        deg, n_sub = 3, 2   # meanPowerOutlierDet's fixed baseline
+    what = {'Mean Power Outlier Clean': 'mean', 'Median Power Outlier Clean': 'maxmed'}.get(method, 'masked')
+
+    lead, tail = _trim(deg, n_sub)
+    n_out = max(0, n_meas - lead - tail)
+    common = (spectral_axis, freq_center, sigma, deg, n_sub, what, None)
+    chunks = _streamChunks(lambda a, b: np.asarray(source[:, a:b]), n_out, chunk, lead, tail, common, pool, depth, 'Cleaning')
+
+    if what != 'masked':
+        # Per-measurement scalars; thresholds need all of them but they are small
+        values = np.concatenate([r for _, r in chunks]) if n_out else np.zeros(0)
+        if what == 'mean':
+            return np.where(np.abs(values - np.mean(values)) > 2 * np.std(values))[0]
+        return np.where(values > np.median(values) + 2 * np.std(values))[0]
+
+    outliers = []
+    if method == 'True Rolling Variance Clean':
+        state = RunningRollingVar()
+        for _, masked in chunks:
+            outliers.extend(state.update(masked))
+        return np.array(outliers, dtype=int)
+
+    integral, previous = RunningNoiseIntegral(), None
+    for start, masked in chunks:
+        variance, _ = integral.update(masked)
+        steps = np.diff(variance if previous is None else np.concatenate([[previous], variance]))
+        first = start + (1 if previous is None else 0)
+        outliers.extend(first + np.where(steps > 0)[0])
+        previous = variance[-1]
+    return np.array(outliers, dtype=int)
+
+
+def processRun(powers, spectral_axis, freq_center, sigma, deg, n_sub, truncate=None,
+               cleaning_method=None, bin_factor=None, chunk=4096, workers=1, out=None):
+    """
+    Stream a run through truncate -> clean -> baseline subtract -> bin -> integrate.
+
+    Args:
+        powers (np.array): 2D array of power readings (frequencies x measurements); a memmap is never read whole.
+        spectral_axis (np.array): 1D array of frequencies in Hz.
+        freq_center (float): Central frequency to exclude from fitting/integration.
+        sigma (float): Width around the central frequency to exclude (+/- sigma).
+        deg (int): Degree of the baseline polynomial.
+        n_sub (int): Measurements in the rolling baseline window.
+        truncate (int): Keep only the first `truncate` measurements (truncData).
+        cleaning_method (str): One of CLEANING_METHODS, or None to skip cleaning.
+        bin_factor (int): Frequency bins to sum into one (binData), or None.
+        chunk (int): Measurements per chunk.
+        workers (int): Worker processes for the baseline fits (1 = in-process).
+        out (str): .npy path to write the processed matrix to (memory mapped);
+            if None only the reductions below are kept.
+
+    Returns:
+        dict: powers (processed matrix memmap, or None), spectral_axis (binned),
+              mask (kept measurements of the truncated run), variance_integral,
+              mean_power_levels (as computeNoiseIntegral) and signal_sum
+              (processed powers summed over measurements, as plotSignal).
+    """
+    if TEST_BOOL:
+        start = time.time()
+
+    n_meas = powers.shape[1] if truncate is None else min(int(truncate), powers.shape[1])
+    pool = Pool(workers, initializer=_initWorker) if workers > 1 else None
+    depth = 2 * workers if pool is not None else 1   # chunks in flight
+    verbose, Utilities.TEST_BOOL = Utilities.TEST_BOOL, False
+    try:
+        # --- Clean: detect on the raw run, keep a column mask
+        mask = np.ones(n_meas, dtype=bool)
+        if cleaning_method is not None:
+            outliers = _detectOutliers(powers, n_meas, spectral_axis, freq_center, sigma, deg, n_sub,
+                                       cleaning_method, chunk, pool, depth)
+            # As in cleanData, indices into the subtracted run are applied to the raw columns
+            mask[outliers[outliers < n_meas]] = False
+            print(f"Removed {n_meas - mask.sum()}/{n_meas} outlier measurements")
+        kept = np.flatnonzero(mask)
+
+        # --- Subtract, bin and integrate the kept measurements
+        grid = spectralGrid(spectral_axis)
+        binned = grid.binned(bin_factor) if bin_factor and bin_factor > 1 else grid
+        binned_axis = binned.axis.copy()
+        lead, tail = _trim(deg, n_sub)
+        n_out = max(0, len(kept) - lead - tail)
+
+        processed = None
+        if out is not None:
+            processed = np.lib.format.open_memmap(out, mode='w+', dtype=np.float64,
+                                                  shape=(len(binned_axis), n_out))
+
+        def read_kept(a, b):
+            idx = kept[a:b]
+            if len(idx) and idx[-1] - idx[0] == len(idx) - 1:
+                return np.asarray(powers[:, idx[0]:idx[-1] + 1])
+            return np.asarray(powers[:, idx])
+
+        common = (spectral_axis, freq_center, sigma, deg, n_sub, 'processed', bin_factor)
+        integral_mask = binned.outsideMask(freq_center, sigma)
+        integral = RunningNoiseIntegral()
+        variance_integral, mean_power_levels = np.zeros(n_out), np.zeros(n_out)
+        signal_sum = np.zeros(len(binned_axis))
+
+        for s, block in _streamChunks(read_kept, n_out, chunk, lead, tail, common, pool, depth, 'Processing'):
+            e = s + block.shape[1]
+            variance_integral[s:e], mean_power_levels[s:e] = integral.update(block[integral_mask, :])
+            signal_sum += block.sum(axis=1)
+            if processed is not None:
+                processed[:, s:e] = block
+    finally:
+        Utilities.TEST_BOOL = verbose
+        if pool is not None:
+            pool.close()
+            pool.join()
+
+    if processed is not None:
+        processed.flush()
+    if n_out:
+        print(f'Final Mean Power Integral: {mean_power_levels[-1]:.2e} W, '
+              f'Final Variance Integral: {variance_integral[-1]:.2e} W')
+
+    if TEST_BOOL:
+        print(f"Chunked processing took {time.time() - start:.4f} seconds")
+
+    return {
+        'powers': processed,
+        'spectral_axis': binned_axis,
+        'mask': mask,
+        'variance_integral': variance_integral,
+        'mean_power_levels': mean_power_levels,
+        'signal_sum': signal_sum,
+    }
+
+
+if __name__ == "__main__":
+    import argparse
+    from Utilities import loadData
+
+    parser = argparse.ArgumentParser(description='Chunked (out-of-core) processing of a run')
+    parser.add_argument('--path', type=str, required=True)
+    parser.add_argument('--sigma', type=float, default=2.5e6)
+    parser.add_argument('--deg', type=int, default=3)
+    parser.add_argument('--n_sub', type=int, default=5)
+    parser.add_argument('--bin_factor', type=int, default=15)
+    parser.add_argument('--truncate', type=int, default=None, help='Keep only the first n measurements')
+    parser.add_argument('--clean', action='store_true', help='Run cleaning routine to remove outlier data')
+    parser.add_argument('--cleaning_method', type=str, default=CLEANING_METHODS[0], choices=CLEANING_METHODS)
+    parser.add_argument('--chunk', type=int, default=4096, help='Measurements per chunk')
+    parser.add_argument('--workers', type=int, default=1, help='Worker processes for the baseline fits')
+    parser.add_argument('--out', type=str, default=None, help='Write the processed matrix to this .npy file')
+    args = parser.parse_args()
+
+    powers, freqs, pressures, meta = loadData(args.path)
+    result = processRun(powers, freqs, float(meta['Center Frequency (Hz)']), args.sigma, args.deg, args.n_sub,
+                        truncate=args.truncate, cleaning_method=args.cleaning_method if args.clean else None,
+                        bin_factor=args.bin_factor, chunk=args.chunk, workers=args.workers, out=args.out)
+
+    if args.out:
+        base = args.out[:-4] if args.out.endswith('.npy') else args.out
+        np.savez(base + '_reductions.npz', spectral_axis=result['spectral_axis'], mask=result['mask'],
+                 variance_integral=result['variance_integral'],
+                 mean_power_levels=result['mean_power_levels'], signal_sum=result['signal_sum'])
+        print(f"Processed powers saved to {args.out}, reductions to {base}_reductions.npz")
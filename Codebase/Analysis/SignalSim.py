@@ -1,9 +1,9 @@
 import os
 
 from Utilities import loadData, subtractBaseline
+from SpectralGrid import spectralGrid
 
 import numpy as np
-import matplotlib.pyplot as plt
 from scipy import constants as const
 
 # I_V =
@@ -45,6 +45,8 @@ class SignalSim:
         self.PHI_D = constants['PHI_D']
         self.A_p = constants['A_p'] * 0.0001 # convert from cm^2 to m^2
 
+        self._grid = None
+
     def COPower(self, co_ppm, pressure, CO_bandwidth):
         # Gives the expected power for a given concentration (per measurement)
         pressure_pa = pressure * 100 # convert from mbar to Pa
@@ -70,7 +72,7 @@ class SignalSim:
         return normalization * np.exp(-((x - mu)**2) / (2 * sigma**2))
     
     def generateCOSignal(self, pressure, co_ppm):
-        freqs = np.linspace(self.CENTER_FREQ - self.SPAN/2, self.CENTER_FREQ + self.SPAN/2, self.N_PTS)
+        freqs = self.getSpectralGrid().axis
         signal = self.COPowerAtFreq(co_ppm, pressure, freqs)
         return signal
 
@@ -82,7 +84,7 @@ class SignalSim:
         """Adds a random baseline to a given measurement, using the same method as the baseline subtraction routine"""
 
         coeffs_idx = np.random.randint(0, self.BASELINE_COEFFS.shape[0])
-        x = np.linspace(self.CENTER_FREQ - self.SPAN/2, self.CENTER_FREQ + self.SPAN/2, self.N_PTS)
+        x = self.getSpectralGrid().axis
         polyval = np.polyval(self.BASELINE_COEFFS[coeffs_idx, :], x)
 
         return measurement + polyval
@@ -114,8 +116,15 @@ class SignalSim:
     def getSpectralAxis(self):
         return np.linspace(self.CENTER_FREQ - self.SPAN/2, self.CENTER_FREQ + self.SPAN/2, self.N_PTS)
 
+    def getSpectralGrid(self):
+        # Built once instead of per simulated measurement
+        if self._grid is None:
+            self._grid = spectralGrid(self.getSpectralAxis())
+        return self._grid
+
     def simulateExample(self):
         # Plots CO signal, noise, baseline on seperate graphs, then their combiend sum on the last
+        import matplotlib.pyplot as plt
         pressure = self.pressures[len(self.pressures) // 2]
         co_ppm = float(self.meta['initial_CO_concentration (ppm)'].replace('>', '').replace('<', '')) * (self.pressures[0] / pressure)
         
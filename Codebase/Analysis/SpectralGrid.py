@@ -0,0 +1,126 @@
+"""
+Frequency-axis operators shared by the analysis code.
+
+Every processing step derives the same few arrays from the spectral axis:
+the mask of frequencies outside the +/- sigma signal region, the region of
+interest around the center, the Vandermonde matrix and least-squares
+operator of the baseline fit, and the binned axis. A SpectralGrid builds
+each of those once, on first use, and keeps it keyed by its parameters
+(center, sigma, deg, bin factor).
+
+spectralGrid(spectral_axis) returns the shared grid for an axis, so the
+functions in Utilities, Graphing, Comparison and SignalSim keep taking plain
+frequency arrays and still reuse one set of operators per run. The cached
+arrays are read-only.
+"""
+from collections import OrderedDict
+import warnings
+
+import numpy as np
+
+_MAX_GRIDS = 16
+_GRIDS = OrderedDict()
+
+
+def _frozen(arr):
+    arr.setflags(write=False)
+    return arr
+
+
+class SpectralGrid:
+    """A frequency axis (Hz) and the masks / fit operators derived from it."""
+
+    def __init__(self, spectral_axis):
+        self.axis = _frozen(np.array(spectral_axis, dtype=float))
+        self._cache = {}
+
+    def __len__(self):
+        return len(self.axis)
+
+    def _cached(self, key, build):
+        if key not in self._cache:
+            self._cache[key] = build()
+        return self._cache[key]
+
+    def outsideMask(self, center, sigma, inclusive=False):
+        """
+        Frequencies outside center +/- sigma (the baseline / noise region).
+        With inclusive=True the boundary frequencies count as outside.
+        """
+        def build():
+            if inclusive:
+                mask = (self.axis <= center - sigma) | (self.axis >= center + sigma)
+            else:
+                mask = (self.axis < (center - sigma)) | (self.axis > (center + sigma))
+            return _frozen(mask)
+        return self._cached(('outside', center, sigma, inclusive), build)
+
+    def roi(self, center, half_width):
+        """Slice of the frequencies within center +/- half_width (inclusive); needs an ascending axis."""
+        def build():
+            if np.any(np.diff(self.axis) < 0):
+                raise ValueError("Spectral axis is not ascending; an ROI slice needs a sorted axis")
+            return slice(int(np.searchsorted(self.axis, center - half_width, side='left')),
+                         int(np.searchsorted(self.axis, center + half_width, side='right')))
+        return self._cached(('roi', center, half_width), build)
+
+    def vander(self, deg):
+        """Vandermonde matrix of the axis (highest power first, as np.polyval)."""
+        return self._cached(('vander', deg), lambda: _frozen(np.vander(self.axis, deg + 1)))
+
+    def projector(self, center, sigma, deg):
+        """
+        Least-squares operator of the baseline fit: coeffs = P @ power.
+        Built the way np.polyfit solves its fit on the frequencies outside
+        center +/- sigma (Vandermonde with unit-norm columns, same rcond, same
+        RankWarning), with zero weight on the excluded frequencies so it
+        applies to whole columns.
+        """
+        def build():
+            fit_mask = self.outsideMask(center, sigma)
+            masked_freqs = self.axis[fit_mask]
+            lhs = np.vander(masked_freqs, deg + 1)
+            scale = np.sqrt((lhs * lhs).sum(axis=0))
+            rcond = len(masked_freqs) * np.finfo(masked_freqs.dtype).eps
+
+            u, s, vt = np.linalg.svd(lhs / scale, full_matrices=False)
+            keep = s > rcond * s[0]
+            if keep.sum() != deg + 1:
+                warnings.warn('Polyfit may be poorly conditioned', np.exceptions.RankWarning, stacklevel=4)
+
+            projector = np.zeros((deg + 1, len(self.axis)))
+            projector[:, fit_mask] = (vt[keep].T / s[keep]) @ u[:, keep].T / scale[:, None]
+            return _frozen(projector)
+        return self._cached(('projector', center, sigma, deg), build)
+
+    def binned(self, n):
+        """Grid of the binned axis: mean frequency of each group of n (as binData)."""
+        def build():
+            n_bins = len(self.axis) // n
+            return spectralGrid(self.axis[:n_bins * n].reshape(n_bins, n).mean(axis=1))
+        return self._cached(('binned', n), build)
+
+
+def spectralGrid(spectral_axis):
+    """
+    Shared SpectralGrid for a frequency axis (the same grid is returned for
+    equal axes, so its operators are built once per run).
+
+    Args:
+        spectral_axis (np.array or SpectralGrid): 1D array of frequencies in Hz.
+
+    Returns:
+        SpectralGrid: Grid wrapping the axis.
+    """
+    if isinstance(spectral_axis, SpectralGrid):
+        return spectral_axis
+    axis = np.asarray(spectral_axis, dtype=float)
+    key = axis.tobytes()
+    grid = _GRIDS.get(key)
+    if grid is None:
+        grid = _GRIDS[key] = SpectralGrid(axis)
+        if len(_GRIDS) > _MAX_GRIDS:
+            _GRIDS.popitem(last=False)
+    else:
+        _GRIDS.move_to_end(key)
+    return grid
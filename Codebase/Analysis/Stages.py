@@ -0,0 +1,302 @@
+"""
+Memoized processing stages with an on-disk cache and a provenance manifest.
+
+Graphing's processing (truncate -> clean -> baseline subtract -> bin) is
+expressed as a small DAG of stages. A stage's key is a hash of its name, its
+parameters, the keys of its inputs and the source of the processing modules,
+so the key of the raw data (the loadData content hash) plus the settings
+identifies every intermediate. Outputs are stored as .npy arrays in the
+DataCache folder under 'stages' (2D arrays memory mapped on load) and evicted
+least recently used like the parsed logs.
+
+Asking for a stage loads it if it is cached, otherwise it resolves its inputs
+the same way and runs; so after a change only the stages downstream of it are
+recomputed (a new bin factor re-bins the cached subtracted powers, a new plot
+flag recomputes nothing). Stages fed by something that is not reproducible
+(simulated data) are never cached.
+
+manifest() records every stage (parameters, key, cached or computed,
+timing, output shapes) for writing next to the figures.
+"""
+import os
+import sys
+import json
+import time
+import uuid
+import shutil
+import hashlib
+
+import numpy as np
+
+import DataCache
+from Utilities import cleanData, subtractBaseline, binData, truncData, IterativeCleaner
+
+global TEST_BOOL
+TEST_BOOL = True
+
+STAGE_FOLDER = 'stages'
+# Changing any of these invalidates every cached stage
+PROCESSING_MODULES = ('Stages', 'Utilities', 'Binning', 'SpectralGrid')
+
+_CODE_HASHES = {}
+
+
+def _codeHash(modules):
+    """Hash of the source files of the given (imported) modules."""
+    modules = tuple(sorted(set(modules)))
+    if modules not in _CODE_HASHES:
+        digest = hashlib.blake2b(digest_size=20)
+        for name in modules:
+            path = getattr(sys.modules.get(name), '__file__', None)
+            if path and os.path.isfile(path):
+                with open(path, 'rb') as f:
+                    digest.update(f.read())
+        _CODE_HASHES[modules] = digest.hexdigest()
+    return _CODE_HASHES[modules]
+
+
+def sourceKey(path):
+    """
+    Key of the raw data loadData reads from path: the log's content hash, or
+    for a folder of arrays the combined hash of its files.
+    """
+    if os.path.isdir(path):
+        digest = hashlib.blake2b(digest_size=20)
+        for name in ('powers.npy', 'freqs.npy', 'pressure.npy', 'metadata.json'):
+            file = os.path.join(path, name)
+            if os.path.isfile(file):
+                digest.update(DataCache.cacheKey(file).encode())
+        return digest.hexdigest()
+    return DataCache.cacheKey(path)
+
+
+class Stage:
+    """
+    One node of a StageGraph (created by StageGraph.source / StageGraph.add).
+
+    Attributes:
+        name (str): Stage name.
+        params (dict): Parameters passed to the stage function.
+        parents (tuple): Input stages.
+        key (str): Hash identifying the stage output.
+        cacheable (bool): Whether the output is stored on disk.
+    """
+
+    def __init__(self, name, func, params, parents, cacheable, key=None):
+        self.name = name
+        self.func = func
+        self.params = params
+        self.parents = parents
+        self.cacheable = cacheable and all(p.cacheable for p in parents)
+        if key is None:
+            if self.cacheable:
+                code = _codeHash(PROCESSING_MODULES + (func.__module__,))
+                spec = json.dumps({'name': name, 'func': f'{func.__module__}.{func.__qualname__}', 'params': params,
+                                   'parents': [p.key for p in parents], 'code': code}, sort_keys=True, default=str)
+                key = hashlib.blake2b(spec.encode(), digest_size=20).hexdigest()
+            else:
+                key = f'uncached-{uuid.uuid4().hex}'
+        self.key = key
+
+    def __repr__(self):
+        return f"Stage({self.name!r}, {self.key[:12]})"
+
+
+class StageGraph:
+    """
+    Processing stages evaluated lazily and memoized in memory and on disk.
+
+    Stage functions take their parents' outputs (dicts of arrays, in order)
+    followed by the stage parameters as keyword arguments, and return a dict
+    of arrays. Parameters must be JSON serialisable; they are part of the key.
+
+    Example:
+        graph = StageGraph()
+        raw = graph.source('load', sourceKey(path), powers=powers, freqs=freqs)
+        sub = graph.add('subtract', subtract, raw, freq_center=fc, sigma=2.5e6, deg=3, n_sub=5)
+        binned = graph.add('bin', binPowers, sub, bin_factor=15)
+        powers, freqs = graph.result(binned)['powers'], graph.result(binned)['freqs']
+
+    Args:
+        cache_dir (str): Folder for the stored stages (default: the DataCache folder's 'stages').
+    """
+
+    def __init__(self, cache_dir=None):
+        self.cache_dir = cache_dir or os.path.join(DataCache.cacheDir(), STAGE_FOLDER)
+        self.stages = []
+        self._results = {}
+        self._records = {}
+
+    def source(self, name, key, **arrays):
+        """Input stage holding the given arrays, identified by key (e.g. sourceKey of the data path)."""
+        stage = Stage(name, None, {}, (), cacheable=key is not None, key=key)
+        self._results[stage.key] = arrays
+        self._records[stage.key] = {'status': 'source', 'seconds': 0.0}
+        self.stages.append(stage)
+        return stage
+
+    def add(self, name, func, parents, cache=True, **params):
+        """
+        Add a stage (not run until its result is asked for).
+
+        Args:
+            name (str): Stage name (recorded in the manifest).
+            func (callable): Stage function, func(*parent_outputs, **params) -> dict of arrays.
+            parents (Stage or tuple): Input stage(s).
+            cache (bool): False for stages whose output is not reproducible (e.g. random);
+                they and everything downstream are recomputed every run.
+            **params: Stage parameters.
+
+        Returns:
+            stage (Stage): The new stage.
+        """
+        parents = (parents,) if isinstance(parents, Stage) else tuple(parents)
+        stage = Stage(name, func, params, parents, cacheable=cache)
+        self.stages.append(stage)
+        return stage
+
+    def _entry(self, stage):
+        return os.path.join(self.cache_dir, stage.key)
+
+    def _load(self, stage):
+        entry = self._entry(stage)
+        info_path = os.path.join(entry, 'metadata.json')
+        if not os.path.isfile(info_path):
+            return None, None
+        try:
+            with open(info_path, 'r') as f:
+                info = json.load(f)
+            arrays = {}
+            for name in info['outputs']:
+                arr = np.load(os.path.join(entry, f'{name}.npy'), mmap_mode='r')
+                arrays[name] = arr if arr.ndim > 1 else np.array(arr)
+        except (OSError, ValueError, KeyError):
+            # Half-written or corrupt entry: treat as a miss, it gets rewritten
+            return None, None
+        os.utime(info_path)
+        return arrays, info
+
+    def _store(self, stage, arrays, seconds):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        entry = self._entry(stage)
+        tmp = f'{entry}.{os.getpid()}.tmp'
+        os.makedirs(tmp, exist_ok=True)
+        try:
+            for name, arr in arrays.items():
+                np.save(os.path.join(tmp, f'{name}.npy'), np.asarray(arr))
+            with open(os.path.join(tmp, 'metadata.json'), 'w') as f:
+                json.dump({'name': stage.name, 'params': stage.params, 'parents': [p.key for p in stage.parents],
+                           'outputs': list(arrays), 'compute_seconds': seconds,
+                           'created': time.strftime('%Y-%m-%dT%H:%M:%S')}, f, indent=4, default=str)
+            if os.path.isdir(entry):
+                shutil.rmtree(tmp)
+            else:
+                os.replace(tmp, entry)
+        except BaseException:
+            shutil.rmtree(tmp, ignore_errors=True)
+            raise
+        if self.cache_dir == os.path.join(DataCache.cacheDir(), STAGE_FOLDER):
+            DataCache.evict(keep=stage.key, folder=STAGE_FOLDER)
+
+    def result(self, stage):
+        """
+        Output of a stage: from memory, from the disk cache, or computed
+        (resolving its inputs the same way).
+
+        Returns:
+            outputs (dict): Arrays returned by the stage function (2D arrays read-only when loaded from disk).
+        """
+        if stage.key in self._results:
+            return self._results[stage.key]
+
+        start = time.time()
+        if stage.cacheable:
+            arrays, info = self._load(stage)
+            if arrays is not None:
+                seconds = time.time() - start
+                self._results[stage.key] = arrays
+                self._records[stage.key] = {'status': 'cached', 'seconds': seconds,
+                                            'compute_seconds': info.get('compute_seconds')}
+                if TEST_BOOL:
+                    print(f"Stage '{stage.name}' loaded from cache ({seconds:.4f} seconds, "
+                          f"computed in {info.get('compute_seconds', 0):.4f})")
+                return arrays
+
+        inputs = [self.result(parent) for parent in stage.parents]
+        start = time.time()
+        arrays = stage.func(*inputs, **stage.params)
+        seconds = time.time() - start
+        if stage.cacheable:
+            self._store(stage, arrays, seconds)
+        self._results[stage.key] = arrays
+        self._records[stage.key] = {'status': 'computed' if stage.cacheable else 'uncached', 'seconds': seconds,
+                                    'compute_seconds': seconds}
+        if TEST_BOOL:
+            print(f"Stage '{stage.name}' computed in {seconds:.4f} seconds")
+        return arrays
+
+    def manifest(self):
+        """
+        Provenance of every stage, in the order they were added.
+
+        Returns:
+            stages (list): One dict per stage: name, key, parents, params, status
+                ('source', 'cached', 'computed', 'uncached', or 'skipped' when a
+                later stage came from the cache), seconds this run, compute_seconds
+                and output shapes / dtypes.
+        """
+        stages = []
+        for stage in self.stages:
+            record = self._records.get(stage.key, {'status': 'skipped', 'seconds': 0.0})
+            outputs = self._results.get(stage.key, {})
+            stages.append({'name': stage.name, 'key': stage.key, 'parents': [p.key for p in stage.parents],
+                           'params': stage.params, **record,
+                           'outputs': {k: {'shape': list(np.shape(v)), 'dtype': str(np.asarray(v).dtype)}
+                                       for k, v in outputs.items()}})
+        return stages
+
+
+# Standard stages: each takes the parent's {'powers', 'freqs', ...} dict
+
+def truncateEnds(data, mhz):
+    """Remove mhz from each end of the spectrum."""
+    freqs = data['freqs']
+    n_trunc = mhz * 1e6
+    freqs_mask = (freqs >= freqs.min() + n_trunc) & (freqs <= freqs.max() - n_trunc)
+    return {'powers': np.asarray(data['powers'][freqs_mask, :]), 'freqs': freqs[freqs_mask]}
+
+
+def truncateMeasurements(data, n):
+    """Keep the first n measurements (truncData)."""
+    return {'powers': np.asarray(truncData(data['powers'], n=n)), 'freqs': data['freqs']}
+
+
+def clean(data, freq_center, sigma, deg, n_sub, cleaning_method=None, rejects=False):
+    """cleanData; with rejects, keep the rejected measurements instead (GRAPH_REJECTS)."""
+    kwargs = {} if cleaning_method is None else {'cleaning_method': cleaning_method}
+    cleaned, mask = cleanData(data['powers'], data['freqs'], freq_center, sigma, deg=deg, n_sub=n_sub, **kwargs)
+    if rejects:
+        cleaned = np.asarray(data['powers'])[:, ~mask]
+    return {'powers': cleaned, 'freqs': data['freqs'], 'mask': mask}
+
+
+def iterativeClean(data, freq_center, sigma, deg, n_sub, cleaning_method, max_iter=0):
+    """Brute force clean (IterativeCleaner) until max_iter passes or nothing is rejected."""
+    cleaner = IterativeCleaner(data['powers'], data['freqs'], freq_center, sigma, deg=deg, n_sub=n_sub,
+                               cleaning_method=cleaning_method)
+    cleaner.run(max_iter=max_iter)
+    print(f"Data cleaning complete after {len(cleaner.history)} iterations "
+          f"({sum(h[3] for h in cleaner.history):.2f} s).")
+    return {'powers': cleaner.cleaned(), 'freqs': data['freqs'], 'mask': cleaner.mask}
+
+
+def subtract(data, freq_center, sigma, deg, n_sub):
+    """subtractBaseline."""
+    return {'powers': subtractBaseline(data['powers'], data['freqs'], freq_center, sigma, deg, n_sub),
+            'freqs': data['freqs']}
+
+
+def binPowers(data, bin_factor):
+    """binData."""
+    powers, freqs = binData(data['powers'], data['freqs'], n=bin_factor)
+    return {'powers': powers, 'freqs': freqs}
@@ -0,0 +1,260 @@
+"""
+Parameter sweeps over the processing settings.
+
+Graphing.py processes a run with one set of settings (sigma, deg, n_sub,
+bin_factor, the TRUNCATE_ENDS width and the cleaning method). sweep() runs
+the same chain (truncate ends -> clean -> baseline subtract -> bin -> noise
+integral) for every point of a parameter grid across a process pool and
+tabulates, per configuration, the final noise std, the SNR of the summed
+signal at the center ROI and the runtime.
+
+The powers are shared rather than sent to every worker: workers open one
+.npy file memory mapped (the DataCache entry loadData already maps, or a
+temporary copy). Points that only differ in the bin factor share the rest of
+the chain: configurations are grouped by (ends, sigma, deg, n_sub, cleaning),
+each group cleans and subtracts once and then bins every factor from one
+BinPyramid. A configuration's runtime is its group's shared time plus its
+own binning and metrics, i.e. what it would cost on its own.
+"""
+import io
+import os
+import csv
+import time
+import shutil
+import tempfile
+import itertools
+from contextlib import redirect_stdout
+from multiprocessing import Pool
+
+import numpy as np
+
+import Utilities
+from Utilities import cleanData, subtractBaseline, binData, computeNoiseIntegral, OUTLIER_DETECTORS
+from Binning import BinPyramid
+from SpectralGrid import spectralGrid
+
+global TEST_BOOL
+TEST_BOOL = True
+
+# Settings a grid can vary, with Graphing's defaults
+SWEEP_DEFAULTS = {
+    'ends': 0.0,          # MHz removed on each side of the spectrum (TRUNCATE_ENDS)
+    'sigma': 2.5e6,
+    'deg': 3,
+    'n_sub': 5,
+    'bin_factor': 15,
+    'cleaning': None,     # None or one of OUTLIER_DETECTORS
+}
+_GROUP_KEYS = ('ends', 'sigma', 'deg', 'n_sub', 'cleaning')
+_COLUMNS = ('ends', 'sigma', 'deg', 'n_sub', 'bin_factor', 'cleaning', 'kept',
+            'noise_std', 'snr', 'shared_s', 'runtime_s')
+
+_POWERS = None
+
+
+def parameterGrid(**values):
+    """
+    Every combination of the given setting values (SWEEP_DEFAULTS for the rest).
+
+    Example:
+        parameterGrid(sigma=[1e6, 2.5e6], bin_factor=[1, 10, 15])
+
+    Returns:
+        configs (list): One dict of settings per grid point.
+    """
+    for key in values:
+        if key not in SWEEP_DEFAULTS:
+            raise ValueError(f"Unknown sweep setting: {key}")
+    axes = [values.get(key, [default]) for key, default in SWEEP_DEFAULTS.items()]
+    return [dict(zip(SWEEP_DEFAULTS, point)) for point in itertools.product(*axes)]
+
+
+def _initWorker(path):
+    global _POWERS
+    _POWERS = np.load(path, mmap_mode='r')
+    Utilities.TEST_BOOL = False
+
+
+def _sharedFile(powers):
+    """.npy file holding powers for the workers: the memmap's own file if it is one, else a temporary copy."""
+    filename = getattr(powers, 'filename', None)
+    if isinstance(powers, np.memmap) and filename and str(filename).endswith('.npy'):
+        mapped = np.load(filename, mmap_mode='r')
+        if mapped.shape == powers.shape and mapped.dtype == powers.dtype:
+            return str(filename), None
+    tmp = tempfile.mkdtemp(prefix='hs_sweep_')
+    path = os.path.join(tmp, 'powers.npy')
+    np.save(path, np.asarray(powers))
+    return path, tmp
+
+
+def _metrics(powers, spectral_axis, freq_center, sigma):
+    """Final noise std (as plotNoiseVsTimeAndMeasurement) and center ROI SNR of the summed signal (as plotSignal)."""
+    if powers.shape[1] == 0:
+        return np.nan, np.nan
+    variance, _ = computeNoiseIntegral(powers, spectral_axis, freq_center, sigma, checkpoints=[powers.shape[1]])
+    noise_std = float(np.sqrt(variance[-1]))
+
+    grid = spectralGrid(spectral_axis)
+    signal = powers.sum(axis=1)
+    outside = signal[grid.outsideMask(freq_center, sigma)]
+    roi = signal[grid.roi(freq_center, sigma)]
+    if len(roi) == 0 or len(outside) < 2:
+        return noise_std, np.nan
+    snr = float((roi.max() - outside.mean()) / outside.std())
+    return noise_std, snr
+
+
+def _runGroup(job):
+    """Worker: one (ends, sigma, deg, n_sub, cleaning) group, every bin factor."""
+    settings, bin_factors, spectral_axis, freq_center, n_meas = job
+    start = time.time()
+    with redirect_stdout(io.StringIO()):
+        ends = settings['ends'] * 1e6
+        freq_mask = (spectral_axis >= spectral_axis.min() + ends) & (spectral_axis <= spectral_axis.max() - ends)
+        freqs = spectral_axis[freq_mask]
+        powers = np.asarray(_POWERS[freq_mask, :n_meas], dtype=np.float64)
+        sigma, deg, n_sub = settings['sigma'], settings['deg'], settings['n_sub']
+
+        if settings['cleaning'] is not None:
+            powers, _ = cleanData(powers, freqs, freq_center, sigma, deg, n_sub, cleaning_method=settings['cleaning'])
+        sub = subtractBaseline(powers, freqs, freq_center, sigma, deg, n_sub)
+
+        # Several bin factors: bin them all from one set of prefix sums
+        binned_factors = [b for b in bin_factors if b and b > 1]
+        pyramid = BinPyramid(sub, freqs, factors=()) if len(binned_factors) > 1 else None
+        shared = time.time() - start
+
+        rows = []
+        for bin_factor in bin_factors:
+            own = time.time()
+            if bin_factor and bin_factor > 1:
+                binned, bfreqs = pyramid.bin(bin_factor) if pyramid else binData(sub, freqs, n=bin_factor)
+            else:
+                binned, bfreqs = sub, freqs
+            noise_std, snr = _metrics(binned, bfreqs, freq_center, sigma)
+            rows.append(dict(settings, bin_factor=bin_factor, kept=sub.shape[1], noise_std=noise_std, snr=snr,
+                             shared_s=shared, runtime_s=shared + time.time() - own))
+    return rows
+
+
+def sweep(powers, spectral_axis, freq_center, configs, n_meas=None, workers=None, out=None):
+    """
+    Evaluate the processing chain for every configuration.
+
+    Args:
+        powers (np.array): 2D array of power readings (frequencies x measurements), e.g. loadData's memmap.
+        spectral_axis (np.array): 1D array of frequencies in Hz.
+        freq_center (float): Central frequency of the signal.
+        configs (list or dict): Settings per point (parameterGrid), or a dict of value lists to grid.
+        n_meas (int): Use only the first n measurements (truncData).
+        workers (int): Worker processes (default: all cores; 1 runs in-process).
+        out (str): CSV path for the result table.
+
+    Returns:
+        rows (list): One dict per configuration (settings plus kept, noise_std, snr, shared_s, runtime_s),
+            in the order of configs.
+    """
+    if TEST_BOOL:
+        start = time.time()
+
+    if isinstance(configs, dict):
+        configs = parameterGrid(**configs)
+    configs = [dict(SWEEP_DEFAULTS, **config) for config in configs]
+    for config in configs:
+        if config['cleaning'] is not None and config['cleaning'] not in OUTLIER_DETECTORS:
+            raise ValueError(f"Invalid cleaning method: {config['cleaning']}")
+
+    # Group the points that share everything before binning
+    groups = {}
+    for config in configs:
+        key = tuple(config[k] for k in _GROUP_KEYS)
+        groups.setdefault(key, [])
+        if config['bin_factor'] not in groups[key]:
+            groups[key].append(config['bin_factor'])
+    spectral_axis = np.asarray(spectral_axis, dtype=float)
+    n_meas = powers.shape[1] if n_meas is None else min(int(n_meas), powers.shape[1])
+    jobs = [(dict(zip(_GROUP_KEYS, key)), bin_factors, spectral_axis, freq_center, n_meas)
+            for key, bin_factors in groups.items()]
+
+    workers = min(workers or os.cpu_count() or 1, len(jobs)) or 1
+    results = {}
+    global _POWERS
+    if workers == 1:
+        previous, verbose = _POWERS, Utilities.TEST_BOOL
+        _POWERS, Utilities.TEST_BOOL = powers, False
+        try:
+            for k, job in enumerate(jobs):
+                for row in _runGroup(job):
+                    results[(tuple(row[key] for key in _GROUP_KEYS), row['bin_factor'])] = row
+                if TEST_BOOL:
+                    print(f"Sweep: {k + 1}/{len(jobs)} groups", end='\r')
+        finally:
+            _POWERS, Utilities.TEST_BOOL = previous, verbose
+    else:
+        path, tmp = _sharedFile(powers)
+        try:
+            with Pool(workers, initializer=_initWorker, initargs=(path,)) as pool:
+                for k, rows in enumerate(pool.imap_unordered(_runGroup, jobs)):
+                    for row in rows:
+                        results[(tuple(row[key] for key in _GROUP_KEYS), row['bin_factor'])] = row
+                    if TEST_BOOL:
+                        print(f"Sweep: {k + 1}/{len(jobs)} groups", end='\r')
+        finally:
+            if tmp is not None:
+                shutil.rmtree(tmp, ignore_errors=True)
+    if TEST_BOOL and jobs:
+        print()
+
+    rows = [results[(tuple(config[key] for key in _GROUP_KEYS), config['bin_factor'])] for config in configs]
+
+    if out:
+        with open(out, 'w', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=_COLUMNS)
+            writer.writeheader()
+            writer.writerows({key: row[key] for key in _COLUMNS} for row in rows)
+
+    if TEST_BOOL:
+        print(f"Parameter sweep ({len(configs)} configurations, {len(jobs)} groups) took {time.time() - start:.4f} seconds")
+
+    return rows
+
+
+def printTable(rows):
+    """Print sweep results as an aligned table."""
+    print(f"{'ends MHz':>8} {'sigma':>9} {'deg':>3} {'n_sub':>5} {'bin':>4} {'cleaning':<42} {'kept':>7} "
+          f"{'noise std':>10} {'SNR':>8} {'time s':>7}")
+    for row in rows:
+        print(f"{row['ends']:>8g} {row['sigma']:>9.3g} {row['deg']:>3} {row['n_sub']:>5} {row['bin_factor']:>4} "
+              f"{str(row['cleaning']):<42} {row['kept']:>7} {row['noise_std']:>10.3e} {row['snr']:>8.2f} "
+              f"{row['runtime_s']:>7.3f}")
+
+
+if __name__ == "__main__":
+    import argparse
+    from Utilities import loadData
+
+    methods = list(OUTLIER_DETECTORS)
+    parser = argparse.ArgumentParser(description='Sweep processing settings over a run')
+    parser.add_argument('--path', type=str, required=True)
+    parser.add_argument('--sigma', type=float, nargs='+', default=[SWEEP_DEFAULTS['sigma']])
+    parser.add_argument('--deg', type=int, nargs='+', default=[SWEEP_DEFAULTS['deg']])
+    parser.add_argument('--n_sub', type=int, nargs='+', default=[SWEEP_DEFAULTS['n_sub']])
+    parser.add_argument('--bin_factor', type=int, nargs='+', default=[SWEEP_DEFAULTS['bin_factor']])
+    parser.add_argument('--ends', type=float, nargs='+', default=[SWEEP_DEFAULTS['ends']],
+                        help='MHz removed on each side of the spectrum')
+    parser.add_argument('--clean', type=int, nargs='+', default=[0],
+                        help='Cleaning methods: 0 = none, ' + ', '.join(f'{i + 1} = {m}' for i, m in enumerate(methods)))
+    parser.add_argument('--truncate', type=int, default=None, help='Use only the first n measurements')
+    parser.add_argument('--workers', type=int, default=None, help='Worker processes (default: all cores)')
+    parser.add_argument('--out', type=str, default=None, help='Write the result table to this CSV file')
+    args = parser.parse_args()
+
+    powers, freqs, pressures, meta = loadData(args.path)
+    grid = parameterGrid(sigma=args.sigma, deg=args.deg, n_sub=args.n_sub, bin_factor=args.bin_factor,
+                         ends=args.ends, cleaning=[methods[c - 1] if c else None for c in args.clean])
+    rows = sweep(powers, freqs, float(meta['Center Frequency (Hz)']), grid, n_meas=args.truncate,
+                 workers=args.workers, out=args.out)
+    printTable(rows)
+    if args.out:
+        print(f"Sweep table saved to {args.out}")
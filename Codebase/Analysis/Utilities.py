@@ -2,10 +2,14 @@ import json
 import csv
 import time
 import os
+import copy
 
 import numpy as np
-import pandas as pd
-from matplotlib import pyplot as plt
+
+import DataCache
+from LogReader import readLog
+from SpectralGrid import spectralGrid
+from Binning import binEdges, binAxis, scaleRemainder
 
 global TEST_BOOL
 TEST_BOOL = True
@@ -20,7 +24,8 @@ def loadData(path):
 
     Returns:
         metadata (dict): Dictionary of configuration parameters.
-        powers (np.array): 2D array of power readings (frequencies x measurements).
+        powers (np.array): 2D array of power readings (frequencies x measurements),
+            memory mapped read-only when loaded from the cache.
         spectral_axis (np.array): 1D array of frequencies in Hz.
         pressure (np.array): 1D array of pressure readings for each measurement.
     """
@@ -30,46 +35,23 @@ def loadData(path):
         start = time.time()
 
     if path.endswith('.csv'):
-        # 1. Parse Metadata from comments
-        with open(path, 'r') as f:
-            for i, line in enumerate(f):
-                if line.startswith('#'):
-                    # Clean up the line and split by first colon
-                    content = line.lstrip('#').strip()
-                    if ':' in content:
-                        key, val = content.split(':', 1)
-                        metadata[key.strip()] = val.strip()
-                else:
-                    break
-        
-        # 2. Load Data using pandas
-        df = pd.read_csv(path, comment='#')
-        
-        # 3. Extract Spectral Axis (frequencies)
-        freq_columns = [col for col in df.columns if 'Hz' in col]
-        spectral_axis = np.array([float(col.split(' ')[0]) for col in freq_columns])
-        
-        # 4. Extract Power values
-        powers = df[freq_columns].to_numpy().transpose()  # Transpose to get frequencies x measurements
-
-        # 5. Extract Pressure values
-        pressure = df['Pressure'].to_numpy()
-
-        # Save as numpy arrays for faster processing
-        folder_name = path.replace('.csv', '_pickled_data').split('/')[-1]
-        os.makedirs(folder_name, exist_ok=True)
-        
-        np.save(os.path.join(folder_name, 'powers.npy'), powers)
-        np.save(os.path.join(folder_name, 'freqs.npy'), spectral_axis)
-        np.save(os.path.join(folder_name, 'pressure.npy'), pressure)
-        with open(os.path.join(folder_name, 'metadata.json'), 'w') as f:
-            json.dump(metadata, f, indent=4)
-
-        print(f"Data loaded and saved as numpy arrays in folder: {folder_name}")
+        # Parsed logs are cached by content (see DataCache); a changed or
+        # still-growing log gets a new key and is parsed again
+        key = DataCache.cacheKey(path)
+        cached = DataCache.loadEntry(key)
+        if cached is not None:
+            powers, spectral_axis, pressure, metadata = cached
+            print(f"Data loaded from cache: {os.path.join(DataCache.cacheDir(), key)}")
+        else:
+            # Parse with the layout-aware reader (parallel chunks); float64 keeps
+            # the downstream numerics identical to the old pandas path
+            powers, spectral_axis, pressure, metadata = readLog(path, dtype=np.float64)
+            entry = DataCache.storeEntry(key, powers, spectral_axis, pressure, metadata)
+            print(f"Data loaded and cached as numpy arrays in folder: {entry}")
 
     elif os.path.isdir(path):
-        # Load from pre-saved numpy arrays
-        powers = np.load(os.path.join(path, 'powers.npy'))
+        # Load from pre-saved numpy arrays (old '_pickled_data' folders or a cache entry)
+        powers = np.load(os.path.join(path, 'powers.npy'), mmap_mode='r')
         spectral_axis = np.load(os.path.join(path, 'freqs.npy'))
         pressure = np.load(os.path.join(path, 'pressure.npy'))
         with open(os.path.join(path, 'metadata.json'), 'r') as f:
@@ -80,43 +62,60 @@ def loadData(path):
 
     return powers, spectral_axis, pressure, metadata
 
-def binData(powers, spectral_axis, n=10):
+def binData(powers, spectral_axis, n=10, remainder='drop', weights=None):
     """
     Bin the power data into n groups, computing the sum of the power and 
     using the mean frequencies in each bin.
 
     Args:
-        meta (dict): Metadata dictionary (not used in this function but can be useful for future extensions).
         powers (np.array): 2D array of power readings (frequencies x measurements).
         spectral_axis (np.array): 1D array of frequencies in Hz.
-        binning_factor (int): number of bins to count as one new.
+        n (int): number of bins to count as one new.
+        remainder (str): Frequencies left over after the last full bin: 'drop' (default),
+            'keep' (smaller last bin) or 'scale' (last bin scaled up to n points).
+        weights (np.array): Optional per-frequency weights for the sums and mean frequencies.
     
     Returns:
         binned_powers (np.array): 2D array of binned power values (bins x frequencies).
         binned_freqs (np.array): 1D array of mean frequencies for each bin.
+
+    For trying several bin factors on the same data use Binning.BinPyramid.
     """
 
     if TEST_BOOL:
         start = time.time()
-    n_bins = spectral_axis.shape[0] // n
-    new_spectral_axis = np.zeros(n_bins)
-    new_powers = np.zeros((n_bins, powers.shape[1]))
 
-    for i in range(n_bins):
-        # Get start and end indices for the current bin
-        start_row = i * (n)
-        end_row = (i + 1) * (n)
+    edges = binEdges(spectral_axis.shape[0], n, remainder)
+    new_spectral_axis = binAxis(spectral_axis, n, remainder, weights)
+
+    n_bins = len(edges) - 1
+    n_full = spectral_axis.shape[0] // n
+    rows = powers[:edges[-1], :]
+    if weights is not None:
+        rows = rows * np.asarray(weights, dtype=float)[:edges[-1], None]
 
-        # Get mean of axis and sum of powers for the current bin
-        new_spectral_axis[i] = spectral_axis[start_row:end_row].mean()
-        new_powers[i, :] = powers[start_row:end_row, :].sum(axis=0)
+    # Sum of powers for every full bin at once, then the remainder bin (if kept)
+    new_powers = np.zeros((n_bins, powers.shape[1]))
+    new_powers[:n_full] = rows[:n_full * n].reshape(n_full, n, powers.shape[1]).sum(axis=1)
+    if n_bins > n_full:
+        new_powers[n_full] = rows[n_full * n:].sum(axis=0)
+    new_powers = scaleRemainder(new_powers, edges, n, remainder)
     
     if TEST_BOOL:
         print(f"Binning data took {time.time() - start:.4f} seconds")
 
     return new_powers, new_spectral_axis
 
-def cleanData(powers, spectral_axis, freq_center, sigma, deg, n_sub, cleaning_method='Single Itteration Variance Integral Clean'):
+# Bit of each outlier detector in the reason mask returned by detectOutliers
+OUTLIER_DETECTORS = {
+    'Single Itteration Variance Integral Clean': 1,
+    'Mean Power Outlier Clean': 2,
+    'Median Power Outlier Clean': 4,
+    'True Rolling Variance Clean': 8,
+    'Shot Noise Clean': 16,
+}
+
+def cleanData(powers, spectral_axis, freq_center, sigma, deg, n_sub, cleaning_method='Single Itteration Variance Integral Clean', ret_reasons=False):
     """
     Cleans measurements by removing outlier measurements defined by a positive derivative of rolling standard deviation
 
@@ -125,47 +124,41 @@ def cleanData(powers, spectral_axis, freq_center, sigma, deg, n_sub, cleaning_me
         spectral_axis (np.array): 1D array of frequencies in Hz.
         freq_center (float): Central frequency to exclude from fitting.
         sigma (float): Width around the central frequency to exclude in fitting (+/- sigma).
+        cleaning_method (str or list): One of OUTLIER_DETECTORS, or several to reject what any of them flags
+            (all run over one baseline subtraction, see detectOutliers).
+        ret_reasons (bool): Also return the per-measurement reason bitmask.
     Returns:
         cleaned_powers (np.array): 2D array of power readings with outliers removed.
         measurement_indices (np.array): 1D array of indices corresponding to the cleaned measurements.
+        reasons (np.array): Reason bitmask (only if ret_reasons).
     """
 
     if TEST_BOOL:
         start = time.time() 
 
-    # shot_noise_outliers = shotNoiseReject(powers)
-    # print(f"Identified {len(shot_noise_outliers)}/{powers.shape[1]} outliers based on shot noise thresholding.")
-    
-    # --- METHOD 1 --- Outlier detection based on variance integral increases    
-    if cleaning_method == 'Single Itteration Variance Integral Clean':
-        outlier_indices = varianceIncreaseOutlierDet(powers, spectral_axis, freq_center, sigma, deg=deg, n=n_sub)
-
-    # --- METHOD 2 --- Outlier detection based on mean power deviations (commented out for now, can be used for comparison)
-    elif cleaning_method == 'Mean Power Outlier Clean':
-        outlier_indices = meanPowerOutlierDet(powers, spectral_axis, freq_center, sigma)
+    methods = [cleaning_method] if cleaning_method is None or isinstance(cleaning_method, str) else list(cleaning_method)
+    for method in methods:
+        if method not in OUTLIER_DETECTORS:
+            raise ValueError(f"Invalid cleaning method: {method}")
 
-    # --- METHOD 3 --- Outlier detection based on power deviations from median (commented out for now, can be used for comparison)
-    elif cleaning_method == 'Median Power Outlier Clean':
-        outlier_indices = powerMedDeviationOutlierDet(powers, spectral_axis, sigma, freq_center, deg=deg, n_sub=n_sub, tresh=2)
-
-    # --- METHOD 4 --- Outlier detection based on true rolling variance (commented out for now, can be used for comparison)
-    elif cleaning_method == 'True Rolling Variance Clean':
-        outlier_indices = trueRollingVarOutierDet(powers, spectral_axis, freq_center, sigma, deg=deg, n=n_sub)
-
-    else:
-        raise ValueError(f"Invalid cleaning method: {cleaning_method}")
+    # On its own the mean power detector keeps its fixed deg 3 / n=2 baseline
+    if methods == ['Mean Power Outlier Clean']:
+        deg, n_sub = 3, 2
 
-    # outlier_indices = np.unique(np.concatenate((outlier_indices, shot_noise_outliers)))
+    reasons = detectOutliers(powers, spectral_axis, freq_center, sigma, deg, n_sub, methods=methods)
 
-    mask = np.ones(powers.shape[1], dtype=bool)
-    mask[outlier_indices] = False
+    mask = reasons == 0
     masked_powers = powers[:, mask]
 
-    print(f"Removed {len(outlier_indices)}/{powers.shape[1]} outlier measurements")
+    print(f"Removed {np.count_nonzero(~mask)}/{powers.shape[1]} outlier measurements")
+    if len(methods) > 1:
+        print(', '.join(f"{method}: {count}" for method, count in reasonCounts(reasons, methods).items()))
 
     if TEST_BOOL:
         print(f"Data cleaning took {time.time() - start:.4f} seconds")
     
+    if ret_reasons:
+        return masked_powers, mask, reasons
     return masked_powers, mask
 
 def truncData(powers, n):
@@ -192,32 +185,23 @@ def subtractBaseline(powers, spectral_axis, freq_center, sigma, deg, n, ret_coef
     if deg == 0:
         return powers
 
-    new_powers = np.zeros_like(powers)
-
     coeffs_arr = np.zeros((powers.shape[1], deg + 1))
 
+    # Every measurement is fitted on the same masked frequencies, so the fit
+    # is one projection applied to all columns at once
+    grid = spectralGrid(spectral_axis)
+    coeffs = grid.projector(freq_center, sigma, deg) @ powers
+    vander = grid.vander(deg)
+
     # if n is 1 or 0, just do a single global fit to each measurement
     if n <= 1:
-        for i in range(powers.shape[1]):
-            # Get mask out central region for fitting
-            masked_power = powers[:,i][(spectral_axis < (freq_center - sigma)) | (spectral_axis > (freq_center + sigma))]
-            masked_freqs = spectral_axis[(spectral_axis < (freq_center - sigma)) | (spectral_axis > (freq_center + sigma))]
-
-            # Fit polynomial to masked data
-            coeffs = np.polyfit(masked_freqs, masked_power, deg=deg)
-            coeffs_arr[i,:] = coeffs
-
-            baseline = np.polyval(coeffs, spectral_axis)
-
-            # Subtract baseline from original power data
-            new_powers[:,i] = powers[:,i] - baseline
-
-            #  -- TESTING PLOT ---
-            # plt.plot(spectral_axis, powers[:,i], label='Original')
-            # polyval = np.polyval(coeffs, spectral_axis)
-            # plt.plot(spectral_axis, polyval, label='Baseline Fit')
-            # plt.show()
-        
+        coeffs_arr[:, :] = coeffs.T
+
+        # Subtract baseline from original power data
+        new_powers = vander @ coeffs
+        np.subtract(powers, new_powers, out=new_powers)
+        new_powers = new_powers.astype(powers.dtype, copy=False)
+
         if ret_coeffs:
             return new_powers, coeffs_arr
         else:
@@ -225,31 +209,28 @@ def subtractBaseline(powers, spectral_axis, freq_center, sigma, deg, n, ret_coef
 
     # For n > 1, perform local fitting on rolling averages of n bins (excluding start/ends)
     else:
-
-        # Itterate over each measurement
-        for i in range(powers.shape[1]):
-
-            # Exclude start/end measurements that can't form full bins
-            if i < n//2 or i > powers.shape[1] - n//2:
-                continue
-
-            # Get average power of given bin (+/- n/2 measurements)
-            bin_avrg_power = powers[:,i-n//2:i+n//2].mean(axis=1)
-
-            # Get mask out central region for fitting
-            masked_bin_avrg_power = bin_avrg_power[(spectral_axis < (freq_center - sigma)) | (spectral_axis > (freq_center + sigma))]
-            masked_freqs = spectral_axis[(spectral_axis < (freq_center - sigma)) | (spectral_axis > (freq_center + sigma))]
-
-            # Fit polynomial to masked data
-            coeffs = np.polyfit(masked_freqs, masked_bin_avrg_power, deg=deg)
-            coeffs_arr[i,:] = coeffs
-            baseline = np.polyval(coeffs, spectral_axis)
-
-            # Subtract baseline from original power data
-            new_powers[:,i] = powers[:,i] - baseline
-        
-        # delete start/end excluded zero cols
-        new_powers = new_powers[:,n//2:-n//2]
+        half = n // 2
+        n_meas = powers.shape[1]
+
+        # Measurements i with a full window [i-n/2, i+n/2); start/end ones are skipped
+        first, last = half, min(n_meas - half, n_meas - 1)
+
+        # The fit is linear, so the fit of a window's average power is the
+        # average of the per-measurement fits. Summing the shifted slices of
+        # the (deg+1 x measurements) coefficients is cheap, and unlike a
+        # cumulative sum it does not drift over long runs
+        if last >= first:
+            window_coeffs = np.zeros((deg + 1, last - first + 1))
+            for k in range(-half, half):
+                window_coeffs += coeffs[:, first + k:last + k + 1]
+            coeffs_arr[first:last + 1, :] = (window_coeffs / (2 * half)).T
+
+        # Subtract baseline from original power data, for the measurements that
+        # are kept (start/end excluded cols are deleted)
+        end = max(first, n_meas - (-(-n // 2)))
+        new_powers = vander @ coeffs_arr[first:end, :].T
+        np.subtract(powers[:, first:end], new_powers, out=new_powers)
+        new_powers = new_powers.astype(powers.dtype, copy=False)
 
     if TEST_BOOL:
         print(f"Baseline subtraction took {time.time() - start:.4f} seconds")
@@ -261,38 +242,175 @@ def subtractBaseline(powers, spectral_axis, freq_center, sigma, deg, n, ret_coef
 
 
 
-def computeNoiseIntegral(powers, spectral_axis, freq_center, sigma):
+def logCheckpoints(n_meas, n_points=256, first=1):
+    """
+    Log-spaced measurement counts from first to n_meas (both included), for
+    evaluating running statistics only where a log axis can show them.
+
+    Returns:
+        checkpoints (np.array): Increasing unique measurement counts (1-based).
+    """
+    if n_meas < first:
+        return np.zeros(0, dtype=int)
+    return np.unique(np.geomspace(first, n_meas, n_points).round().astype(int))
+
+
+def runningAverages(powers, checkpoints, chunk=4096, mean=True):
+    """
+    Average (or sum) of the first k measurements for each checkpoint k, from segment
+    sums between consecutive checkpoints (np.add.reduceat) rather than a
+    cumulative sum over every measurement. The powers are read in column
+    chunks, so a memmap is never loaded (or converted) whole.
+
+    Args:
+        powers (np.array): 2D array of power readings (frequencies x measurements).
+        checkpoints (np.array): Increasing measurement counts in 1..measurements.
+        chunk (int): Measurements read at a time.
+        mean (bool): Average over the k measurements; False returns the running sums.
+
+    Returns:
+        averages (np.array): 2D array of running averages (frequencies x checkpoints).
+    """
+    checkpoints = np.asarray(checkpoints, dtype=int)
+    sums = np.zeros((powers.shape[0], len(checkpoints)))
+    if len(checkpoints) == 0:
+        return sums
+    if checkpoints[0] < 1 or checkpoints[-1] > powers.shape[1] or np.any(np.diff(checkpoints) <= 0):
+        raise ValueError("Checkpoints must be increasing measurement counts between 1 and the number of measurements")
+
+    # Segment k holds measurements [starts[k], checkpoints[k])
+    starts = np.concatenate([[0], checkpoints[:-1]])
+    for s in range(0, checkpoints[-1], chunk):
+        e = min(s + chunk, checkpoints[-1])
+        first = np.searchsorted(checkpoints, s, side='right')
+        last = np.searchsorted(starts, e, side='left')
+        local = np.maximum(starts[first:last], s) - s
+        sums[:, first:last] += np.add.reduceat(powers[:, s:e], local, axis=1, dtype=np.float64)
+
+    np.cumsum(sums, axis=1, out=sums)
+    return sums / checkpoints if mean else sums
+
+
+class RunningNoiseIntegral:
+    """
+    Running state of computeNoiseIntegral: the per-frequency sum of every
+    measurement so far (O(frequencies) memory, whatever the run length).
+
+    update() takes the next block of (masked frequencies x measurements) and
+    returns the variance and mean across frequency of the running average
+    after each of its measurements. With dtype=np.float32 the running sum is
+    kept in float32 with Kahan compensation, so its error does not grow with
+    the number of measurements; with float64 the additions happen in the same
+    order as np.cumsum over the whole run.
+    """
+
+    def __init__(self, dtype=np.float64):
+        self.dtype = np.dtype(dtype)
+        self.total = None
+        self.compensation = None
+        self.count = 0
+
+    def update(self, masked):
+        # Work on (measurements x frequencies) so each step's statistics reduce
+        # along a contiguous row, the same way whatever the block width
+        masked = np.asarray(masked, dtype=self.dtype).T
+        if self.total is None:
+            self.total = np.zeros(masked.shape[1], dtype=self.dtype)
+            self.compensation = np.zeros(masked.shape[1], dtype=self.dtype)
+
+        history = np.empty(masked.shape, dtype=self.dtype)
+        if self.dtype == np.float64:
+            # Carried sum first, so the additions match a cumsum over the whole run
+            history[:] = masked
+            if len(history):
+                history[0] += self.total
+            np.cumsum(history, axis=0, out=history)
+        else:
+            # Kahan summation, one measurement at a time (vectorised over frequency)
+            y = np.empty(masked.shape[1], dtype=self.dtype)
+            for j in range(len(masked)):
+                np.subtract(masked[j], self.compensation, out=y)
+                t = self.total + y
+                np.subtract(t - self.total, y, out=self.compensation)
+                self.total = history[j] = t
+        if len(history):
+            self.total = history[-1].copy()
+
+        counts = np.arange(self.count + 1, self.count + len(history) + 1, dtype=self.dtype)
+        history /= counts[:, None]
+        self.count += len(history)
+        return np.var(history, axis=1, dtype=np.float64), np.mean(history, axis=1, dtype=np.float64)
+
+
+def computeNoiseIntegral(powers, spectral_axis, freq_center, sigma, chunk=512, dtype=None, checkpoints=None):
     """
     Returns the variance of the power over consequitive averaged measurements, integrated over a frequency range outside the central frequency.
 
+    The running average is built incrementally (RunningNoiseIntegral), so only
+    one chunk of measurements is held at a time besides the two output series.
+    With checkpoints (e.g. logCheckpoints) the statistics are only evaluated
+    after those measurement counts (runningAverages).
+
     Args:
-        powers (np.array): 2D array of power readings (cycles x frequencies).
+        powers (np.array or iterable): 2D array of power readings (frequencies x measurements),
+            e.g. a memmap, or an iterable of consecutive (frequencies x measurements) blocks.
         spectral_axis (np.array): 1D array of frequencies in Hz.
         freq_center (float): Central frequency to integrate outside of.
         sigma (float): Width around the central frequency to exclude in integration (+/- sigma).
+        chunk (int): Measurements per block when powers is an array.
+        dtype: Accumulation type; float32 uses compensated summation. Default: float32 for
+            float32 input, float64 otherwise.
+        checkpoints (np.array): Increasing measurement counts to evaluate at (array input only),
+            or None for every measurement.
 
     Returns:
-        variance_integral (np.array): 1D array of integrated variance of power for each consequitive measurement.
+        variance_integral (np.array): 1D array of integrated variance of power for each consequitive measurement
+            (or checkpoint).
         mean_powers (np.array): 1D array of mean power for each consequitive measurement (for reference).
     """
 
     if TEST_BOOL:
         start = time.time()
 
-    # Get mask for frequencies outside the central region
-    # 1. Apply frequency mask (vectorized)
-    mask = (spectral_axis < (freq_center - sigma)) | (spectral_axis > (freq_center + sigma))
-    masked_powers = powers[mask, :] # Shape: (frequencies, measurements)
-
-    # 2. Compute the running mean across measurements (axis=1)
-    # cumsum / counts gives the mean of [:, 0:i+1] for every i
-    counts = np.arange(1, masked_powers.shape[1] + 1)
-    integrated_power_history = np.cumsum(masked_powers, axis=1) / counts
-
-    # 3. Compute variance and mean for each integration step
-    # We take the variance and mean across the frequency axis (axis=0)
-    variance_integral = np.var(integrated_power_history, axis=0)
-    mean_power_levels = np.mean(integrated_power_history, axis=0)
+    # Frequencies outside the central region
+    mask = spectralGrid(spectral_axis).outsideMask(freq_center, sigma)
+
+    if checkpoints is not None:
+        if not hasattr(powers, 'shape'):
+            raise ValueError("Checkpoint evaluation needs the powers as an array")
+        averages = runningAverages(powers, checkpoints)[mask, :]
+        variance_integral, mean_power_levels = np.var(averages, axis=0), np.mean(averages, axis=0)
+        if len(variance_integral):
+            print(f'Final Mean Power Integral: {mean_power_levels[-1]:.2e} W, '
+                  f'Final Variance Integral: {variance_integral[-1]:.2e} W')
+        if TEST_BOOL:
+            print(f"Noise integral computation took {time.time() - start:.4f} seconds ({len(variance_integral)} checkpoints)")
+        return variance_integral, mean_power_levels
+
+    if hasattr(powers, 'shape'):
+        n_meas = powers.shape[1]
+        blocks = (powers[:, s:s + chunk] for s in range(0, n_meas, chunk))
+        if dtype is None:
+            dtype = np.float32 if powers.dtype == np.float32 else np.float64
+    else:
+        n_meas = None
+        blocks = iter(powers)
+
+    integral = None
+    variance_integral, mean_power_levels = [], []
+    for block in blocks:
+        block = np.asarray(block)
+        if integral is None:
+            if dtype is None:
+                dtype = np.float32 if block.dtype == np.float32 else np.float64
+            integral = RunningNoiseIntegral(dtype)
+        # Variance and mean across the frequency axis for each integration step
+        variance, mean = integral.update(block[mask, :])
+        variance_integral.append(variance)
+        mean_power_levels.append(mean)
+
+    variance_integral = np.concatenate(variance_integral) if variance_integral else np.zeros(n_meas or 0)
+    mean_power_levels = np.concatenate(mean_power_levels) if mean_power_levels else np.zeros(n_meas or 0)
 
     print(f'Final Mean Power Integral: {mean_power_levels[-1]:.2e} W, '
           f'Final Variance Integral: {variance_integral[-1]:.2e} W')
@@ -323,12 +441,11 @@ def meanPowerOutlierDet(powers, spectral_axis, freq_center, sigma):
     powers = subtractBaseline(powers, spectral_axis, freq_center, sigma, deg=3, n=2)
 
     # Mask out central region
-    mask = (spectral_axis < (freq_center - sigma)) | (spectral_axis > (freq_center + sigma))
-    powers = powers[mask, :]
-
+    mask = spectralGrid(spectral_axis).outsideMask(freq_center, sigma)
     # Compute mean power for each measurement
-    mean_powers = np.mean(powers, axis=0)
+    return _meanPowerOutliers(np.mean(powers[mask, :], axis=0))
 
+def _meanPowerOutliers(mean_powers):
     std_powers = np.std(mean_powers)
 
     # Identify outliers as measurements where mean power deviates more than 3 standard deviations from the overall mean
@@ -358,11 +475,7 @@ def varianceIncreaseOutlierDet(powers, spectral_axis, freq_center, sigma, deg, n
     powers = subtractBaseline(powers, spectral_axis, freq_center, sigma, deg=deg, n=n)
 
     variance_integral, _ = computeNoiseIntegral(powers, spectral_axis, freq_center, sigma)
-
-    var_diffs = np.diff(variance_integral)
-
-    # Reject data if variance integral increases 
-    outlier_indices = np.where(var_diffs > 0)[0] + 1  # +1 to correct for the diff offset
+    outlier_indices = _varianceIncreaseOutliers(variance_integral)
 
     if TEST_BOOL:
         print(f"Variance increase outlier detection took {time.time() - start:.4f} seconds")
@@ -371,6 +484,13 @@ def varianceIncreaseOutlierDet(powers, spectral_axis, freq_center, sigma, deg, n
     return outlier_indices
 
 
+def _varianceIncreaseOutliers(variance_integral):
+    var_diffs = np.diff(variance_integral)
+
+    # Reject data if variance integral increases 
+    return np.where(var_diffs > 0)[0] + 1  # +1 to correct for the diff offset
+
+
 def powerMedDeviationOutlierDet(powers, spectral_axis, sigma, center_freq, deg, n_sub, tresh=3):
     """Filters outliers based on a certain standard deviations of the measurement given by the maximum power outside the central region
     in a given measurement, divided by its median value
@@ -384,15 +504,18 @@ def powerMedDeviationOutlierDet(powers, spectral_axis, sigma, center_freq, deg,
         outlier_indices (np.array): Indices of measurements identified as outliers based on power deviations.
     """
 
-    Spectral_mask = (spectral_axis < (center_freq - sigma)) | (spectral_axis > (center_freq + sigma))
+    Spectral_mask = spectralGrid(spectral_axis).outsideMask(center_freq, sigma)
 
     sub_powers = subtractBaseline(powers, spectral_axis, center_freq, sigma, deg=deg, n=n_sub)
+    return _medDeviationOutliers(_maxMedianRatio(sub_powers[Spectral_mask, :]), tresh)
 
-    max_powers = np.max(sub_powers[Spectral_mask, :], axis=0)
-    median_powers = np.median(sub_powers[Spectral_mask, :], axis=0)
+def _maxMedianRatio(masked):
+    max_powers = np.max(masked, axis=0)
+    median_powers = np.median(masked, axis=0)
 
-    err = (max_powers / median_powers)**2
+    return (max_powers / median_powers)**2
 
+def _medDeviationOutliers(err, tresh):
     std_err = np.std(err)
 
     # Identify outliers based on the threshold
@@ -414,39 +537,107 @@ def pressureDecayCurve(pressures, sweep_time):
 
     return pressure_fit
 
-def trueRollingVarOutierDet(powers, spectral_axis, freq_center, sigma, deg, n):
-    
-    powers = subtractBaseline(powers, spectral_axis, freq_center, sigma, deg=deg, n=n)
-
-    powers_mask = (spectral_axis < (freq_center - sigma)) | (spectral_axis > (freq_center + sigma))
-    powers = powers[powers_mask, :]
-
-    # compute mean up to a point
-    # compute the std of that mean
-    # add the next value, see if the std increases
-    # if no then reject that index
+class RunningRollingVar:
+    """
+    Greedy accept/reject state of trueRollingVarOutierDet, carried across
+    blocks of measurements.
+
+    A measurement is accepted if adding it to the running sum S of accepted
+    measurements lowers the std across frequency of the mean S / k. Only S,
+    its sum and its sum of squares are kept, so a candidate c is judged from
+    S.c, sum(c) and c.c:
+        var((S + c) / (k + 1)) = ((Q + 2 S.c + c.c) / F - ((sum(S) + sum(c)) / F)**2) / (k + 1)**2
+    With speculate > 1 the next `speculate` candidates are judged at once
+    against the current state; everything before the first one that would be
+    accepted is rejected in bulk and judging restarts after it. Most
+    measurements are rejected once the mean has settled, so this turns the
+    per-measurement loop into a few vector operations per accepted one.
 
-    rejected_indices = []
-    accepted_indices = []
+    Args:
+        block (int): Measurements whose sums are precomputed together (the
+            sum of squares of S is also recomputed per block, so it does not drift).
+        speculate (int): Candidates judged per vector step; 1 judges one at a time.
+    """
 
-    rolling_mean = np.mean(powers[:,0], axis=0)
-    rolling_std = np.std(powers[:,0], axis=0)
+    def __init__(self, block=1024, speculate=256):
+        self.block = block
+        self.speculate = max(1, speculate or 1)
+        self.rolling_sum = None
+        self.rolling_var = None
+        self.n_accepted = 0
+        self.index = 0
+
+    def _variance(self, total, sq_total, n_freq, k):
+        mean = total / n_freq
+        return (sq_total / n_freq - mean * mean) / (k * k)
+
+    def update(self, masked):
+        """Judge the next (masked frequencies x measurements) block; returns the rejected indices."""
+        n_freq = masked.shape[0]
+        rejected = []
+        start = 0
+        if self.rolling_sum is None and masked.shape[1]:
+            # The first measurement seeds the sum (and, compared with itself, is rejected)
+            self.rolling_sum = np.array(masked[:, 0], dtype=np.float64)
+            self.rolling_var = self._variance(self.rolling_sum.sum(), self.rolling_sum @ self.rolling_sum, n_freq, 1)
+            self.n_accepted = 1
+            rejected.append(np.array([self.index]))
+            start = 1
+
+        for s in range(start, masked.shape[1], self.block):
+            cols = np.asarray(masked[:, s:s + self.block], dtype=np.float64)
+            col_sums = cols.sum(axis=0)
+            col_sq = np.einsum('ij,ij->j', cols, cols)
+            total = self.rolling_sum.sum()
+            sq_total = self.rolling_sum @ self.rolling_sum
+            base = self.index + s
+
+            j, m = 0, cols.shape[1]
+            while j < m:
+                w = min(m, j + self.speculate)
+                sq_new = sq_total + 2 * (self.rolling_sum @ cols[:, j:w]) + col_sq[j:w]
+                var_new = self._variance(total + col_sums[j:w], sq_new, n_freq, self.n_accepted + 1)
+                hit = np.flatnonzero(var_new < self.rolling_var)
+                if len(hit) == 0:
+                    rejected.append(np.arange(base + j, base + w))
+                    j = w
+                    continue
+                h = hit[0]
+                rejected.append(np.arange(base + j, base + j + h))
+                self.rolling_sum += cols[:, j + h]
+                total += col_sums[j + h]
+                sq_total = sq_new[h]
+                self.rolling_var = var_new[h]
+                self.n_accepted += 1
+                j += h + 1
+
+        self.index += masked.shape[1]
+        return np.concatenate(rejected) if rejected else np.zeros(0, dtype=int)
+
+
+def trueRollingVarOutierDet(powers, spectral_axis, freq_center, sigma, deg, n, block=1024, speculate=256):
+    """
+    Rejects every measurement that does not lower the std (across the frequencies outside
+    the signal region) of the running mean of the accepted measurements.
 
-    rolling_sum = powers[:,0].copy()
-    accepted_indices.append(0)
+    Args:
+        powers (np.array): 2D array of power readings (frequencies x measurements).
+        spectral_axis (np.array): 1D array of frequencies in Hz.
+        freq_center (float): Central frequency to exclude from fitting.
+        sigma (float): Width around the central frequency to exclude in fitting (+/- sigma).
+        deg (int): Degree of the baseline polynomial.
+        n (int): Measurements in the rolling baseline window.
+        block (int): Measurements processed per block (see RunningRollingVar).
+        speculate (int): Candidates judged per vector step (see RunningRollingVar).
 
-    for i in range(powers.shape[1]):
-        new_sum = rolling_sum + powers[:,i]
-        mean = new_sum / (len(accepted_indices) + 1)
-        new_std = np.std(mean)
+    Returns:
+        outlier_indices (np.array): Indices of the rejected measurements.
+    """
+    
+    powers = subtractBaseline(powers, spectral_axis, freq_center, sigma, deg=deg, n=n)
 
-        if new_std < rolling_std:
-            rolling_sum = new_sum
-            rolling_std = new_std
-            accepted_indices.append(i)
-        else:
-            rejected_indices.append(i)
-    return np.array(rejected_indices)
+    powers_mask = spectralGrid(spectral_axis).outsideMask(freq_center, sigma)
+    return RunningRollingVar(block, speculate).update(powers[powers_mask, :])
 
 def shotNoiseReject(powers):
     stds = np.std(powers, axis=0)
@@ -458,5 +649,240 @@ def shotNoiseReject(powers):
 
     return outlier_indices
 
+def detectOutliers(powers, spectral_axis, freq_center, sigma, deg, n_sub, methods=tuple(OUTLIER_DETECTORS), tresh=2):
+    """
+    Runs several outlier detectors over one shared baseline subtraction.
+
+    The baseline-subtracted run and its frequencies outside the signal region
+    are computed once and handed to every requested detector (the single
+    detector functions each redo the subtraction). Shot noise rejection works
+    on the raw powers. As in cleanData, indices from the subtracted run are
+    applied to the raw measurements as they are.
+
+    Args:
+        powers (np.array): 2D array of power readings (frequencies x measurements).
+        spectral_axis (np.array): 1D array of frequencies in Hz.
+        freq_center (float): Central frequency to exclude from fitting.
+        sigma (float): Width around the central frequency to exclude in fitting (+/- sigma).
+        deg (int): Degree of the baseline polynomial (shared by all detectors).
+        n_sub (int): Measurements in the rolling baseline window.
+        methods (list): Names from OUTLIER_DETECTORS to run.
+        tresh (float): Threshold of the median deviation detector (as cleanData uses it).
+
+    Returns:
+        reasons (np.array): Per-measurement bitmask of the OUTLIER_DETECTORS bits that flagged it (0 = kept).
+    """
+
+    if TEST_BOOL:
+        start = time.time()
+
+    for method in methods:
+        if method not in OUTLIER_DETECTORS:
+            raise ValueError(f"Invalid cleaning method: {method}")
+
+    reasons = np.zeros(powers.shape[1], dtype=np.uint8)
+    if 'Shot Noise Clean' in methods:
+        reasons[shotNoiseReject(powers)] |= OUTLIER_DETECTORS['Shot Noise Clean']
+
+    if any(method != 'Shot Noise Clean' for method in methods):
+        sub_powers = subtractBaseline(powers, spectral_axis, freq_center, sigma, deg=deg, n=n_sub)
+        masked = sub_powers[spectralGrid(spectral_axis).outsideMask(freq_center, sigma), :]
+        del sub_powers
+
+        detectors = {
+            'Single Itteration Variance Integral Clean': lambda: _varianceIncreaseOutliers(_maskedNoiseIntegral(masked)),
+            'Mean Power Outlier Clean': lambda: _meanPowerOutliers(np.mean(masked, axis=0)),
+            'Median Power Outlier Clean': lambda: _medDeviationOutliers(_maxMedianRatio(masked), tresh),
+            'True Rolling Variance Clean': lambda: RunningRollingVar().update(masked),
+        }
+        for method in methods:
+            if method in detectors:
+                reasons[detectors[method]()] |= OUTLIER_DETECTORS[method]
+
+    if TEST_BOOL:
+        print(f"Outlier detection ({len(methods)} detectors) took {time.time() - start:.4f} seconds")
+
+    return reasons
+
+def _maskedNoiseIntegral(masked, chunk=512):
+    """computeNoiseIntegral's variance series for already masked powers."""
+    integral = RunningNoiseIntegral(np.float32 if masked.dtype == np.float32 else np.float64)
+    steps = [integral.update(masked[:, s:s + chunk])[0] for s in range(0, masked.shape[1], chunk)]
+    return np.concatenate(steps) if steps else np.zeros(0)
+
+def reasonCounts(reasons, methods=tuple(OUTLIER_DETECTORS)):
+    """Number of measurements each detector flagged in a reason bitmask."""
+    return {method: int(np.count_nonzero(reasons & OUTLIER_DETECTORS[method])) for method in methods}
+
+class IterativeCleaner:
+    """
+    cleanData repeated on its own output until nothing more is rejected, with
+    the work of earlier passes carried over.
+
+    Computed once per run: the powers outside the signal region, every
+    measurement's baseline fit coefficients (the rolling baselines of a pass
+    are re-summed from them) and the shot noise flags, which do not depend on
+    the other measurements. The detectors' running state (noise integral sum,
+    rolling variance state) and per-measurement results are checkpointed every
+    `chunk` measurements. Removing measurements only changes the results from
+    the first baseline window that contained one of them, so each pass resumes
+    from the checkpoint before that instead of starting over.
+
+    Args:
+        powers (np.array): 2D array of power readings (frequencies x measurements).
+        spectral_axis (np.array): 1D array of frequencies in Hz.
+        freq_center (float): Central frequency to exclude from fitting.
+        sigma (float): Width around the central frequency to exclude in fitting (+/- sigma).
+        deg (int): Degree of the baseline polynomial.
+        n_sub (int): Measurements in the rolling baseline window.
+        cleaning_method (str or list): As cleanData.
+        tresh (float): Threshold of the median deviation detector.
+        chunk (int): Measurements between checkpoints.
+    """
+
+    def __init__(self, powers, spectral_axis, freq_center, sigma, deg, n_sub,
+                 cleaning_method='Single Itteration Variance Integral Clean', tresh=2, chunk=512):
+        methods = [cleaning_method] if cleaning_method is None or isinstance(cleaning_method, str) else list(cleaning_method)
+        for method in methods:
+            if method not in OUTLIER_DETECTORS:
+                raise ValueError(f"Invalid cleaning method: {method}")
+        if methods == ['Mean Power Outlier Clean']:
+            deg, n_sub = 3, 2
+
+        self.powers = powers
+        self.methods = methods
+        self.deg, self.n_sub, self.tresh, self.chunk = deg, n_sub, tresh, chunk
+        self.dtype = powers.dtype
+
+        grid = spectralGrid(spectral_axis)
+        freq_mask = grid.outsideMask(freq_center, sigma)
+        self.masked = powers[freq_mask, :]
+        if deg > 0:
+            self.coeffs = grid.projector(freq_center, sigma, deg) @ powers
+            self.vander = grid.vander(deg)[freq_mask, :]
+
+        self.kept = np.arange(powers.shape[1])
+        self.reasons = np.zeros(powers.shape[1], dtype=np.uint8)
+        self.history = []
+
+        self._shot = np.zeros(powers.shape[1], dtype=bool)
+        if 'Shot Noise Clean' in methods:
+            self._shot[shotNoiseReject(powers)] = True
+
+        # Results of the last pass, per output measurement, and detector state at each checkpoint
+        self._restart = 0
+        self._variance = np.zeros(0)
+        self._means = np.zeros(0)
+        self._ratios = np.zeros(0)
+        self._rolling = np.zeros(0, dtype=int)
+        self._states = {}
+
+    @property
+    def mask(self):
+        """Measurements of the original run that are still kept."""
+        mask = np.zeros(self.powers.shape[1], dtype=bool)
+        mask[self.kept] = True
+        return mask
+
+    def cleaned(self):
+        """Powers of the kept measurements."""
+        return self.powers[:, self.kept]
+
+    def _half(self):
+        return self.n_sub // 2 if self.deg > 0 and self.n_sub > 1 else 0
+
+    def _outputs(self):
+        """First and end position (in the kept measurements) of subtractBaseline's output."""
+        half = self._half()
+        if half == 0:
+            return 0, len(self.kept)
+        return half, max(half, len(self.kept) - (-(-self.n_sub // 2)))
+
+    def _baselines(self, first, start, end):
+        """Baseline coefficients of output measurements [start, end), as subtractBaseline sums them."""
+        half = self._half()
+        coeffs = self.coeffs[:, self.kept]
+        if half == 0:
+            return coeffs[:, first + start:first + end]
+        window_coeffs = np.zeros((self.deg + 1, end - start))
+        for k in range(-half, half):
+            window_coeffs += coeffs[:, first + start + k:first + end + k]
+        return window_coeffs / (2 * half)
+
+    def step(self):
+        """One cleaning pass; returns the number of rejected measurements."""
+        start_time = time.time()
+        first, end = self._outputs()
+        n_out = end - first
+
+        # Resume from the checkpoint before the first output that can have changed
+        resume = min(self._restart // self.chunk * self.chunk, n_out)
+        if resume in self._states:
+            integral, rolling = copy.deepcopy(self._states[resume])
+        else:
+            integral = RunningNoiseIntegral(np.float32 if self.dtype == np.float32 else np.float64)
+            rolling = RunningRollingVar()
+        self._states = {s: state for s, state in self._states.items() if s <= resume}
+
+        variance, means, ratios = [self._variance[:resume]], [self._means[:resume]], [self._ratios[:resume]]
+        rolling_rejects = [self._rolling[self._rolling < resume]]
+        baselines = self._baselines(first, resume, n_out) if self.deg > 0 else None
+
+        for s in range(resume, n_out, self.chunk):
+            e = min(s + self.chunk, n_out)
+            self._states[s] = (copy.deepcopy(integral), copy.deepcopy(rolling))
+            block = self.masked[:, self.kept[first + s:first + e]]
+            if baselines is not None:
+                block = (block - self.vander @ baselines[:, s - resume:e - resume]).astype(self.dtype, copy=False)
+
+            if 'Single Itteration Variance Integral Clean' in self.methods:
+                variance.append(integral.update(block)[0])
+            if 'Mean Power Outlier Clean' in self.methods:
+                means.append(np.mean(block, axis=0))
+            if 'Median Power Outlier Clean' in self.methods:
+                ratios.append(_maxMedianRatio(block))
+            if 'True Rolling Variance Clean' in self.methods:
+                rolling_rejects.append(rolling.update(block))
+
+        self._variance, self._means, self._ratios = np.concatenate(variance), np.concatenate(means), np.concatenate(ratios)
+        self._rolling = np.concatenate(rolling_rejects).astype(int)
+
+        # Positions in the subtracted run are applied to the kept measurements as they are (as cleanData)
+        bits = np.zeros(len(self.kept), dtype=np.uint8)
+        outliers = {
+            'Single Itteration Variance Integral Clean': lambda: _varianceIncreaseOutliers(self._variance),
+            'Mean Power Outlier Clean': lambda: _meanPowerOutliers(self._means),
+            'Median Power Outlier Clean': lambda: _medDeviationOutliers(self._ratios, self.tresh),
+            'True Rolling Variance Clean': lambda: self._rolling,
+            'Shot Noise Clean': lambda: np.flatnonzero(self._shot[self.kept]),
+        }
+        for method in self.methods:
+            bits[outliers[method]()] |= OUTLIER_DETECTORS[method]
+
+        rejected = np.flatnonzero(bits)
+        if len(rejected):
+            self.reasons[self.kept[rejected]] |= bits[rejected]
+            # Outputs whose baseline window ends before the first removed measurement are unchanged
+            self._restart = max(0, rejected[0] - 2 * self._half() + 1)
+            self.kept = np.delete(self.kept, rejected)
+
+        self.history.append((len(self.history) + 1, len(rejected), len(self.kept), time.time() - start_time))
+        return len(rejected)
+
+    def run(self, max_iter=0):
+        """
+        Clean until a pass rejects nothing (or max_iter passes, if > 0), printing each pass.
+
+        Returns:
+            history (list): (iteration, rejected, remaining, seconds) for every pass.
+        """
+        while True:
+            n_rejected = self.step()
+            iteration, _, remaining, seconds = self.history[-1]
+            print(f"Cleaning iteration {iteration}: rejected {n_rejected}, {remaining} remaining ({seconds:.3f} s)")
+            if n_rejected == 0 or (max_iter > 0 and iteration >= max_iter):
+                break
+        return self.history
+
 def gasConcentration(gas_vp, gas_vol, gas_density, liquid_density, gas_M):
     pass    
\ No newline at end of file
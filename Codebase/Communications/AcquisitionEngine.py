@@ -0,0 +1,659 @@
+"""
+AcquisitionEngine.py  –  Shared High-Throughput Acquisition Engine
+==================================================================
+The one acquisition path behind every front end (StartCommunication.py with
+the GUI, StartCommunicationMinimal.py headless).  A performance fix made here
+applies to all of them.
+
+Architecture
+------------
+                ┌─────────────────────────────────┐
+                │   SPECTRUM THREAD (tight loop)   │
+                │  initiate → wait OPC → read →    │
+                │  push to spec_queue → initiate…  │
+                └──────────────┬──────────────────┘
+                               │ spec_queue
+                ┌──────────────▼──────────────────┐
+                │      COORDINATOR (run())         │
+                │  wait for tick (scheduler)       │
+                │  pop / drain+co-add spectra      │
+                │  read pressure (inline, fast)    │
+                │  compute metrics, build record   │
+                │  submit record to every sink     │
+                └──────────────┬──────────────────┘
+                               │ one queue per sink
+        ┌──────────┬───────────┼───────────┬──────────────┐
+        ▼          ▼           ▼           ▼              ▼
+       CSV      Binary        GUI       Network     Online analysis
+   (each sink formats and writes on its own consumer thread – Sinks.py)
+
+Key design decisions
+--------------------
+* The spectrum thread NEVER sleeps intentionally.  As soon as get_amplitudes()
+  returns it loops back and starts the next sweep, so the analyzer integrates
+  continuously unless something else is slow.
+
+* Pressure reads happen in the coordinator while the spectrum thread is busy
+  waiting.  The serial read is fast (~3 ms) and this avoids spawning futures
+  every cycle.
+
+* The coordinator is paced by a DeadlineScheduler on the monotonic clock:
+  ticks are locked to an absolute grid (t0 + k·interval), so time spent
+  blocking on spec_queue or reading pressure is absorbed by the tick instead
+  of accumulating as drift.  Missed ticks are skipped or caught up according
+  to `tick_policy`.
+
+* Co-add mode drains EVERY sweep that arrived each tick and co-adds them into
+  one record (per-frequency mean, sum of squares and count).  spec_queue is
+  unbounded in this mode so the spectrum thread never blocks between ticks.
+
+* Sinks are fully off the hot path: `submit()` is a non-blocking put onto the
+  sink's own queue.  Lossless sinks (CSV, binary) have unbounded queues; live
+  sinks (GUI, network) drop records rather than back-pressure acquisition.
+
+* A dead instrument is reopened instead of abandoned.  After a few
+  consecutive failed sweeps the spectrum thread reopens the VISA session with
+  exponential backoff and restores the cached settings in one bulk SCPI
+  message; a failing gauge is reopened on a side thread while rows continue
+  with empty pressure columns.  Either way the run resumes in the same log
+  with a gap marker (Recovery.py, program.reconnect* settings).
+
+* The engine never opens or closes instruments; front ends own them, so one
+  VISA session / serial port can serve many consecutive runs.
+"""
+
+import csv
+import time
+import threading
+from queue import Queue, Empty, Full
+
+import numpy as np
+
+from PressureSensor import PressureSensor
+from SpectrumAnalyzer import SpectrumAnalyzer
+from Instrumentation import METRICS
+from Scheduler import scheduler_from_config
+from Sinks import BinarySink, NetworkSink, OnlineAnalysisSink
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+#  Spectrum acquisition thread
+#  Runs a tight acquire→queue loop with no unnecessary delays.
+# ──────────────────────────────────────────────────────────────────────────────
+
+def _spectrum_thread(analyzer, out_queue, stop_event, err_callback,
+                     recovery=None, on_gap=None, down_event=None):
+    """
+    Dedicated spectrum acquisition loop.
+
+    get_amplitudes() initiates a sweep, blocks until OPC and fetches the
+    trace.  We call it in a tight loop so there is never a gap between sweeps
+    unless something else is slow.
+
+    With `recovery` set, `fail_threshold` consecutive failures mark the VISA
+    session as dead: the analyzer is reopened with backoff and its cached
+    configuration restored, then `on_gap` is told how long data was missing.
+    """
+    failures  = 0
+    first_err = None
+    while not stop_event.is_set():
+        try:
+            result = analyzer.get_amplitudes()
+            failures = 0
+        except Exception as e:
+            err_callback(f"[Spectrum Thread ERROR] {e}")
+            failures += 1
+            if failures == 1:
+                first_err = time.monotonic()
+
+            if (recovery is not None and failures >= recovery['fail_threshold']
+                    and hasattr(analyzer, 'reconnect')):
+                err_callback("[Spectrum Thread] Session presumed dead – reconnecting…")
+                down_event.set()
+                if analyzer.reconnect(stop_event=stop_event, **recovery['backoff']):
+                    on_gap(f"spectrum analyzer reconnected after "
+                           f"{time.monotonic() - first_err:.1f} s without sweeps")
+                down_event.clear()
+                failures = 0
+            else:
+                time.sleep(0.05)
+            continue
+
+        # Bounded put so a stop request is never stuck behind a full queue
+        with METRICS.span('sa.queue_put_block'):
+            while not stop_event.is_set():
+                try:
+                    out_queue.put(result, timeout=0.5)
+                    break
+                except Full:
+                    continue
+
+
+def _drain_and_coadd(spec_queue, first):
+    """
+    Co-add `first` with every sweep already waiting in spec_queue (never
+    blocks).  Returns a result dict shaped like get_amplitudes()' with the
+    per-frequency mean as 'Amplitudes', plus 'SumSq' and 'Count'.
+    """
+    total    = np.asarray(first['Amplitudes'], dtype=np.float64)
+    total_sq = total * total
+    count    = 1
+    last_ts  = first['Timestamp']
+
+    while True:
+        try:
+            res = spec_queue.get_nowait()
+        except Empty:
+            break
+        spec_queue.task_done()
+
+        amps = np.asarray(res['Amplitudes'], dtype=np.float64)
+        if amps.shape != total.shape:
+            # A sweep with a different point count cannot be co-added; drop it
+            METRICS.incr('coord.coadd_shape_mismatch')
+            continue
+        total    += amps
+        total_sq += amps * amps
+        count    += 1
+        last_ts   = res['Timestamp']
+
+    METRICS.observe_value('coord.coadd_count', count)
+    return {
+        'N_pts':      total.shape[0],
+        'Amplitudes': total / count,
+        'SumSq':      total_sq,
+        'Count':      count,
+        'Timestamp':  last_ts,
+    }
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+#  Instruments, run metadata and the CSV header (shared by all front ends)
+# ──────────────────────────────────────────────────────────────────────────────
+
+def open_instruments(config, spectrum_enabled, pressure_enabled,
+                     spectrum_cb, pressure_cb):
+    """
+    Initialise the enabled instruments.  A failing instrument is reported and
+    returned as None so the run continues without it.
+
+    Returns:
+        (spectrum_analyzer or None, pressure_sensor or None)
+    """
+    pressure_sensor = None
+    if pressure_enabled:
+        try:
+            pressure_sensor = PressureSensor(config['pressure_sensor'], pressure_cb)
+        except Exception as e:
+            print(f"[WARN] Pressure Sensor init failed (continuing without): {e}")
+
+    spectrum_analyzer = None
+    if spectrum_enabled:
+        try:
+            spectrum_analyzer = SpectrumAnalyzer(config['spectrum_analyzer'], spectrum_cb)
+        except Exception as e:
+            print(f"[WARN] Spectrum Analyzer init failed (continuing without): {e}")
+
+    return spectrum_analyzer, pressure_sensor
+
+
+def close_instruments(spectrum_analyzer, pressure_sensor):
+    """Disconnect instruments gracefully."""
+    if pressure_sensor is not None:
+        try:
+            pressure_sensor.disconnect()
+        except Exception:
+            pass
+
+
+def prompt_run_metadata():
+    """Interactive run metadata prompts (gas, concentration, gain, description)."""
+    meta = {
+        'init_CO_conc':   'N/A',
+        'init_ml':        'N/A',
+        'gas_correction': None,   # applied to display only, never saved
+        'input_gain':     '',
+        'description':    '',
+    }
+    CO_bool = input('CO or Acetonitrile? (C/A): ')
+    if CO_bool.lower() == 'c':
+        meta['init_CO_conc'] = input(
+            "Enter initial CO Concentration in ppm (or leave blank to skip): ")
+    if CO_bool.lower() == 'a':
+        meta['init_ml'] = input(
+            "Enter Acetonitrile Volume in mL (or leave blank to skip): ")
+        _gc_raw = input(
+            "Enter Acetonitrile gas correction coefficient "
+            "(e.g. 0.4 – leave blank to skip): ").strip()
+        if _gc_raw:
+            try:
+                meta['gas_correction'] = float(_gc_raw)
+                print(f"[INFO] Gas correction coefficient set to "
+                      f"{meta['gas_correction']} "
+                      f"(applied to terminal display only).")
+            except ValueError:
+                print("[WARN] Invalid gas correction value – ignoring.")
+    meta['input_gain'] = input(
+        "Enter Effective Gain at Input in dB (or leave blank to skip): ")
+    meta['description'] = input("Enter experiment description (or leave blank): ")
+    return meta
+
+
+def build_fields(spectral_axis, spectrum_enabled, pressure_enabled,
+                 coadd=False, diagnostics=False):
+    """
+    Column list of a log file.
+
+    Returns:
+        fields (list): Every column, scalar columns then frequency columns.
+        non_freq_fields (list): Only the scalar columns.
+    """
+    fields = ['Timestamp', 'Elapsed Time (s)', 'Cycle Count']
+    if diagnostics:
+        fields.extend(['Absolute Cycle Time (ms)', 'Instrumental Cycle Time (ms)'])
+    if spectrum_enabled:
+        fields.append('Effective Integration (%)')
+        if coadd:
+            fields.append('Coadd Count')
+    if pressure_enabled:
+        fields.extend(['Pressure', 'Pressure_Unit'])
+
+    non_freq_fields = fields.copy()
+
+    if spectrum_enabled:
+        fields.extend([f"{freq} Hz" for freq in spectral_axis])
+        if coadd:
+            fields.extend([f"{freq} SumSq" for freq in spectral_axis])
+
+    return fields, non_freq_fields
+
+
+def build_header(config, timestamp, meta, spec_header_info, *,
+                 logging_enabled, spectrum_enabled, pressure_enabled,
+                 interval, coadd=False, diagnostics=False,
+                 visualization_enabled=False, vis_update_cadence=None,
+                 run_label=None):
+    """Comment block written at the top of every log file."""
+    sa_cfg = config['spectrum_analyzer']
+    ps_cfg = config['pressure_sensor']['serial']
+    init_ac_gc = meta['gas_correction'] if meta.get('gas_correction') is not None else 'N/A'
+    input_gain = meta.get('input_gain', '')
+    init_CO    = meta.get('init_CO_conc', 'N/A')
+    init_ml    = meta.get('init_ml', 'N/A')
+    vis_cadence = vis_update_cadence if visualization_enabled else 'N/A (headless mode)'
+    run_line    = f"#    Run: {run_label}\n" if run_label else ''
+
+    header = f"""# Experiment Log ({timestamp})
+#    Experiment Description: {meta.get('description', '')}
+{run_line}# Experiment Configuration:
+#    logging_enabled: {logging_enabled}
+#    spectrum_enabled: {spectrum_enabled}
+#    pressure_enabled: {pressure_enabled}
+#    visualization_enabled: {visualization_enabled}
+#    reading_interval (s): {interval}
+#    coadd_enabled: {coadd}
+#    visual_update_cycle_interval: {vis_cadence}
+#    Effective Gain at Input (Db) : {input_gain if input_gain != '' else 'N/A'}
+#    initial_CO_concentration (ppm): {init_CO if init_CO != '' else 'N/A'}
+#    initial_Acetonitrile_volume (mL): {init_ml if init_ml != '' else 'N/A'}
+#    acetonitrile_gas_correction_coefficient: {init_ac_gc} (NOTE: applied to terminal display only - raw N2-equivalent sensor values are saved)
+#       Formula used for display: P_true = P_indicated / correction_factor
+# Serial Configuration ({'ENABLED' if pressure_enabled else 'DISABLED'}):
+#    Port: {ps_cfg.get('port', 'COM1')}
+#    Baudrate: {ps_cfg.get('baudrate', 9600)}
+#    Bytesize: {ps_cfg.get('bytesize', 8)}
+#    Parity: {ps_cfg.get('parity', 'N')}
+#    Stopbits: {ps_cfg.get('stopbits', 1)}
+#    Timeout (ms): {float(ps_cfg.get('timeout', 3)) * 1000}
+# Spectrum Analyzer Configuration ({'ENABLED' if spectrum_enabled else 'DISABLED'}):
+#    Resource String: {sa_cfg['visa'].get('resource_string', 'N/A')}
+#    VISA Backend: {sa_cfg.get('visa_backend') or sa_cfg['visa'].get('visa_backend', 'None Specified')}
+#    Timeout (ms): {sa_cfg['visa'].get('timeout', 'N/A')}
+#    Data Format: {sa_cfg['visa'].get('data_format', 'N/A')}
+#    Byte Order: {sa_cfg['visa'].get('byte_order', 'N/A')}
+#    Number of Points: {spec_header_info.get('Number of Points', 'N/A')}
+#    Sweep Time (ms): {spec_header_info.get('Sweep Time (ms)', 'N/A')}
+#    Span: {spec_header_info.get('Span', 'N/A')}
+#    RBW (Hz): {spec_header_info.get('RBW (Hz)', 'N/A')}
+#    VBW (Hz): {spec_header_info.get('VBW (Hz)', 'N/A')}
+#    Attenuation (dB): {spec_header_info.get('Attenuation (dB)', 'N/A')}
+#    Detector Type: {spec_header_info.get('Detector Type', 'N/A')}
+#    Amplitude Space: {spec_header_info.get('Amplitude Space', 'N/A')}
+#    Frequency Start (Hz): {spec_header_info.get('Frequency Start (Hz)', 'N/A')}
+#    Frequency Stop (Hz): {spec_header_info.get('Frequency Stop (Hz)', 'N/A')}
+#    Center Frequency (Hz): {spec_header_info.get('Center Frequency (Hz)', 'N/A')}
+#    Reference Level ({spec_header_info.get('Power Unit', 'N/A')}): {spec_header_info.get('Reference Level (dBm)', 'N/A')}
+#    Power Unit: {spec_header_info.get('Power Unit', 'N/A')}
+# Data Columns:
+#    Timestamp: Time of the log entry in ISO 8601 format (measured at start of logging cycle)
+#    Elapsed Time (s): Time since the start of logging in seconds (measured at start of logging cycle)
+#    Cycle Count: Count of measurement cycle
+"""
+    if diagnostics:
+        header += """#    Absolute Cycle Time (ms): Time for a full measurement cycle, measured as time between measurement cycle end and next cycle start
+#    Instrumental Cycle Time (ms): Time the coordinator waited for instrument results within the cycle, measures instrumental lag
+"""
+    header += """#    Pressure Sensor Readings (if enabled):
+#       Pressure: Pressure reading from the sensor in specified units
+#       Pressure_Unit: Unit of the pressure reading
+#    Spectrum Analyzer Readings (if enabled):
+#       Effective Integration (%): Percentage (0-100) of a full cycle the Spectrum Analyzer is integrating signal over
+#       *amplitudes will be headed as their frequency value in Hz in subsequent columns (eg. 2450000000.0 Hz)*
+"""
+    if coadd:
+        header += """#    Co-add Mode (if enabled):
+#       Coadd Count: Number of sweeps co-added into the row
+#       <freq> Hz: Mean amplitude of the co-added sweeps (sum = mean * Coadd Count)
+#       <freq> SumSq: Sum of squared amplitudes of the co-added sweeps
+"""
+    return header
+
+
+def write_csv_header(path, header, fields):
+    with open(path, mode='w', newline='') as fh:
+        fh.write(header)
+        csv.writer(fh).writerow(fields)
+
+
+def optional_sinks_from_args(args, log_base, spectral_axis, center_freq, metadata=None):
+    """Build the binary / network / online-analysis sinks requested on the CLI."""
+    sinks = []
+    if getattr(args, 'binary', False) and log_base is not None and spectral_axis:
+        sinks.append(BinarySink(log_base, spectral_axis, metadata=metadata))
+    if getattr(args, 'stream_port', None) is not None:
+        sinks.append(NetworkSink(port=args.stream_port))
+    if getattr(args, 'online', False) and spectral_axis and center_freq is not None:
+        sinks.append(OnlineAnalysisSink(spectral_axis, center_freq,
+                                        getattr(args, 'online_sigma', 2.5e6)))
+    return sinks
+
+
+def recovery_from_config(config):
+    """
+    Reconnect policy from the 'program' block, or None when
+    program.reconnect is false (old behaviour: retry forever / drop pressure).
+    """
+    program = config['program']
+    if not program.get('reconnect', True):
+        return None
+    return {
+        'fail_threshold':          int(program.get('reconnect_after_failures', 3)),
+        'pressure_fail_threshold': int(program.get('pressure_reconnect_after_failures', 5)),
+        'backoff': {
+            'base_delay':   float(program.get('reconnect_base_delay', 0.5)),
+            'max_delay':    float(program.get('reconnect_max_delay', 30.0)),
+            'max_attempts': program.get('reconnect_max_attempts', None),
+        },
+    }
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+#  Engine
+# ──────────────────────────────────────────────────────────────────────────────
+
+class AcquisitionEngine():
+
+    def __init__(self, config, spectrum_analyzer=None, pressure_sensor=None,
+                 sinks=(), coadd=False, spec_sweep_time_ms=None,
+                 status_line=True, gas_correction=None, err_callback=print):
+        """
+        Args:
+            config (dict): Full configuration ('program' block is used here).
+            spectrum_analyzer: Open SpectrumAnalyzer, or None.
+            pressure_sensor: Open PressureSensor, or None.
+            sinks (list): Sink instances (not yet started).
+            coadd (bool): Drain and co-add all sweeps each tick.
+            spec_sweep_time_ms (float): Sweep time, for effective integration.
+            status_line (bool): Print one status line per tick.
+            gas_correction (float): Display-only pressure correction factor.
+            err_callback (callable): Receives spectrum-thread error messages.
+        """
+        self.config             = config
+        self.spectrum_analyzer  = spectrum_analyzer
+        self.pressure_sensor    = pressure_sensor
+        self.sinks              = list(sinks)
+        self.coadd              = coadd
+        self.spec_sweep_time_ms = spec_sweep_time_ms
+        self.status_line        = status_line
+        self.gas_correction     = gas_correction
+        self.err_callback       = err_callback
+        self.scheduler          = scheduler_from_config(config)
+        self.recovery           = recovery_from_config(config)
+        self.gaps               = 0
+        self._stop_event        = threading.Event()
+        self._pressure_thread   = None
+
+    @property
+    def spectrum_enabled(self):
+        return self.spectrum_analyzer is not None
+
+    @property
+    def pressure_enabled(self):
+        return self.pressure_sensor is not None
+
+    def stop(self):
+        self._stop_event.set()
+
+    def _mark_gap(self, message):
+        """Record an acquisition interruption in every sink (log stays the same file)."""
+        self.gaps += 1
+        METRICS.incr('engine.gaps')
+        print(f"[Engine] Resumed: {message}")
+        for sink in self.sinks:
+            sink.mark_gap(message)
+
+    def _recover_pressure(self, pressure_ok, stop_event):
+        t_down = time.monotonic()
+        if self.pressure_sensor.reconnect(stop_event=stop_event, **self.recovery['backoff']):
+            self._mark_gap(f"pressure gauge reconnected after "
+                           f"{time.monotonic() - t_down:.1f} s without pressure readings")
+            pressure_ok.set()
+
+    # ── Main run ──────────────────────────────────────────────────────────────
+
+    def run(self, duration=None):
+        """
+        Acquire until stop() is called (or `duration` seconds have elapsed)
+        and return the number of records produced.
+        """
+        stop_event = self._stop_event
+        stop_event.clear()
+
+        # Unbounded in co-add mode: the coordinator drains it every tick, and
+        # a bounded queue would stall the spectrum thread between ticks.
+        spec_queue = Queue() if self.coadd else Queue(maxsize=4)
+
+        for sink in self.sinks:
+            sink.start()
+
+        spec_stop   = threading.Event()
+        spec_down   = threading.Event()
+        spec_thread = None
+        if self.spectrum_enabled:
+            spec_thread = threading.Thread(
+                target=_spectrum_thread,
+                args=(self.spectrum_analyzer, spec_queue, spec_stop, self.err_callback,
+                      self.recovery, self._mark_gap, spec_down),
+                name='SpectrumAcq', daemon=True
+            )
+            spec_thread.start()
+
+        scheduler    = self.scheduler
+        cycle_ct     = 0
+        total_sweeps = 0
+        prev_elapsed = None
+        pressure_ok  = threading.Event()
+        p_failures   = 0
+        if self.pressure_enabled:
+            pressure_ok.set()
+
+        if self.status_line:
+            print(f"  {'Cycle':>7}  {'Elapsed':>10}  {'Pressure':>16}  "
+                  f"{'Eff %':>7}  {'Int Time':>12}")
+            print("  " + "-" * 62)
+
+        try:
+            scheduler.start()
+            while not stop_event.is_set():
+                # ── 0. Wait for the next tick on the absolute grid ─────────
+                if scheduler.wait(stop_event) is None:
+                    break
+                loop_start = time.time()          # wall clock, Timestamp column only
+                elapsed    = scheduler.elapsed()  # monotonic
+                if duration is not None and elapsed >= duration:
+                    break
+
+                # ── 1. Grab (or drain + co-add) completed spectrum sweeps ──
+                s_res = None
+                if self.spectrum_enabled:
+                    try:
+                        METRICS.queue_depth('queue.spec_depth', spec_queue)
+                        # While the analyzer is reconnecting, don't hold up the ticks
+                        # (free-run has no interval: poll at 100 ms rather than spin)
+                        timeout = (scheduler.interval or 0.1) if spec_down.is_set() else 25.0
+                        with METRICS.span('coord.spec_wait'):
+                            s_res = spec_queue.get(timeout=timeout)
+                        spec_queue.task_done()
+                        if self.coadd:
+                            s_res = _drain_and_coadd(spec_queue, s_res)
+                        total_sweeps += s_res.get('Count', 1)
+                    except Empty:
+                        if not spec_down.is_set():
+                            print("[WARN] Spectrum queue timeout – skipping cycle "
+                                  f"{cycle_ct}, row will NOT be written.")
+                        continue
+
+                # ── 2. Read pressure (fast serial, inline) ─────────────────
+                p_res = None
+                if pressure_ok.is_set():
+                    p_err = None
+                    try:
+                        p_res = self.pressure_sensor.get_reading()
+                    except Exception as e:
+                        p_err = e
+                    p_failures = p_failures + 1 if p_res is None else 0
+
+                    if self.recovery is not None and (
+                            p_err is not None
+                            or p_failures >= self.recovery['pressure_fail_threshold']):
+                        # Reopen the port off the coordinator thread; rows keep
+                        # coming with empty pressure columns until it is back.
+                        print(f"[ERROR] Pressure Sensor failed: {p_err or 'no response'}  "
+                              f"(reconnecting, recording spectrum-only meanwhile)")
+                        pressure_ok.clear()
+                        p_failures = 0
+                        self._pressure_thread = threading.Thread(
+                            target=self._recover_pressure, args=(pressure_ok, stop_event),
+                            name='PressureRecovery', daemon=True)
+                        self._pressure_thread.start()
+                    elif p_err is not None:
+                        print(f"[ERROR] Pressure Sensor failed: {p_err}  "
+                              f"(continuing spectrum-only recording)")
+                        pressure_ok.clear()
+                        try:
+                            self.pressure_sensor.disconnect()
+                        except Exception:
+                            pass
+                hw_wait_ms = (scheduler.elapsed() - elapsed) * 1000
+
+                # ── 3. Metrics ────────────────────────────────────────────
+                cycle_time_ms = (
+                    (elapsed - prev_elapsed) * 1000
+                    if prev_elapsed is not None else 0.0
+                )
+
+                eff_int_pct = 0.0 if self.spectrum_enabled else None
+                if s_res and self.spec_sweep_time_ms and cycle_time_ms > 0:
+                    eff_int_pct = min(
+                        100.0,
+                        (s_res.get('Count', 1) * self.spec_sweep_time_ms
+                         / cycle_time_ms) * 100.0
+                    )
+
+                pressure_val  = p_res['pressure'] if p_res else float('nan')
+                pressure_unit = p_res['unit']      if p_res else 'nan'
+
+                # ── 4. Terminal status line ────────────────────────────────
+                if self.status_line:
+                    self._print_status(cycle_ct, elapsed, p_res, pressure_val,
+                                       pressure_unit, eff_int_pct, total_sweeps)
+
+                # ── 5. Hand the record to every sink ───────────────────────
+                amplitudes = None
+                sumsq      = None
+                if s_res:
+                    amps = s_res['Amplitudes']
+                    amplitudes = amps.tolist() if isinstance(amps, np.ndarray) else list(amps)
+                    if self.coadd:
+                        sumsq = s_res['SumSq'].tolist()
+
+                record = {
+                    'timestamp':     time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(loop_start)),
+                    'wall_time':     loop_start,
+                    'elapsed':       elapsed,
+                    'cycle_ct':      cycle_ct,
+                    'cycle_time_ms': cycle_time_ms,
+                    'hw_wait_ms':    hw_wait_ms,
+                    'eff_int_pct':   eff_int_pct,
+                    'coadd_n':       s_res.get('Count', 1) if (s_res and self.coadd) else None,
+                    'pressure':      pressure_val,
+                    'pressure_unit': pressure_unit,
+                    'amplitudes':    amplitudes,
+                    'sumsq':         sumsq,
+                    'total_sweeps':  total_sweeps,
+                }
+                for sink in self.sinks:
+                    sink.submit(record)
+
+                prev_elapsed = elapsed
+                cycle_ct += 1
+
+                # ── 6. Cycle bookkeeping (pacing is done by the scheduler) ─
+                METRICS.observe_ms('coord.cycle_work', (scheduler.elapsed() - elapsed) * 1000)
+                METRICS.incr('coord.cycles')
+
+        finally:
+            self._shutdown(spec_stop, spec_thread)
+
+        return cycle_ct
+
+    def _print_status(self, cycle_ct, elapsed, p_res, pressure_val,
+                      pressure_unit, eff_int_pct, total_sweeps):
+        if p_res:
+            p_display_val = (pressure_val / self.gas_correction
+                             if self.gas_correction is not None
+                             else pressure_val)
+            gc_marker = '*' if self.gas_correction is not None else ' '
+            p_display = f"{p_display_val:.3e}{gc_marker}{pressure_unit}"
+        else:
+            p_display = "  --   "
+
+        sweep_time_s = (self.spec_sweep_time_ms / 1000.0
+                        if self.spec_sweep_time_ms else 0.0)
+        int_time_s  = sweep_time_s * total_sweeps
+        int_display = f"{int_time_s:.1f} s" if self.spectrum_enabled else "  N/A  "
+
+        print(
+            f"  {cycle_ct:>7d}  "
+            f"{elapsed:>10.1f}s  "
+            f"{p_display:>16}  "
+            f"{(eff_int_pct or 0.0):>7.1f}  "
+            f"{int_display:>12}"
+        )
+
+    # ── Shutdown ──────────────────────────────────────────────────────────────
+
+    def _shutdown(self, spec_stop, spec_thread):
+        spec_stop.set()
+        if spec_thread and spec_thread.is_alive():
+            spec_thread.join(timeout=5)
+        if self._pressure_thread and self._pressure_thread.is_alive():
+            self._stop_event.set()
+            self._pressure_thread.join(timeout=5)
+
+        # Every sink drains its queue before its thread exits
+        for sink in self.sinks:
+            sink.stop()
+
+        if self.scheduler.stats.count:
+            print(f"[Engine] Scheduler: {self.scheduler.report()}")
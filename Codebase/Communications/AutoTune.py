@@ -0,0 +1,252 @@
+"""
+AutoTune.py  –  Throughput Calibration for the Spectrum Analyzer Settings
+=========================================================================
+Picking sweep_time / num_points / RBW / reading_interval in Config_HS.json
+was trial and error.  This command measures what each setting actually costs
+on the connected analyzer and picks the combination that keeps it integrating
+for the largest fraction of the time.
+
+For every point of a small grid (sweep_time × num_points × RBW) it applies
+the settings through SpectrumAnalyzer.apply_settings() (verified writes, so
+a skipped setting shows up as a mismatch instead of silently corrupting the
+calibration), runs a few back-to-back sweeps and reads the driver's own
+METRICS spans:
+
+    sa.opc_wait   initiate → *OPC? returned   (sweep + OPC overhead)
+    sa.transfer   trace fetch                  (per-point transfer cost)
+    sa.fetch      the whole get_amplitudes()   (sustained cycle)
+
+From those it fits a cost model
+
+    cycle_ms ≈ sweep_ms + opc_overhead_ms + transfer_fixed_ms + transfer_per_point_ms · N
+
+and, among the grid points meeting the target frequency resolution
+(span / (N-1) and RBW ≤ resolution), recommends the one with the highest
+effective integration (sweep / cycle), then the highest sweeps/s.  The
+recommended reading_interval is the p99 cycle time rounded up to 10 ms, so
+the non-co-add recorder takes every sweep without building a backlog.
+
+The cost model and every measured point are saved as JSON for later runs;
+--apply writes the recommendation into the config file (keeping a .bak).
+"""
+
+from Instrumentation import METRICS
+from SpectrumAnalyzer import SpectrumAnalyzer
+
+import math
+import json
+import time
+import shutil
+import argparse
+import itertools
+
+import numpy as np
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+#  Measurement
+# ──────────────────────────────────────────────────────────────────────────────
+
+def measure_point(analyzer, overrides, sweeps=10, warmup=1):
+    """
+    Apply `overrides`, run `sweeps` back-to-back sweeps and return the
+    measured costs for this grid point.
+    """
+    written = analyzer.apply_settings(overrides)
+    info = analyzer.get_instrument_data()
+
+    # Settings the instrument did not take are reported, not hidden
+    mismatched = []
+    if 'num_points' in overrides and int(float(info['Number of Points'])) != int(overrides['num_points']):
+        mismatched.append('num_points')
+    if 'sweep_time' in overrides and info['Sweep Time (ms)'] != 'Auto':
+        if abs(float(info['Sweep Time (ms)']) - overrides['sweep_time']) > 1e-3 * overrides['sweep_time']:
+            mismatched.append('sweep_time')
+
+    for _ in range(warmup):
+        analyzer.get_amplitudes()
+    METRICS.snapshot(reset=True)
+    for _ in range(sweeps):
+        analyzer.get_amplitudes()
+    timings = METRICS.snapshot(reset=True)['timings_ms']
+
+    sweep_ms  = (float(info['Sweep Time (ms)']) if info['Sweep Time (ms)'] != 'Auto'
+                 else float(overrides.get('sweep_time', 0)))
+    opc_ms    = timings['sa.opc_wait']['mean']
+    xfer_ms   = timings['sa.transfer']['mean']
+    cycle_ms  = timings['sa.fetch']['mean']
+    num_pts   = int(float(info['Number of Points']))
+    span      = float(info['Span'])
+
+    return {
+        'settings':           dict(overrides),
+        'written':            sorted(written),
+        'mismatched':         mismatched,
+        'sweep_time_ms':      sweep_ms,
+        'num_points':         num_pts,
+        'rbw_hz':             float(info['RBW (Hz)']),
+        'span_hz':            span,
+        'bin_hz':             span / (num_pts - 1) if num_pts > 1 else span,
+        'opc_wait_ms':        opc_ms,
+        'opc_overhead_ms':    opc_ms - sweep_ms,
+        'transfer_ms':        xfer_ms,
+        'cycle_ms':           cycle_ms,
+        'sweeps_per_s':       1000.0 / cycle_ms if cycle_ms > 0 else 0.0,
+        'eff_int_pct':        min(100.0, 100.0 * sweep_ms / cycle_ms) if cycle_ms > 0 else 0.0,
+        'cycle_p99_ms':       timings['sa.fetch']['p99'],
+    }
+
+
+def run_grid(analyzer, sweep_times, num_points, rbws, sweeps=10, log=print):
+    """Measure every grid point; failed points are logged and skipped."""
+    grid = list(itertools.product(sweep_times, num_points, rbws))
+    points = []
+    for i, (st, n, rbw) in enumerate(grid, start=1):
+        overrides = {'sweep_time': st, 'num_points': n, 'auto_sweep_time': 0}
+        if rbw is not None:
+            overrides['RBW'] = rbw
+        try:
+            p = measure_point(analyzer, overrides, sweeps=sweeps)
+        except Exception as e:
+            log(f"[AutoTune] {i}/{len(grid)} {overrides}: FAILED ({e})")
+            continue
+        points.append(p)
+        flag = f"  MISMATCH {p['mismatched']}" if p['mismatched'] else ''
+        log(f"[AutoTune] {i}/{len(grid)} sweep {st:>7} ms  N {n:>5}  RBW {rbw or '-':>8}  →  "
+            f"cycle {p['cycle_ms']:8.1f} ms  {p['sweeps_per_s']:6.2f} sw/s  "
+            f"eff {p['eff_int_pct']:5.1f}%{flag}")
+    return points
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+#  Cost model and recommendation
+# ──────────────────────────────────────────────────────────────────────────────
+
+def fit_cost_model(points):
+    """
+    Least-squares fit of the per-sweep overheads over the measured grid.
+    Transfer cost is linear in the number of points, OPC overhead is a
+    constant on top of the programmed sweep time.
+    """
+    if not points:
+        raise ValueError("No grid points were measured")
+    n    = np.array([p['num_points'] for p in points], dtype=float)
+    xfer = np.array([p['transfer_ms'] for p in points])
+    if len(np.unique(n)) > 1:
+        per_point, fixed = np.polyfit(n, xfer, 1)
+    else:
+        per_point, fixed = 0.0, float(xfer.mean())
+
+    overhead = np.array([p['cycle_ms'] - p['sweep_time_ms'] - p['transfer_ms'] for p in points])
+    return {
+        'opc_overhead_ms':       float(np.median([p['opc_overhead_ms'] for p in points])),
+        'transfer_fixed_ms':     float(fixed),
+        'transfer_per_point_ms': float(per_point),
+        'other_overhead_ms':     float(np.median(overhead) - np.median([p['opc_overhead_ms'] for p in points])),
+    }
+
+
+def predict_cycle_ms(model, sweep_time_ms, num_points):
+    """Predicted sustained cycle time for settings that were not measured."""
+    return (sweep_time_ms + model['opc_overhead_ms'] + model['other_overhead_ms']
+            + model['transfer_fixed_ms'] + model['transfer_per_point_ms'] * num_points)
+
+
+def recommend(points, resolution_hz=None, min_rate=None):
+    """
+    Best measured grid point: resolution met, no skipped settings, highest
+    effective integration then highest sweep rate.  Returns None if nothing
+    qualifies.
+    """
+    candidates = [p for p in points if not p['mismatched']]
+    if resolution_hz is not None:
+        candidates = [p for p in candidates
+                      if p['bin_hz'] <= resolution_hz and p['rbw_hz'] <= resolution_hz]
+    if min_rate is not None:
+        candidates = [p for p in candidates if p['sweeps_per_s'] >= min_rate]
+    if not candidates:
+        return None
+    best = max(candidates, key=lambda p: (round(p['eff_int_pct'], 1), p['sweeps_per_s']))
+    return dict(best, reading_interval=math.ceil(best['cycle_p99_ms'] / 10.0) * 10 / 1000.0)
+
+
+def apply_to_config(config_path, rec):
+    """Write the recommended settings into the config file (old file kept as .bak)."""
+    shutil.copyfile(config_path, config_path + '.bak')
+    with open(config_path, 'r') as fh:
+        config = json.load(fh)
+    visa = config['spectrum_analyzer']['visa']
+    visa.update(rec['settings'])
+    config['program']['reading_interval'] = rec['reading_interval']
+    with open(config_path, 'w') as fh:
+        json.dump(config, fh, indent=4)
+
+
+def _floats(text):
+    return [float(v) for v in text.split(',')] if text else []
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+#  Entry point
+# ──────────────────────────────────────────────────────────────────────────────
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Calibrate sweep_time / num_points / RBW for maximum throughput')
+    parser.add_argument('-config', type=str, default=r'Codebase\Communications\Config_HS.json',
+                        help='Path to configuration file')
+    parser.add_argument('-sweep_times', type=str, default='20,50,100,200', help='Sweep times to try (ms)')
+    parser.add_argument('-points', type=str, default='401,801,1601', help='Numbers of sweep points to try')
+    parser.add_argument('-rbws', type=str, default='', help='RBWs to try (Hz); default keeps the config RBW')
+    parser.add_argument('-sweeps', type=int, default=10, help='Timed sweeps per grid point')
+    parser.add_argument('-resolution', type=float, default=None,
+                        help='Target frequency resolution (Hz): bin spacing and RBW must not exceed it')
+    parser.add_argument('-min_rate', type=float, default=None, help='Minimum sustained sweeps/s')
+    parser.add_argument('-model', type=str, default='autotune_model.json',
+                        help='Where to save the measured cost model')
+    parser.add_argument('--apply', default=False, action='store_true',
+                        help='Write the recommendation into the config file (keeps a .bak)')
+    args = parser.parse_args()
+
+    with open(args.config, 'r') as fh:
+        config = json.load(fh)
+
+    METRICS.enabled = True
+    analyzer = SpectrumAnalyzer(config['spectrum_analyzer'],
+                                lambda t, m: print(f"[Spectrum Analyzer{' ERROR' if t == 'error' else ''}] {m}"))
+    try:
+        t0 = time.perf_counter()
+        points = run_grid(analyzer,
+                          [int(v) if v.is_integer() else v for v in _floats(args.sweep_times)],
+                          [int(v) for v in _floats(args.points)],
+                          _floats(args.rbws) or [None],
+                          sweeps=args.sweeps)
+        model = fit_cost_model(points)
+        rec = recommend(points, args.resolution, args.min_rate)
+    finally:
+        # Leave the analyzer in the configured state
+        analyzer.apply_settings()
+
+    print(f"\n[AutoTune] {len(points)} points in {time.perf_counter() - t0:.1f} s")
+    print(f"[AutoTune] Cost model: OPC overhead {model['opc_overhead_ms']:.2f} ms, "
+          f"transfer {model['transfer_fixed_ms']:.2f} ms + {model['transfer_per_point_ms'] * 1000:.3f} µs/point, "
+          f"other {model['other_overhead_ms']:.2f} ms")
+
+    with open(args.model, 'w') as fh:
+        json.dump({
+            'timestamp':      time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'resource':       config['spectrum_analyzer']['visa'].get('resource_string'),
+            'model':          model,
+            'recommendation': rec,
+            'points':         points,
+        }, fh, indent=2)
+    print(f"[AutoTune] Saved cost model to {args.model}")
+
+    if rec is None:
+        print("[AutoTune] No grid point meets the resolution / rate targets.")
+        raise SystemExit(1)
+
+    print(f"[AutoTune] Recommended: {rec['settings']}, reading_interval {rec['reading_interval']} s  "
+          f"→ {rec['eff_int_pct']:.1f}% effective integration, {rec['sweeps_per_s']:.2f} sweeps/s")
+    if args.apply:
+        apply_to_config(args.config, rec)
+        print(f"[AutoTune] Applied to {args.config} (previous version in {args.config}.bak)")
@@ -0,0 +1,339 @@
+"""
+GuiBenchmark.py  –  Rendering Benchmark for VisualInterface
+===========================================================
+Drives VisualInterface.process_new_data with a synthetic feed (random sweeps
+around a noise floor plus a slowly pumping-down pressure trace) at increasing
+update rates and reports, for every (num_points, history, panels)
+configuration, the highest update rate the GUI can sustain.
+
+Measurement
+-----------
+* A feeder thread emits `data_received` at the target rate, exactly like the
+  logging thread in StartCommunication.py does, so every update crosses the
+  thread boundary through Qt's queued connection.
+* Achieved FPS      : paint events on the first visible plot per second.
+* Emit → paint      : time from `emit()` in the feeder thread to the first
+                      paint of the plot after that update was processed.
+* Main-thread CPU   : `time.thread_time()` sampled on the GUI thread, reported
+                      as % of one core over the step.
+
+A rate step is "sustainable" when the GUI processed at least
+`--min_ratio` of the emitted updates, the p95 emit → paint latency stays below
+`--max_latency_ms`, and the main thread is below `--max_cpu` %.
+
+Usage
+-----
+    python GuiBenchmark.py --headless
+    python GuiBenchmark.py --headless -points 401 1001 -history 200 2000 \
+        -panels 1 4 -rates 5 10 20 50 100 --budget_hz 10 -out gui_bench.json
+
+With --budget_hz the script exits with status 1 when any configuration cannot
+sustain the budgeted update rate, so it can be used to check GUI changes.
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import threading
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+#  Synthetic feed
+# ──────────────────────────────────────────────────────────────────────────────
+
+def _make_feed(np, num_points, n_frames=64, seed=0):
+    """
+    Pre-generate a ring of synthetic sweeps so the feeder thread spends no
+    time on random number generation while it is pacing emits.
+    """
+    rng = np.random.default_rng(seed)
+    floor = -90.0 + 2.0 * np.sin(np.linspace(0, 3 * np.pi, num_points))
+    line = 6.0 * np.exp(-0.5 * ((np.arange(num_points) - num_points / 2) / (num_points / 80)) ** 2)
+    return [(floor + line + rng.normal(0, 0.5, num_points)).astype(np.float32).tolist()
+            for _ in range(n_frames)]
+
+
+def _feeder(gui, sweeps, rate_hz, duration_s, stop_event, stats):
+    """
+    Emit `data_received` at `rate_hz` for `duration_s` seconds against an
+    absolute monotonic schedule so the offered load does not drift.
+    """
+    period = 1.0 / rate_hz
+    t_start = time.perf_counter()
+    n = 0
+    while not stop_event.is_set():
+        deadline = t_start + n * period
+        if deadline - t_start >= duration_s:
+            break
+        delay = deadline - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+
+        elapsed = stats['elapsed0'] + n * period
+        pressure = 1e-3 + 1e3 * (1.0 + elapsed) ** -1.5
+        gui.data_received.emit({
+            'amplitudes':             sweeps[n % len(sweeps)],
+            'pressure':               pressure,
+            'elapsed_time':           elapsed,
+            'file_size_mb':           n * 0.01,
+            'gb_hr':                  0.0,
+            'cadence':                rate_hz,
+            'cycle':                  n,
+            'cycle_time_ms':          period * 1000,
+            'instrumental_time_ms':   period * 1000,
+            'integration_efficiency': 100.0,
+            '_bench_emit_t':          time.perf_counter(),
+        })
+        n += 1
+    stats['emitted'] = n
+    stats['elapsed0'] += n * period
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+#  Paint / latency probe
+# ──────────────────────────────────────────────────────────────────────────────
+
+def _make_probe(QtCore):
+
+    class _PaintProbe(QtCore.QObject):
+        """
+        Event filter on a plot viewport.  Records paint timestamps and closes
+        out the emit → paint latency of every update processed since the
+        previous paint.
+        """
+
+        def __init__(self):
+            super().__init__()
+            self.reset()
+
+        def reset(self):
+            self.paints    = 0
+            self.processed = 0
+            self.pending   = []
+            self.latencies = []
+
+        def on_data(self, data):
+            # Connected after process_new_data, so the curves are already
+            # updated when this runs.
+            self.processed += 1
+            t_emit = data.get('_bench_emit_t')
+            if t_emit is not None:
+                self.pending.append(t_emit)
+
+        def eventFilter(self, obj, event):
+            if event.type() == QtCore.QEvent.Type.Paint:
+                now = time.perf_counter()
+                self.paints += 1
+                if self.pending:
+                    self.latencies.extend(now - t for t in self.pending)
+                    self.pending.clear()
+            return False
+
+    return _PaintProbe()
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+#  Benchmark driver
+# ──────────────────────────────────────────────────────────────────────────────
+
+def _percentile(values, q):
+    if not values:
+        return float('nan')
+    values = sorted(values)
+    idx = min(len(values) - 1, max(0, int(round(q / 100.0 * (len(values) - 1)))))
+    return values[idx]
+
+
+def _run_step(app, QtCore, gui, probe, sweeps, rate_hz, duration_s, feed_state):
+    """Run a single rate step and return its measured statistics."""
+    probe.reset()
+    stop_event = threading.Event()
+    stats = {'emitted': 0, 'elapsed0': feed_state['elapsed']}
+
+    cpu0  = time.thread_time()
+    wall0 = time.perf_counter()
+
+    feeder = threading.Thread(
+        target=_feeder,
+        args=(gui, sweeps, rate_hz, duration_s, stop_event, stats),
+        name='GuiBenchFeeder', daemon=True
+    )
+    feeder.start()
+
+    # Spin the event loop for the step, then give queued updates a short
+    # grace period to drain so the backlog counts against the step.
+    loop = QtCore.QEventLoop()
+    QtCore.QTimer.singleShot(int((duration_s + 0.25) * 1000), loop.quit)
+    loop.exec()
+    stop_event.set()
+    feeder.join(timeout=2)
+    app.processEvents()
+
+    wall = time.perf_counter() - wall0
+    cpu  = time.thread_time() - cpu0
+    feed_state['elapsed'] = stats['elapsed0']
+
+    emitted = max(stats['emitted'], 1)
+    lat_ms = [l * 1000 for l in probe.latencies]
+    return {
+        'target_hz':      rate_hz,
+        'emitted':        stats['emitted'],
+        'processed':      probe.processed,
+        'processed_ratio': probe.processed / emitted,
+        'achieved_hz':    probe.processed / wall,
+        'fps':            probe.paints / wall,
+        'latency_p50_ms': _percentile(lat_ms, 50),
+        'latency_p95_ms': _percentile(lat_ms, 95),
+        'latency_max_ms': max(lat_ms) if lat_ms else float('nan'),
+        'main_cpu_pct':   100.0 * cpu / wall,
+    }
+
+
+def _is_sustainable(step, args):
+    return (step['processed_ratio'] >= args.min_ratio
+            and step['latency_p95_ms'] <= args.max_latency_ms
+            and step['main_cpu_pct'] <= args.max_cpu)
+
+
+def _bench_config(app, QtCore, np, VisualInterface, num_points, history, panels, args):
+    spectral_axis = np.linspace(2.45e9 - 50e6, 2.45e9 + 50e6, num_points).tolist()
+    gui = VisualInterface(spectral_axis=spectral_axis)
+    gui.max_history = history
+
+    plots = [gui.plot_power, gui.plot_psd, gui.plot_pressure, gui.plot_deriv]
+    for pw in plots[panels:]:
+        pw.hide()
+
+    # Pre-fill the pressure history so the step measures steady state,
+    # not the ramp-up while the buffer is still short.
+    t_hist = list(np.arange(history) * 0.1)
+    gui.time_history     = t_hist
+    gui.pressure_history = [1e-3 + 1e3 * (1.0 + t) ** -1.5 for t in t_hist]
+
+    gui.show()
+    probe = _make_probe(QtCore)
+    plots[0].viewport().installEventFilter(probe)
+    gui.data_received.connect(probe.on_data)
+    app.processEvents()
+
+    sweeps = _make_feed(np, num_points)
+    feed_state = {'elapsed': history * 0.1}
+    steps = []
+    best = 0.0
+    for rate in args.rates:
+        step = _run_step(app, QtCore, gui, probe, sweeps, rate, args.duration, feed_state)
+        step['sustainable'] = _is_sustainable(step, args)
+        steps.append(step)
+        if args.verbose:
+            print(f"    {rate:>7.1f} Hz  fps={step['fps']:>6.1f}  "
+                  f"done={step['processed_ratio'] * 100:>5.1f}%  "
+                  f"p95={step['latency_p95_ms']:>7.1f} ms  "
+                  f"cpu={step['main_cpu_pct']:>5.1f}%"
+                  f"{'' if step['sustainable'] else '  ✗'}")
+        if not step['sustainable']:
+            break
+        best = rate
+
+    gui.data_received.disconnect(probe.on_data)
+    plots[0].viewport().removeEventFilter(probe)
+    gui.close()
+    gui.deleteLater()
+    app.processEvents()
+
+    return {
+        'num_points':     num_points,
+        'history':        history,
+        'panels':         panels,
+        'max_sustainable_hz': best,
+        'steps':          steps,
+    }
+
+
+def run_benchmark(args):
+    if args.headless:
+        os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+
+    import numpy as np
+    from PyQt6 import QtWidgets, QtCore
+    from VisualInterface import VisualInterface
+
+    app = QtWidgets.QApplication.instance() or QtWidgets.QApplication(sys.argv[:1])
+
+    results = []
+    print(f"\n[GuiBench] platform={app.platformName()}  "
+          f"rates={args.rates} Hz  step={args.duration:.1f} s\n")
+    print(f"  {'Points':>7}  {'History':>8}  {'Panels':>6}  {'Max Hz':>8}  "
+          f"{'FPS':>6}  {'p95 ms':>8}  {'CPU %':>6}")
+    print("  " + "-" * 60)
+
+    for num_points in args.points:
+        for history in args.history:
+            for panels in args.panels:
+                if args.verbose:
+                    print(f"  [{num_points} pts, {history} hist, {panels} panels]")
+                res = _bench_config(app, QtCore, np, VisualInterface,
+                                    num_points, history, panels, args)
+                results.append(res)
+
+                ok = [s for s in res['steps'] if s['sustainable']]
+                ref = ok[-1] if ok else res['steps'][0]
+                print(f"  {num_points:>7d}  {history:>8d}  {panels:>6d}  "
+                      f"{res['max_sustainable_hz']:>8.1f}  {ref['fps']:>6.1f}  "
+                      f"{ref['latency_p95_ms']:>8.1f}  {ref['main_cpu_pct']:>6.1f}")
+
+    return results
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+#  Entry point
+# ──────────────────────────────────────────────────────────────────────────────
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Benchmark VisualInterface update throughput with a synthetic feed')
+    parser.add_argument('-points',  type=int,   nargs='+', default=[401, 1001, 4001],
+                        help='Sweep sizes (num_points) to test')
+    parser.add_argument('-history', type=int,   nargs='+', default=[200, 2000],
+                        help='Pressure history lengths (max_history) to test')
+    parser.add_argument('-panels',  type=int,   nargs='+', default=[1, 4],
+                        help='Number of visible plot panels (1-4)')
+    parser.add_argument('-rates',   type=float, nargs='+',
+                        default=[2, 5, 10, 20, 50, 100, 200],
+                        help='Offered update rates in Hz, tested in increasing order')
+    parser.add_argument('-duration', type=float, default=3.0,
+                        help='Seconds per rate step')
+    parser.add_argument('--min_ratio', type=float, default=0.95,
+                        help='Minimum fraction of emitted updates that must be processed')
+    parser.add_argument('--max_latency_ms', type=float, default=250.0,
+                        help='Maximum p95 emit → paint latency (ms)')
+    parser.add_argument('--max_cpu', type=float, default=90.0,
+                        help='Maximum main-thread CPU (%% of one core)')
+    parser.add_argument('--budget_hz', type=float, default=None,
+                        help='Exit with status 1 if any configuration sustains less than this rate')
+    parser.add_argument('-out', type=str, default=None,
+                        help='Write full results as JSON to this path')
+    parser.add_argument('--headless', default=False, action='store_true',
+                        help='Use the Qt offscreen platform (no display needed)')
+    parser.add_argument('--verbose', default=False, action='store_true',
+                        help='Print every rate step')
+
+    args = parser.parse_args()
+    args.rates  = sorted(args.rates)
+    args.panels = [min(4, max(1, p)) for p in args.panels]
+
+    results = run_benchmark(args)
+
+    if args.out:
+        with open(args.out, 'w') as fh:
+            json.dump({'settings': vars(args), 'results': results}, fh, indent=2)
+        print(f"\n[GuiBench] Results written to {args.out}")
+
+    if args.budget_hz is not None:
+        failing = [r for r in results if r['max_sustainable_hz'] < args.budget_hz]
+        if failing:
+            print(f"\n[GuiBench] FAIL: {len(failing)} configuration(s) below "
+                  f"the {args.budget_hz:g} Hz budget.")
+            raise SystemExit(1)
+        print(f"\n[GuiBench] PASS: all configurations sustain {args.budget_hz:g} Hz.")
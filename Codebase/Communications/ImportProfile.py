@@ -0,0 +1,137 @@
+"""
+ImportProfile.py  –  Start-up Import Profile and Budget Check
+=============================================================
+Imports each entry-point module in a fresh interpreter with `-X importtime`
+and summarises where its start-up time goes: total import time, wall time of
+the cold start, and the heaviest top-level imports (numpy, pandas,
+matplotlib, PyQt6, scipy, pyvisa …).
+
+Used to keep the headless recorder and the quick analysis paths from
+regressing back to loading the GUI / plotting stack up front:
+
+    python ImportProfile.py                       # default entry points
+    python ImportProfile.py -budget_ms 1000       # exit code 1 if any is over
+    python ImportProfile.py -targets Analysis/Utilities.py -top 15
+
+Target paths are relative to the Codebase folder.  A target that fails to
+import (e.g. a missing instrument driver) is reported and exits with code 2.
+"""
+
+import os
+import re
+import sys
+import time
+import argparse
+import subprocess
+
+
+CODEBASE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+DEFAULT_TARGETS = [
+    'Communications/StartCommunicationMinimal.py',
+    'Communications/StartCommunication.py',
+    'Analysis/Utilities.py',
+    'Analysis/Graphing.py',
+]
+
+# "import time: self [us] | cumulative | imported package"
+_LINE = re.compile(r'^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)')
+
+
+def profile_import(path, python=sys.executable):
+    """
+    Import the module at `path` in a fresh interpreter.
+
+    Returns:
+        dict: total_ms (module import, cumulative), wall_ms (whole cold
+              start), top (list of (name, cumulative_ms) for the module's
+              direct imports) and error (last stderr line, or None).
+    """
+    path = os.path.join(CODEBASE, path) if not os.path.isabs(path) else path
+    folder, module = os.path.split(os.path.splitext(path)[0])
+    code = f"import sys; sys.path.insert(0, {folder!r}); import {module}"
+
+    t0 = time.perf_counter()
+    proc = subprocess.run([python, '-X', 'importtime', '-c', code],
+                          cwd=folder, capture_output=True, text=True)
+    wall_ms = (time.perf_counter() - t0) * 1000
+
+    # Children are printed (one level deeper) before their parent, so the
+    # direct imports of the target are the depth-1 lines preceding its line
+    top, pending, total_ms, other = [], [], None, []
+    for line in proc.stderr.splitlines():
+        m = _LINE.match(line)
+        if not m:
+            other.append(line)
+            continue
+        cumulative_ms = int(m.group(2)) / 1000
+        depth = (len(m.group(3)) - 1) // 2
+        name = m.group(4)
+        if depth == 1:
+            pending.append((name, cumulative_ms))
+        elif depth == 0:
+            if name == module:
+                total_ms, top = cumulative_ms, pending
+            pending = []
+
+    error = None
+    if proc.returncode != 0:
+        error = next((l for l in reversed(other) if l.strip()), f'exit code {proc.returncode}')
+
+    return {
+        'target':   os.path.relpath(path, CODEBASE),
+        'total_ms': total_ms,
+        'wall_ms':  wall_ms,
+        'top':      sorted(top, key=lambda x: -x[1]),
+        'error':    error,
+    }
+
+
+def interpreter_baseline_ms(python=sys.executable, runs=3):
+    """Cold start of an empty interpreter, to put the wall times in context."""
+    best = float('inf')
+    for _ in range(runs):
+        t0 = time.perf_counter()
+        subprocess.run([python, '-c', 'pass'], capture_output=True)
+        best = min(best, (time.perf_counter() - t0) * 1000)
+    return best
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Import-time profile of the entry points')
+    parser.add_argument('-targets', nargs='+', default=DEFAULT_TARGETS,
+                        help='Entry-point files, relative to the Codebase folder')
+    parser.add_argument('-top', type=int, default=8, help='Heaviest top-level imports to list')
+    parser.add_argument('-budget_ms', type=float, default=None,
+                        help='Fail (exit code 1) if any target cold start exceeds this wall time')
+    args = parser.parse_args()
+
+    base_ms = interpreter_baseline_ms()
+    print(f"Interpreter cold start: {base_ms:.0f} ms\n")
+
+    over, failed = [], []
+    for target in args.targets:
+        r = profile_import(target)
+        if r['error']:
+            failed.append(r['target'])
+            print(f"{r['target']}: IMPORT FAILED – {r['error']}\n")
+            continue
+
+        total = f"{r['total_ms']:.0f} ms" if r['total_ms'] is not None else 'n/a'
+        print(f"{r['target']}: import {total}, cold start {r['wall_ms']:.0f} ms")
+        for name, ms in r['top'][:args.top]:
+            print(f"    {ms:8.1f} ms  {name}")
+        print()
+
+        if args.budget_ms is not None and r['wall_ms'] > args.budget_ms:
+            over.append(f"{r['target']} ({r['wall_ms']:.0f} ms)")
+
+    if args.budget_ms is not None:
+        if over:
+            print(f"OVER BUDGET ({args.budget_ms:.0f} ms): {', '.join(over)}")
+        else:
+            print(f"All targets within the {args.budget_ms:.0f} ms budget.")
+
+    if failed:
+        sys.exit(2)
+    sys.exit(1 if over else 0)
@@ -0,0 +1,402 @@
+"""
+Instrumentation.py  –  Hot-Path Timing and Metrics Export
+=========================================================
+A single, low-overhead metrics layer shared by SpectrumAnalyzer,
+PressureSensor, both CommunicationMaster loops and the CSV writers.
+
+* Timings go into HDR-style log-linear histograms (fixed relative precision,
+  O(1) record, no per-sample storage), so a multi-hour run costs a few KB.
+* Counters are monotonically increasing totals (sweeps, errors, rows).
+* Gauges hold the latest value of something sampled (queue depth, RSS).
+
+Everything records into the module-level `METRICS` registry.  It is disabled
+by default, in which case `span()` hands back a shared no-op object and the
+other calls return immediately, so the instrumented code pays (almost)
+nothing unless a front end turns metrics on:
+
+    from Instrumentation import METRICS
+
+    with METRICS.span('sa.fetch'):
+        ...
+    METRICS.observe_ns('writer.fsync', t1 - t0)
+    METRICS.incr('sa.sweeps')
+    METRICS.gauge('queue.spec_depth', q.qsize())
+
+MetricsExporter periodically snapshots the registry and either appends one
+JSON object per interval to a .jsonl file (histograms are reset each interval
+so every line describes that window only) or serves the cumulative registry
+in Prometheus text format on a local HTTP port.
+"""
+
+import os
+import json
+import time
+import threading
+
+try:
+    import psutil
+except ImportError:    # psutil is optional; fall back to /proc on Linux
+    psutil = None
+
+
+# Sub-bucket resolution of the histograms: 2**_SUB_BITS buckets per power of
+# two gives better than 1 % relative precision on every recorded value.
+_SUB_BITS  = 7
+_SUB_COUNT = 1 << _SUB_BITS
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+#  HDR-style histogram
+# ──────────────────────────────────────────────────────────────────────────────
+
+class Histogram():
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.counts = {}
+        self.count  = 0
+        self.total  = 0
+        self.min    = None
+        self.max    = None
+
+    @staticmethod
+    def _index(value):
+        """Map a non-negative integer onto its (octave, sub-bucket) index."""
+        if value < _SUB_COUNT:
+            return value
+        shift = value.bit_length() - _SUB_BITS - 1
+        return ((shift + 1) << _SUB_BITS) + ((value >> shift) - _SUB_COUNT)
+
+    @staticmethod
+    def _value(index):
+        """Lowest value represented by a bucket index (inverse of _index)."""
+        if index < _SUB_COUNT:
+            return index
+        shift = (index >> _SUB_BITS) - 1
+        return ((index & (_SUB_COUNT - 1)) + _SUB_COUNT) << shift
+
+    def record(self, value):
+        value = int(value) if value > 0 else 0
+        idx = self._index(value)
+        self.counts[idx] = self.counts.get(idx, 0) + 1
+        self.count += 1
+        self.total += value
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+
+    def percentile(self, q):
+        """Value at percentile `q` (0-100), accurate to the bucket width."""
+        if self.count == 0:
+            return None
+        target = max(1, int(round(q / 100.0 * self.count)))
+        seen = 0
+        for idx in sorted(self.counts):
+            seen += self.counts[idx]
+            if seen >= target:
+                return min(self._value(idx), self.max)
+        return self.max
+
+    def summary(self, scale=1.0):
+        if self.count == 0:
+            return {'count': 0}
+        return {
+            'count': self.count,
+            'mean':  self.total / self.count * scale,
+            'min':   self.min * scale,
+            'p50':   self.percentile(50) * scale,
+            'p90':   self.percentile(90) * scale,
+            'p99':   self.percentile(99) * scale,
+            'max':   self.max * scale,
+        }
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+#  Registry
+# ──────────────────────────────────────────────────────────────────────────────
+
+class _NullSpan():
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class _Span():
+    __slots__ = ('_metrics', '_name', '_t0')
+
+    def __init__(self, metrics, name):
+        self._metrics = metrics
+        self._name    = name
+
+    def __enter__(self):
+        self._t0 = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc):
+        self._metrics.observe_ns(self._name, time.perf_counter_ns() - self._t0)
+        return False
+
+
+class Metrics():
+    """
+    Thread-safe registry of timing histograms (stored in ns, exported in ms),
+    value histograms (unitless, e.g. queue depth), counters and gauges.
+
+    Every histogram is kept twice: a cumulative copy (served to Prometheus)
+    and a windowed copy that windowed snapshots reset.
+    """
+
+    def __init__(self, enabled=False):
+        self.enabled     = enabled
+        self._lock       = threading.Lock()
+        self._timings    = {}
+        self._values     = {}
+        self._counters   = {}
+        self._gauges     = {}
+        self._window_t0  = time.time()
+
+    # ── Recording ─────────────────────────────────────────────────────────────
+
+    def span(self, name):
+        """Context manager timing its body into histogram `name`."""
+        if not self.enabled:
+            return _NULL_SPAN
+        return _Span(self, name)
+
+    def observe_ns(self, name, duration_ns):
+        if not self.enabled:
+            return
+        with self._lock:
+            pair = self._timings.get(name)
+            if pair is None:
+                pair = self._timings[name] = (Histogram(), Histogram())
+            pair[0].record(duration_ns)
+            pair[1].record(duration_ns)
+
+    def observe_ms(self, name, duration_ms):
+        self.observe_ns(name, duration_ms * 1e6)
+
+    def observe_value(self, name, value):
+        """Record a unitless sample (e.g. a queue depth) into a histogram."""
+        if not self.enabled:
+            return
+        with self._lock:
+            pair = self._values.get(name)
+            if pair is None:
+                pair = self._values[name] = (Histogram(), Histogram())
+            pair[0].record(value)
+            pair[1].record(value)
+
+    def incr(self, name, n=1):
+        if not self.enabled:
+            return
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + n
+
+    def gauge(self, name, value):
+        if not self.enabled:
+            return
+        with self._lock:
+            self._gauges[name] = value
+
+    def queue_depth(self, name, q):
+        """Sample a queue's depth into both a gauge and a value histogram."""
+        if not self.enabled:
+            return
+        depth = q.qsize()
+        self.gauge(name, depth)
+        self.observe_value(name, depth)
+
+    # ── Snapshots ─────────────────────────────────────────────────────────────
+
+    def snapshot(self, reset=False):
+        """
+        Return a JSON-serialisable view of the registry.  With `reset`, the
+        histograms describe the window since the previous reset, which then
+        starts a new window; otherwise they are cumulative over the run.
+        Counters and gauges are always cumulative.
+        """
+        sample_rss(self)
+        now = time.time()
+        which = 1 if reset else 0
+        with self._lock:
+            snap = {
+                'timestamp':  now,
+                'window_s':   now - self._window_t0 if reset else None,
+                'timings_ms': {k: p[which].summary(1e-6) for k, p in self._timings.items()},
+                'values':     {k: p[which].summary() for k, p in self._values.items()},
+                'counters':   dict(self._counters),
+                'gauges':     dict(self._gauges),
+            }
+            if reset:
+                for p in self._timings.values():
+                    p[1].reset()
+                for p in self._values.values():
+                    p[1].reset()
+                self._window_t0 = now
+        return snap
+
+    def prometheus_text(self):
+        """Render the cumulative registry in Prometheus text exposition format."""
+        snap = self.snapshot(reset=False)
+        lines = []
+
+        def metric(name):
+            return 'qs_' + name.replace('.', '_').replace('-', '_')
+
+        for name, s in sorted(snap['timings_ms'].items()):
+            m = metric(name) + '_ms'
+            lines.append(f'# TYPE {m} summary')
+            for q in ('p50', 'p90', 'p99'):
+                if q in s:
+                    lines.append(f'{m}{{quantile="0.{q[1:]}"}} {s[q]}')
+            lines.append(f'{m}_count {s["count"]}')
+            if s['count']:
+                lines.append(f'{m}_sum {s["mean"] * s["count"]}')
+        for name, s in sorted(snap['values'].items()):
+            m = metric(name) + '_dist'
+            lines.append(f'# TYPE {m} summary')
+            for q in ('p50', 'p90', 'p99'):
+                if q in s:
+                    lines.append(f'{m}{{quantile="0.{q[1:]}"}} {s[q]}')
+            lines.append(f'{m}_count {s["count"]}')
+        for name, v in sorted(snap['counters'].items()):
+            m = metric(name) + '_total'
+            lines.append(f'# TYPE {m} counter')
+            lines.append(f'{m} {v}')
+        for name, v in sorted(snap['gauges'].items()):
+            m = metric(name)
+            lines.append(f'# TYPE {m} gauge')
+            lines.append(f'{m} {v}')
+        return '\n'.join(lines) + '\n'
+
+
+METRICS = Metrics(enabled=False)
+
+
+def sample_rss(metrics=METRICS):
+    """Record the process resident set size (MB) as gauge `proc.rss_mb`."""
+    if not metrics.enabled:
+        return
+    rss = None
+    if psutil is not None:
+        try:
+            rss = psutil.Process(os.getpid()).memory_info().rss
+        except Exception:
+            rss = None
+    if rss is None:
+        try:
+            with open('/proc/self/statm', 'r') as fh:
+                rss = int(fh.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+        except (OSError, ValueError, IndexError, AttributeError):
+            return
+    metrics.gauge('proc.rss_mb', rss / (1024 ** 2))
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+#  Exporter
+# ──────────────────────────────────────────────────────────────────────────────
+
+class MetricsExporter():
+    """
+    Periodically exports METRICS.
+
+    jsonl_path : append one JSON snapshot per `interval` seconds (windowed)
+    http_port  : serve the cumulative registry at http://127.0.0.1:<port>/metrics
+    """
+
+    def __init__(self, metrics=METRICS, jsonl_path=None, http_port=None, interval=10.0):
+        self.metrics    = metrics
+        self.jsonl_path = jsonl_path
+        self.http_port  = http_port
+        self.interval   = interval
+        self._stop      = threading.Event()
+        self._thread    = None
+        self._server    = None
+
+    def start(self):
+        self.metrics.enabled = True
+
+        if self.http_port is not None:
+            # Deferred: http.server is a noticeable share of recorder start-up
+            from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+            metrics = self.metrics
+
+            class _Handler(BaseHTTPRequestHandler):
+                def do_GET(self):
+                    body = metrics.prometheus_text().encode('utf-8')
+                    self.send_response(200)
+                    self.send_header('Content-Type', 'text/plain; version=0.0.4')
+                    self.send_header('Content-Length', str(len(body)))
+                    self.end_headers()
+                    self.wfile.write(body)
+
+                def log_message(self, *args):
+                    pass
+
+            self._server = ThreadingHTTPServer(('127.0.0.1', self.http_port), _Handler)
+            threading.Thread(target=self._server.serve_forever,
+                             name='MetricsHTTP', daemon=True).start()
+            print(f"[Metrics] Serving Prometheus text at "
+                  f"http://127.0.0.1:{self.http_port}/metrics")
+
+        if self.jsonl_path is not None:
+            self._thread = threading.Thread(target=self._jsonl_loop,
+                                            name='MetricsExport', daemon=True)
+            self._thread.start()
+            print(f"[Metrics] Writing {self.interval:g} s snapshots to {self.jsonl_path}")
+        return self
+
+    def _write_snapshot(self):
+        snap = self.metrics.snapshot(reset=True)
+        with open(self.jsonl_path, 'a') as fh:
+            fh.write(json.dumps(snap) + '\n')
+
+    def _jsonl_loop(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self._write_snapshot()
+            except Exception as e:
+                print(f"[Metrics ERROR] Export failed: {e}")
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=2)
+            try:
+                self._write_snapshot()     # final partial window
+            except Exception as e:
+                print(f"[Metrics ERROR] Final export failed: {e}")
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+
+
+def add_metrics_args(parser):
+    """Register the shared metrics command-line options on an argparse parser."""
+    parser.add_argument('-metrics', type=str, default=None,
+                        help='Append periodic metrics snapshots (JSON lines) to this file')
+    parser.add_argument('-metrics_port', type=int, default=None,
+                        help='Serve Prometheus-text metrics on this local port')
+    parser.add_argument('-metrics_interval', type=float, default=10.0,
+                        help='Seconds between metrics snapshots')
+
+
+def exporter_from_args(args):
+    """Build (but do not start) an exporter from parsed args, or None if disabled."""
+    jsonl = getattr(args, 'metrics', None)
+    port  = getattr(args, 'metrics_port', None)
+    if jsonl is None and port is None:
+        return None
+    return MetricsExporter(METRICS, jsonl_path=jsonl, http_port=port,
+                           interval=getattr(args, 'metrics_interval', 10.0))
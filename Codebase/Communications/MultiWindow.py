@@ -0,0 +1,348 @@
+"""
+MultiWindow.py  –  Frequency-Hopping Multi-Window Recorder
+==========================================================
+Cycles the spectrum analyzer through a list of frequency windows so several
+lines (or line + baseline windows) are watched in one run:
+
+    {"windows": [
+        {"name": "line_A",   "center_frequency": 2.45e9, "span": 5e6,  "num_points": 401, "dwell": 2.0},
+        {"name": "baseline", "center_frequency": 2.40e9, "span": 5e6,  "num_points": 401, "dwell": 1.0},
+        {"name": "line_B",   "center_frequency": 2.52e9, "span": 2e6,  "num_points": 201, "dwell": 2.0,
+         "RBW": 1e4}
+    ]}
+
+Besides name and dwell (seconds per visit) a window may override any key of
+the spectrum_analyzer.visa config block.
+
+Setup (once):
+  * every window is applied with the verified SpectrumAnalyzer.apply_settings()
+    and its spectral axis and instrument data are read back and kept, so no
+    axis query or readback is needed while hopping;
+  * the visiting order is chosen greedily so consecutive windows differ in
+    as few settings as possible (--keep_order disables this).
+
+Hopping (every visit):
+  * SpectrumAnalyzer.hop() sends only the settings that differ from the
+    current window, as one concatenated SCPI message with a single *OPC?;
+  * sweeps run back-to-back until the dwell time is used up;
+  * every sweep goes to the window's own dataset
+    (HSReader_<timestamp>_<window>.csv, optional binary sidecar).
+
+The reconfiguration time of every hop is measured (METRICS 'hop.reconfig')
+and reported per window together with the duty cycle (time spent sweeping
+over wall time), so hop overhead is visible rather than silently eating the
+observing time.
+"""
+
+from Instrumentation import METRICS, add_metrics_args, exporter_from_args
+from AcquisitionEngine import (open_instruments, close_instruments, prompt_run_metadata,
+                               build_fields, build_header, write_csv_header)
+from Sinks import CSVSink, BinarySink
+
+import os
+import re
+import time
+import json
+import argparse
+import threading
+
+
+WINDOW_KEYS = {'name', 'dwell'}
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+#  Windows
+# ──────────────────────────────────────────────────────────────────────────────
+
+def load_windows(path):
+    """Read a window list ({"windows": [...]} or a bare list) and validate it."""
+    with open(path, 'r') as fh:
+        data = json.load(fh)
+    windows = data['windows'] if isinstance(data, dict) else data
+    if not windows:
+        raise ValueError("Window list is empty")
+
+    names = set()
+    for i, w in enumerate(windows):
+        w.setdefault('name', f'win{i + 1:02d}')
+        if w['name'] in names:
+            raise ValueError(f"Duplicate window name {w['name']!r}")
+        names.add(w['name'])
+        if float(w.get('dwell', 0)) <= 0:
+            raise ValueError(f"Window {w['name']!r}: a positive 'dwell' in seconds is required")
+        w['dwell'] = float(w['dwell'])
+    return windows
+
+
+def window_settings(window):
+    """The visa overrides of a window (everything except name / dwell)."""
+    return {k: v for k, v in window.items() if k not in WINDOW_KEYS}
+
+
+def order_windows(windows):
+    """
+    Greedy nearest-neighbour visiting order that minimises the number of
+    settings changed per hop (the cycle wraps back to the first window).
+    """
+    remaining = list(windows[1:])
+    ordered = [windows[0]]
+    while remaining:
+        cur = window_settings(ordered[-1])
+        nxt = min(remaining, key=lambda w: sum(
+            1 for k, v in window_settings(w).items() if cur.get(k) != v))
+        ordered.append(nxt)
+        remaining.remove(nxt)
+    return ordered
+
+
+class WindowStats():
+    """Per-window hop and duty-cycle bookkeeping."""
+
+    def __init__(self):
+        self.visits    = 0
+        self.sweeps    = 0
+        self.hop_ms    = 0.0
+        self.hop_max   = 0.0
+        self.sweep_s   = 0.0
+        self.visit_s   = 0.0
+
+    def summary(self):
+        return {
+            'visits':       self.visits,
+            'sweeps':       self.sweeps,
+            'mean_hop_ms':  self.hop_ms / self.visits if self.visits else 0.0,
+            'max_hop_ms':   self.hop_max,
+            'duty_cycle':   self.sweep_s / self.visit_s if self.visit_s else 0.0,
+        }
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+#  Recorder
+# ──────────────────────────────────────────────────────────────────────────────
+
+class MultiWindowRecorder():
+
+    def __init__(self, config, windows, args):
+        self.config  = config
+        self.args    = args
+        self.verbose = args.verbose
+        self.logging_path = (os.path.join(os.path.curdir, 'ExperimentLogs')
+                             if args.logp is None else args.logp)
+        self.metrics_exporter = exporter_from_args(args)
+        self.stop_event = threading.Event()
+
+        self.spectrum_analyzer, self.pressure_sensor = open_instruments(
+            config, True, not args.nopressure, self._spectrum_cb, self._pressure_cb)
+        if self.spectrum_analyzer is None:
+            raise ConnectionError("Multi-window recording needs the spectrum analyzer")
+        self.pressure_enabled = self.pressure_sensor is not None
+
+        self.windows = windows if args.keep_order else order_windows(windows)
+        self.stats   = {w['name']: WindowStats() for w in self.windows}
+
+        # ── Verify every window once and precompute its axis ───────────────
+        sa = self.spectrum_analyzer
+        for w in self.windows:
+            print(f"[MultiWindow] Verifying window {w['name']}…")
+            sa.apply_settings(window_settings(w))
+            w['_axis'] = list(sa.get_spectral_axis())
+            w['_info'] = sa.get_instrument_data()
+            sweep = w['_info'].get('Sweep Time (ms)', 'Auto')
+            w['_sweep_ms'] = float(sweep) if sweep != 'Auto' else None
+
+        self.sinks = {w['name']: [] for w in self.windows}
+        if not args.nolog:
+            self._setup_logging()
+
+    # ── Logging / CSV setup ───────────────────────────────────────────────────
+
+    def _setup_logging(self):
+        os.makedirs(self.logging_path, exist_ok=True)
+        timestamp = time.strftime('%Y%m%d-%H%M%S', time.localtime())
+        meta = prompt_run_metadata()
+
+        for i, w in enumerate(self.windows):
+            safe_name = re.sub(r'[^\w.-]+', '_', w['name'])
+            path = os.path.join(self.logging_path, f'HSReader_{timestamp}_{safe_name}.csv')
+            fields, non_freq_fields = build_fields(w['_axis'], True, self.pressure_enabled)
+            header = build_header(
+                self.config, timestamp, meta, w['_info'],
+                logging_enabled  = True,
+                spectrum_enabled = True,
+                pressure_enabled = self.pressure_enabled,
+                interval         = 'N/A (hopping)',
+                run_label        = (f"window {w['name']} ({i + 1}/{len(self.windows)}), "
+                                    f"dwell {w['dwell']} s, hopping over "
+                                    f"{', '.join(x['name'] for x in self.windows)}"),
+            )
+            write_csv_header(path, header, fields)
+            w['_path'] = path
+            self.sinks[w['name']].append(CSVSink(path, non_freq_fields, flush_every=50))
+            if self.args.binary:
+                self.sinks[w['name']].append(BinarySink(path[:-4], w['_axis'], metadata=w['_info']))
+
+    # ── Main run ──────────────────────────────────────────────────────────────
+
+    def run(self, duration=None):
+        if self.metrics_exporter is not None:
+            self.metrics_exporter.start()
+        for sinks in self.sinks.values():
+            for sink in sinks:
+                sink.start()
+
+        sa = self.spectrum_analyzer
+        cycle_ct = {w['name']: 0 for w in self.windows}
+        t0 = time.monotonic()
+        print(f"\n[MultiWindow] Hopping over {len(self.windows)} windows: "
+              f"{' → '.join(w['name'] for w in self.windows)}.  Press Ctrl+C to stop.\n")
+        try:
+            while not self.stop_event.is_set():
+                for w in self.windows:
+                    if self.stop_event.is_set() or (duration is not None and time.monotonic() - t0 >= duration):
+                        self.stop_event.set()
+                        break
+                    self._visit(w, sa, cycle_ct, t0)
+        except KeyboardInterrupt:
+            print("\n[MultiWindow] Shutdown initiated...")
+        finally:
+            self._shutdown()
+
+    def _visit(self, w, sa, cycle_ct, t0):
+        stats = self.stats[w['name']]
+        t_visit = time.monotonic()
+
+        # ── Hop: diff-only reconfiguration ─────────────────────────────────
+        with METRICS.span('hop.reconfig'):
+            changed = sa.hop(window_settings(w), w['_axis'])
+        hop_ms = (time.monotonic() - t_visit) * 1000
+        stats.hop_ms += hop_ms
+        stats.hop_max = max(stats.hop_max, hop_ms)
+        if self.verbose:
+            print(f"[MultiWindow] → {w['name']}: {len(changed)} setting(s) in {hop_ms:.1f} ms")
+
+        # Pressure once per visit (fast serial)
+        p_res = None
+        if self.pressure_enabled:
+            try:
+                p_res = self.pressure_sensor.get_reading()
+            except Exception as e:
+                print(f"[ERROR] Pressure Sensor failed: {e}")
+
+        # ── Dwell: back-to-back sweeps into the window's dataset ───────────
+        t_end = t_visit + w['dwell']
+        n = 0
+        while not self.stop_event.is_set() and (n == 0 or time.monotonic() < t_end):
+            t_sweep = time.monotonic()
+            try:
+                s_res = sa.get_amplitudes()
+            except Exception as e:
+                print(f"[Spectrum Analyzer ERROR] {w['name']}: {e}")
+                break
+            t_done = time.monotonic()
+            n += 1
+            METRICS.incr(f"hop.{w['name']}.sweeps")
+
+            sweep_ms = w['_sweep_ms'] or (t_done - t_sweep) * 1000
+            record = {
+                'timestamp':     time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(s_res['Timestamp'])),
+                'wall_time':     s_res['Timestamp'],
+                'elapsed':       t_sweep - t0,
+                'cycle_ct':      cycle_ct[w['name']],
+                'cycle_time_ms': (t_done - t_sweep) * 1000,
+                'hw_wait_ms':    (t_done - t_sweep) * 1000,
+                'eff_int_pct':   min(100.0, 100.0 * sweep_ms / ((t_done - t_sweep) * 1000)),
+                'coadd_n':       None,
+                'pressure':      p_res['pressure'] if p_res else float('nan'),
+                'pressure_unit': p_res['unit'] if p_res else 'nan',
+                'amplitudes':    list(s_res['Amplitudes']),
+                'sumsq':         None,
+                'total_sweeps':  cycle_ct[w['name']] + 1,
+            }
+            cycle_ct[w['name']] += 1
+            for sink in self.sinks[w['name']]:
+                sink.submit(record)
+            stats.sweep_s += (w['_sweep_ms'] / 1000.0) if w['_sweep_ms'] else (t_done - t_sweep)
+
+        stats.visits += 1
+        stats.sweeps += n
+        stats.visit_s += time.monotonic() - t_visit
+
+    # ── Shutdown ──────────────────────────────────────────────────────────────
+
+    def report(self):
+        lines = [f"  {'Window':<16} {'Visits':>7} {'Sweeps':>8} {'Hop mean':>10} {'Hop max':>9} {'Duty':>7}"]
+        total_sweep = total_visit = 0.0
+        for w in self.windows:
+            st = self.stats[w['name']]
+            s = st.summary()
+            total_sweep += st.sweep_s
+            total_visit += st.visit_s
+            lines.append(f"  {w['name']:<16} {s['visits']:>7d} {s['sweeps']:>8d} "
+                         f"{s['mean_hop_ms']:>8.1f}ms {s['max_hop_ms']:>7.1f}ms {s['duty_cycle'] * 100:>6.1f}%")
+        if total_visit:
+            lines.append(f"  Overall duty cycle: {100 * total_sweep / total_visit:.1f}%")
+        return '\n'.join(lines)
+
+    def _shutdown(self):
+        for sinks in self.sinks.values():
+            for sink in sinks:
+                sink.stop()
+        print("[MultiWindow] Hop statistics:")
+        print(self.report())
+
+        # Leave the analyzer in its configured single-window state
+        try:
+            self.spectrum_analyzer.apply_settings()
+        except Exception as e:
+            print(f"[WARN] Could not restore analyzer settings: {e}")
+        close_instruments(self.spectrum_analyzer, self.pressure_sensor)
+        if self.metrics_exporter is not None:
+            self.metrics_exporter.stop()
+        print("[MultiWindow] Shutdown complete.")
+
+    # ── Instrument callbacks ──────────────────────────────────────────────────
+
+    def _pressure_cb(self, log_type, message):
+        if log_type == 'error':
+            print(f"[Pressure Sensor ERROR] {message}")
+        elif log_type == 'message' and self.verbose:
+            print(f"[Pressure Sensor] {message}")
+
+    def _spectrum_cb(self, log_type, message):
+        if log_type == 'error':
+            print(f"[Spectrum Analyzer ERROR] {message}")
+        elif log_type == 'message' and self.verbose:
+            print(f"[Spectrum Analyzer] {message}")
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+#  Entry point
+# ──────────────────────────────────────────────────────────────────────────────
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Frequency-hopping multi-window recorder')
+    parser.add_argument('-windows', type=str, required=True, help='JSON window list')
+    parser.add_argument('-logp',    type=str, default=None, help='Logging folder path')
+    parser.add_argument('-config',  type=str, default=r'Codebase\Communications\Config_HS.json',
+                        help='Path to configuration file')
+    parser.add_argument('-duration', type=float, default=None, help='Stop after this many seconds')
+    parser.add_argument('--nolog',      default=False, action='store_true', help='Disable CSV logging')
+    parser.add_argument('--nopressure', default=False, action='store_true', help='Disable pressure sensor')
+    parser.add_argument('--binary',     default=False, action='store_true',
+                        help='Also write a raw float32 binary dataset per window')
+    parser.add_argument('--keep_order', default=False, action='store_true',
+                        help='Visit windows in file order instead of the fewest-changes order')
+    parser.add_argument('--verbose',    default=False, action='store_true',
+                        help='Print every hop and instrument messages')
+    add_metrics_args(parser)
+    args = parser.parse_args()
+
+    try:
+        with open(args.config, 'r') as fh:
+            config = json.load(fh)
+        windows = load_windows(args.windows)
+    except Exception as e:
+        print(f"FATAL: {e}")
+        raise SystemExit(1)
+
+    MultiWindowRecorder(config, windows, args).run(duration=args.duration)
@@ -1,6 +1,9 @@
 import serial
 import time
 
+from Instrumentation import METRICS
+from Recovery import retry_with_backoff
+
 class PressureSensor():
 
     def __init__(self, config, callback):
@@ -40,6 +43,30 @@ class PressureSensor():
         except serial.SerialException as e:
             raise ConnectionError(f"Failed to open serial port: {e}")
 
+    def reconnect(self, stop_event=None, base_delay=0.5, max_delay=30.0, max_attempts=None):
+        """
+        Close and reopen the serial port with exponential backoff (e.g. after
+        the USB adapter re-enumerated).  Returns True once the gauge answers.
+        """
+        def attempt():
+            if self.ser.is_open:
+                try:
+                    self.ser.close()
+                except serial.SerialException:
+                    pass
+            self.connect()
+            if self.read_value('pressure') is None:
+                self.ser.close()
+                raise ConnectionError("Gauge did not answer after reopening the port")
+
+        attempts = retry_with_backoff(attempt, 'PG', log=lambda m: self.log('error', m),
+                                      stop_event=stop_event, base_delay=base_delay,
+                                      max_delay=max_delay, max_attempts=max_attempts)
+        if attempts:
+            METRICS.incr('pg.reconnects')
+            self.log('message', f'Pressure Sensor reconnected after {attempts} attempt(s).')
+        return bool(attempts)
+
     def disconnect(self):
         """Closes the serial port connection."""
         if self.ser.is_open:
@@ -67,12 +94,14 @@ class PressureSensor():
             # self.ser.flushOutput()
             
             command_bytes = full_command.encode('ascii')
-            self.ser.write(command_bytes)
-            
-            response_bytes = self.ser.read_until(self.terminator.encode('ascii'))
+            with METRICS.span('pg.serial_rtt'):
+                self.ser.write(command_bytes)
+                response_bytes = self.ser.read_until(self.terminator.encode('ascii'))
+            METRICS.incr('pg.reads')
             
             return response_bytes.decode('ascii').strip() if response_bytes else None
         except serial.SerialException as e:
+            METRICS.incr('pg.errors')
             self.log("error", f"SERIAL COMMUNICATION ERROR: {e}")
             return None
 
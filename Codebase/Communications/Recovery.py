@@ -0,0 +1,59 @@
+"""
+Recovery.py  –  Reconnect With Exponential Backoff
+==================================================
+Shared retry loop used by SpectrumAnalyzer.reconnect() and
+PressureSensor.reconnect() after a USB/LAN hiccup kills their session or
+port.  The first attempt is made immediately, then the delay doubles from
+`base_delay` up to `max_delay`, so a short glitch costs well under a second
+while an unplugged cable does not hammer the bus.
+
+The supervision policy (when an instrument counts as dead, gap markers in
+the log) lives in AcquisitionEngine.
+"""
+
+import time
+
+
+def backoff_delays(base_delay=0.5, max_delay=30.0, factor=2.0):
+    """Infinite sequence of waits: 0, base, base·f, base·f², … capped at max."""
+    yield 0.0
+    delay = base_delay
+    while True:
+        yield min(delay, max_delay)
+        delay *= factor
+
+
+def retry_with_backoff(attempt, label, log=print, stop_event=None,
+                       base_delay=0.5, max_delay=30.0, max_attempts=None):
+    """
+    Call `attempt()` until it returns without raising.
+
+    Args:
+        attempt (callable): Opens/restores the connection; raises on failure.
+        label (str): Instrument name for log messages.
+        log (callable): Receives one message string per failed attempt.
+        stop_event (threading.Event): Abort the retries once set.
+        base_delay, max_delay (float): Backoff bounds in seconds.
+        max_attempts (int): Give up after this many attempts (None = forever).
+
+    Returns:
+        int: Attempts used, or 0 if stopped / attempts exhausted.
+    """
+    for n, delay in enumerate(backoff_delays(base_delay, max_delay), start=1):
+        if delay:
+            if stop_event is not None:
+                if stop_event.wait(delay):
+                    return 0
+            else:
+                time.sleep(delay)
+        elif stop_event is not None and stop_event.is_set():
+            return 0
+
+        try:
+            attempt()
+            return n
+        except Exception as e:
+            log(f"[{label}] Reconnect attempt {n} failed: {e}")
+
+        if max_attempts is not None and n >= max_attempts:
+            return 0
@@ -0,0 +1,376 @@
+"""
+RunSequencer.py  –  Unattended Back-to-Back Recordings
+======================================================
+Runs a list of recordings from a run plan instead of one interactive session
+per run.  The instruments are opened once: every run reuses the same VISA
+session and serial port, and between runs the spectrum analyzer only receives
+the settings that actually differ from the previous run
+(SpectrumAnalyzer.apply_settings), so a night of short runs is not dominated
+by instrument initialisation and settling sweeps.
+
+Run plan (JSON, or YAML when PyYAML is installed):
+
+    {
+      "pause": 5,                               # seconds between runs
+      "defaults": {
+        "duration": 600,                        # seconds, required per run
+        "metadata": {"gas": "CO", "input_gain": "20"},
+        "spectrum_analyzer": {"sweep_time": 100},
+        "program": {"reading_interval": 0.5}
+      },
+      "runs": [
+        {"name": "baseline", "duration": 300,
+         "metadata": {"description": "empty cell"}},
+        {"name": "co_50ppm",
+         "metadata": {"init_CO_conc": "50", "description": "50 ppm CO"},
+         "spectrum_analyzer": {"span": 5e6, "num_points": 801}}
+      ]
+    }
+
+Each run entry is merged over "defaults" (per section).  "metadata" replaces
+the interactive prompts (gas, init_CO_conc, init_ml, gas_correction,
+input_gain, description).  "spectrum_analyzer" overrides keys of the
+spectrum_analyzer.visa config block and "program" overrides keys of the
+program block (reading_interval, coadd, tick_policy, max_catchup_ticks).
+Pressure gauge serial settings cannot change between runs because the port
+stays open for the whole sequence.
+
+Every run writes its own HSReader_<timestamp>_<name>.csv; a sequence
+manifest (Sequence_<timestamp>.json) lists the files, settings written and
+setup time of every run.
+"""
+
+from Instrumentation import add_metrics_args, exporter_from_args
+from AcquisitionEngine import (AcquisitionEngine, open_instruments, close_instruments,
+                               build_fields, build_header, write_csv_header,
+                               optional_sinks_from_args)
+from Sinks import CSVSink, add_sink_args
+
+import os
+import re
+import copy
+import time
+import json
+import argparse
+
+try:
+    import yaml
+except ImportError:
+    yaml = None
+
+
+RUN_KEYS      = {'name', 'duration', 'metadata', 'spectrum_analyzer', 'program'}
+METADATA_KEYS = {'gas', 'init_CO_conc', 'init_ml', 'gas_correction', 'input_gain', 'description'}
+PROGRAM_KEYS  = {'reading_interval', 'coadd', 'tick_policy', 'max_catchup_ticks'}
+# Opening the instrument is not a setting that can be diffed between runs
+FIXED_VISA_KEYS = {'resource_string', 'visa_backend', 'timeout'}
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+#  Run plan
+# ──────────────────────────────────────────────────────────────────────────────
+
+def load_run_plan(path):
+    """Read and validate a run plan file, returning a list of resolved runs."""
+    with open(path, 'r') as fh:
+        if path.lower().endswith(('.yaml', '.yml')):
+            if yaml is None:
+                raise ImportError("PyYAML is required for YAML run plans (pip install pyyaml)")
+            plan = yaml.safe_load(fh)
+        else:
+            plan = json.load(fh)
+    return resolve_run_plan(plan), float(plan.get('pause', 0))
+
+
+def resolve_run_plan(plan):
+    """
+    Merge every run over the plan defaults and validate it, so a bad entry
+    fails before any instrument is opened rather than halfway through a night.
+    """
+    if not isinstance(plan, dict) or not plan.get('runs'):
+        raise ValueError("Run plan must be a mapping with a non-empty 'runs' list")
+
+    defaults = plan.get('defaults', {})
+    runs = []
+    for i, entry in enumerate(plan['runs']):
+        unknown = set(entry) - RUN_KEYS
+        if unknown:
+            raise ValueError(f"Run {i}: unknown keys {sorted(unknown)} (expected {sorted(RUN_KEYS)})")
+
+        run = {
+            'name':              str(entry.get('name', f'run{i + 1:02d}')),
+            'duration':          entry.get('duration', defaults.get('duration')),
+            'metadata':          {**defaults.get('metadata', {}), **entry.get('metadata', {})},
+            'spectrum_analyzer': {**defaults.get('spectrum_analyzer', {}), **entry.get('spectrum_analyzer', {})},
+            'program':           {**defaults.get('program', {}), **entry.get('program', {})},
+        }
+
+        if run['duration'] is None or float(run['duration']) <= 0:
+            raise ValueError(f"Run {i} ({run['name']}): a positive 'duration' in seconds is required")
+        run['duration'] = float(run['duration'])
+
+        for section, allowed in (('metadata', METADATA_KEYS), ('program', PROGRAM_KEYS)):
+            unknown = set(run[section]) - allowed
+            if unknown:
+                raise ValueError(f"Run {i} ({run['name']}): unknown {section} keys {sorted(unknown)}")
+        fixed = set(run['spectrum_analyzer']) & FIXED_VISA_KEYS
+        if fixed:
+            raise ValueError(f"Run {i} ({run['name']}): {sorted(fixed)} cannot change within a sequence")
+
+        runs.append(run)
+    return runs
+
+
+def metadata_from_plan(values):
+    """Build the run metadata dict that prompt_run_metadata() would return."""
+    gas = str(values.get('gas', '')).lower()
+    meta = {
+        'init_CO_conc':   'N/A',
+        'init_ml':        'N/A',
+        'gas_correction': None,
+        'input_gain':     str(values.get('input_gain', '')),
+        'description':    str(values.get('description', '')),
+    }
+    if gas.startswith('c') or 'init_CO_conc' in values:
+        meta['init_CO_conc'] = str(values.get('init_CO_conc', ''))
+    if gas.startswith('a') or 'init_ml' in values:
+        meta['init_ml'] = str(values.get('init_ml', ''))
+    if values.get('gas_correction') not in (None, ''):
+        meta['gas_correction'] = float(values['gas_correction'])
+    return meta
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+#  Sequencer
+# ──────────────────────────────────────────────────────────────────────────────
+
+class RunSequencer():
+
+    def __init__(self, config, runs, args, pause=0.0):
+        """
+        Args:
+            config (dict): Base configuration, as for StartCommunicationMinimal.
+            runs (list): Resolved runs from load_run_plan().
+            args (Namespace): Parsed CLI arguments (instrument / sink flags).
+            pause (float): Seconds to wait between runs.
+        """
+        self.config  = config
+        self.runs    = runs
+        self.args    = args
+        self.pause   = pause
+        self.verbose = args.verbose
+
+        self.logging_path = (os.path.join(os.path.curdir, 'ExperimentLogs')
+                             if args.logp is None else args.logp)
+        self.metrics_exporter = exporter_from_args(args)
+        self.engine  = None
+        self.results = []
+        self._aborted = False
+
+        # ── Instruments are opened once for the whole sequence ─────────────
+        self.spectrum_analyzer, self.pressure_sensor = open_instruments(
+            config, not args.nospectrum, not args.nopressure,
+            self._spectrum_cb, self._pressure_cb)
+        self.spectrum_enabled = self.spectrum_analyzer is not None
+        self.pressure_enabled = self.pressure_sensor is not None
+
+    # ── Main run ──────────────────────────────────────────────────────────────
+
+    def run(self):
+        os.makedirs(self.logging_path, exist_ok=True)
+        seq_timestamp = time.strftime('%Y%m%d-%H%M%S', time.localtime())
+        manifest_path = os.path.join(self.logging_path, f'Sequence_{seq_timestamp}.json')
+
+        if self.metrics_exporter is not None:
+            self.metrics_exporter.start()
+
+        print(f"\n[Sequencer] {len(self.runs)} runs, "
+              f"{sum(r['duration'] for r in self.runs) / 60:.1f} min of recording.  "
+              f"Press Ctrl+C to abort.\n")
+        try:
+            for i, run in enumerate(self.runs):
+                if i and self.pause > 0:
+                    time.sleep(self.pause)
+                result = self._run_one(i, run)
+                self.results.append(result)
+                self._write_manifest(manifest_path, seq_timestamp)
+                if self._aborted:
+                    break
+        except KeyboardInterrupt:
+            print("\n[Sequencer] Sequence aborted.")
+        finally:
+            self._write_manifest(manifest_path, seq_timestamp)
+            self._shutdown()
+
+        return self.results
+
+    def _run_one(self, index, run):
+        label = f"{run['name']} ({index + 1}/{len(self.runs)})"
+        print(f"\n[Sequencer] ── Run {label}: {run['duration']:.0f} s ──")
+        t_setup = time.perf_counter()
+
+        # ── Per-run configuration ──────────────────────────────────────────
+        config = copy.deepcopy(self.config)
+        config['program'].update(run['program'])
+        config['spectrum_analyzer']['visa'].update(run['spectrum_analyzer'])
+        coadd = bool(getattr(self.args, 'coadd', False) or config['program'].get('coadd', False))
+
+        # ── Bring the analyzer to this run's settings (diff only) ──────────
+        written = {}
+        spec_header_info, spectral_axis, sweep_time_ms = {}, [], None
+        if self.spectrum_enabled:
+            written = self.spectrum_analyzer.apply_settings(run['spectrum_analyzer'])
+            spec_header_info = self.spectrum_analyzer.get_instrument_data()
+            spectral_axis = self.spectrum_analyzer.get_spectral_axis()
+            sweep_time_ms = float(spec_header_info.get(
+                'Sweep Time (ms)', config['spectrum_analyzer']['visa'].get('sweep_time', 100)))
+
+        # ── Sinks ──────────────────────────────────────────────────────────
+        meta = metadata_from_plan(run['metadata'])
+        sinks = []
+        log_file_path = None
+        if not self.args.nolog:
+            timestamp = time.strftime('%Y%m%d-%H%M%S', time.localtime())
+            safe_name = re.sub(r'[^\w.-]+', '_', run['name'])
+            log_file_path = os.path.join(self.logging_path, f'HSReader_{timestamp}_{safe_name}.csv')
+
+            fields, non_freq_fields = build_fields(
+                spectral_axis, self.spectrum_enabled, self.pressure_enabled, coadd=coadd)
+            header = build_header(
+                config, timestamp, meta, spec_header_info,
+                logging_enabled  = True,
+                spectrum_enabled = self.spectrum_enabled,
+                pressure_enabled = self.pressure_enabled,
+                interval         = config['program'].get('reading_interval', 1.0),
+                coadd            = coadd,
+                run_label        = label,
+            )
+            write_csv_header(log_file_path, header, fields)
+            sinks.append(CSVSink(log_file_path, non_freq_fields, flush_every=50))
+
+        center = spec_header_info.get('Center Frequency (Hz)')
+        sinks.extend(optional_sinks_from_args(
+            self.args,
+            log_file_path[:-4] if log_file_path else None,
+            spectral_axis,
+            float(center) if center is not None else None,
+            metadata=spec_header_info,
+        ))
+
+        self.engine = AcquisitionEngine(
+            config,
+            spectrum_analyzer  = self.spectrum_analyzer,
+            pressure_sensor    = self.pressure_sensor,
+            sinks              = sinks,
+            coadd              = coadd,
+            spec_sweep_time_ms = sweep_time_ms,
+            gas_correction     = meta['gas_correction'],
+        )
+        setup_ms = (time.perf_counter() - t_setup) * 1000
+        print(f"[Sequencer] Setup {setup_ms:.0f} ms, "
+              f"{len(written)} analyzer setting(s) written: "
+              f"{', '.join(written) if written else 'none'}")
+
+        # ── Record ─────────────────────────────────────────────────────────
+        t_start = time.time()
+        try:
+            cycles = self.engine.run(duration=run['duration'])
+        except KeyboardInterrupt:
+            # engine.run() has already drained and closed this run's sinks
+            self._aborted = True
+            cycles = None
+            print(f"\n[Sequencer] Run {label} interrupted.")
+
+        return {
+            'name':             run['name'],
+            'file':             log_file_path,
+            'started':          time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(t_start)),
+            'duration_s':       time.time() - t_start,
+            'cycles':           cycles,
+            'setup_ms':         setup_ms,
+            'settings_written': written,
+            'metadata':         run['metadata'],
+            'completed':        not self._aborted,
+        }
+
+    def _write_manifest(self, path, seq_timestamp):
+        with open(path, 'w') as fh:
+            json.dump({'sequence': seq_timestamp, 'runs': self.results}, fh, indent=2, default=str)
+
+    # ── Shutdown ──────────────────────────────────────────────────────────────
+
+    def _shutdown(self):
+        print("[Sequencer] Closing instruments…")
+        close_instruments(self.spectrum_analyzer, self.pressure_sensor)
+
+        if self.metrics_exporter is not None:
+            self.metrics_exporter.stop()
+
+        done = sum(1 for r in self.results if r['completed'])
+        print(f"[Sequencer] {done}/{len(self.runs)} runs completed.")
+
+    # ── Instrument callbacks ──────────────────────────────────────────────────
+
+    def _pressure_cb(self, log_type, message):
+        if log_type == 'error':
+            print(f"[Pressure Sensor ERROR] {message}")
+        elif log_type == 'message' and self.verbose:
+            print(f"[Pressure Sensor] {message}")
+
+    def _spectrum_cb(self, log_type, message):
+        if log_type == 'error':
+            print(f"[Spectrum Analyzer ERROR] {message}")
+        elif log_type == 'message' and self.verbose:
+            print(f"[Spectrum Analyzer] {message}")
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+#  Entry point
+# ──────────────────────────────────────────────────────────────────────────────
+
+def load_config(path):
+    with open(path, 'r') as fh:
+        return json.load(fh)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Run a plan of back-to-back recordings over one instrument session')
+    parser.add_argument('-plan',   type=str, required=True,
+                        help='Run plan (.json, or .yaml/.yml with PyYAML installed)')
+    parser.add_argument('-logp',   type=str, default=None,
+                        help='Logging folder path')
+    parser.add_argument('-config', type=str,
+                        default=r'Codebase\Communications\Config_HS.json',
+                        help='Path to configuration file')
+    parser.add_argument('--nolog',      default=False, action='store_true',
+                        help='Disable CSV logging')
+    parser.add_argument('--nospectrum', default=False, action='store_true',
+                        help='Disable spectrum analyzer')
+    parser.add_argument('--nopressure', default=False, action='store_true',
+                        help='Disable pressure sensor')
+    parser.add_argument('--verbose',    default=False, action='store_true',
+                        help='Print informational messages from instruments')
+    parser.add_argument('--coadd',      default=False, action='store_true',
+                        help='Drain and co-add every sweep that arrived each tick into one row')
+    parser.add_argument('--dry_run',    default=False, action='store_true',
+                        help='Validate and print the run plan without opening instruments')
+    add_sink_args(parser)
+    add_metrics_args(parser)
+
+    args = parser.parse_args()
+
+    try:
+        config = load_config(args.config)
+        runs, pause = load_run_plan(args.plan)
+    except Exception as e:
+        print(f"FATAL: {e}")
+        raise SystemExit(1)
+
+    if args.dry_run:
+        for i, run in enumerate(runs):
+            print(f"{i + 1:>3}. {run['name']:<20} {run['duration']:>8.0f} s  "
+                  f"SA {run['spectrum_analyzer'] or '-'}  program {run['program'] or '-'}")
+        raise SystemExit(0)
+
+    RunSequencer(config, runs, args, pause=pause).run()
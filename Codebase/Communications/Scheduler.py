@@ -0,0 +1,176 @@
+"""
+Scheduler.py  –  Drift-Free Deadline Scheduler for the Measurement Loop
+=======================================================================
+The coordinator loops used to pace themselves with
+
+    time.sleep(max(0, interval - work_duration))
+
+against wall-clock time.time().  Every cycle's overshoot (sleep granularity,
+OS scheduling, a slow pressure read) was added to the next one, so the cadence
+drifted over a run, and an NTP step of the wall clock showed up directly in
+the cycle times.
+
+DeadlineScheduler instead locks onto an absolute tick grid on the monotonic
+clock:
+
+    tick k is due at  t0 + k * interval
+
+A late cycle never shifts the grid.  What happens to ticks that were missed
+entirely is chosen by policy:
+
+    'skip'     drop missed ticks and resume on the next grid point (default,
+               keeps the cadence and one row per tick)
+    'catchup'  run missed ticks back-to-back until the loop is on time again,
+               bounded by `max_catchup` ticks, beyond which it skips
+
+Jitter (wake-up time minus due time) and skipped ticks are tracked for the
+end-of-run report and recorded into METRICS.
+
+An interval of 0 (reading_interval: 0 in the config) is free-run, as it was
+with the old sleep: every tick is due immediately and wait() only checks for
+a stop request.
+"""
+
+import math
+import time
+
+from Instrumentation import METRICS
+
+
+POLICIES = ('skip', 'catchup')
+
+
+class JitterStats():
+    """Running jitter statistics (Welford) in milliseconds."""
+
+    def __init__(self):
+        self.count   = 0
+        self.mean    = 0.0
+        self._m2     = 0.0
+        self.max     = 0.0
+        self.late    = 0
+        self.skipped = 0
+
+    def add(self, jitter_ms, late_threshold_ms):
+        self.count += 1
+        delta = jitter_ms - self.mean
+        self.mean += delta / self.count
+        self._m2  += delta * (jitter_ms - self.mean)
+        if jitter_ms > self.max:
+            self.max = jitter_ms
+        if jitter_ms > late_threshold_ms:
+            self.late += 1
+
+    @property
+    def std(self):
+        return math.sqrt(self._m2 / (self.count - 1)) if self.count > 1 else 0.0
+
+    def summary(self):
+        return {
+            'ticks':          self.count,
+            'mean_jitter_ms': self.mean,
+            'std_jitter_ms':  self.std,
+            'max_jitter_ms':  self.max,
+            'late_ticks':     self.late,
+            'skipped_ticks':  self.skipped,
+        }
+
+
+class DeadlineScheduler():
+
+    def __init__(self, interval, policy='skip', max_catchup=10, late_fraction=0.1):
+        """
+        Args:
+            interval (float): Tick period in seconds (0 = free-run, no waiting).
+            policy (str): 'skip' or 'catchup' (see module docstring).
+            max_catchup (int): Most ticks run back-to-back under 'catchup'.
+            late_fraction (float): A tick counts as late once its jitter
+                exceeds this fraction of the interval.
+        """
+        if interval < 0:
+            raise ValueError(f"Scheduler interval must be >= 0 (0 = free-run), got {interval}")
+        if policy not in POLICIES:
+            raise ValueError(f"Invalid scheduler policy: {policy!r} (expected one of {POLICIES})")
+
+        self.interval    = float(interval)
+        self.policy      = policy
+        self.max_catchup = int(max_catchup)
+        self.late_ms     = late_fraction * self.interval * 1000
+        self.stats       = JitterStats()
+        self.t0          = None
+        self.tick        = 0
+
+    def start(self, t0=None):
+        """Anchor the tick grid.  Tick 0 is due immediately."""
+        self.t0   = time.monotonic() if t0 is None else t0
+        self.tick = 0
+        return self.t0
+
+    def elapsed(self):
+        """Monotonic seconds since start() (immune to wall-clock steps)."""
+        return time.monotonic() - self.t0
+
+    def wait(self, stop_event=None):
+        """
+        Block until the next tick is due and return its index, or None if
+        `stop_event` was set while waiting.
+        """
+        if self.t0 is None:
+            self.start()
+
+        if self.interval == 0:
+            # Free-run: no grid to keep, nothing is ever late or skipped
+            if stop_event is not None and stop_event.is_set():
+                return None
+            self.stats.add(0.0, self.late_ms)
+            tick = self.tick
+            self.tick += 1
+            return tick
+
+        due = self.t0 + self.tick * self.interval
+        now = time.monotonic()
+
+        if now < due:
+            if stop_event is not None:
+                if stop_event.wait(due - now):
+                    return None
+            else:
+                time.sleep(due - now)
+            now = time.monotonic()
+
+        else:
+            behind = int((now - due) // self.interval)
+            if behind > 0 and (self.policy == 'skip' or behind > self.max_catchup):
+                # Jump to the most recent grid point that is already due
+                self.stats.skipped += behind
+                METRICS.incr('sched.skipped', behind)
+                self.tick += behind
+                due = self.t0 + self.tick * self.interval
+
+        jitter_ms = (now - due) * 1000
+        self.stats.add(jitter_ms, self.late_ms)
+        METRICS.observe_ms('sched.jitter', jitter_ms)
+
+        tick = self.tick
+        self.tick += 1
+        return tick
+
+    def report(self):
+        """One-line human readable jitter summary."""
+        s = self.stats.summary()
+        if self.interval == 0:
+            return f"{s['ticks']} ticks, free-run (reading_interval 0)"
+        return (f"{s['ticks']} ticks @ {self.interval * 1000:.1f} ms ({self.policy}): "
+                f"jitter mean {s['mean_jitter_ms']:.2f} ms, "
+                f"std {s['std_jitter_ms']:.2f} ms, max {s['max_jitter_ms']:.2f} ms, "
+                f"late {s['late_ticks']}, skipped {s['skipped_ticks']}")
+
+
+def scheduler_from_config(config):
+    """Build a DeadlineScheduler from the 'program' block of a config dict."""
+    program = config['program']
+    return DeadlineScheduler(
+        interval    = program.get('reading_interval', 1.0),
+        policy      = program.get('tick_policy', 'skip'),
+        max_catchup = program.get('max_catchup_ticks', 10),
+    )
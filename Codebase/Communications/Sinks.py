@@ -0,0 +1,432 @@
+"""
+Sinks.py  –  Pluggable Consumers for the Acquisition Engine
+===========================================================
+Every sink owns a queue and a consumer thread.  The engine's coordinator only
+ever calls `submit(record)`, which is a non-blocking queue put, so no sink
+(slow disk, a stalled GUI, a dead network client) can hold up acquisition.
+
+Record format (one per coordinator tick, built by AcquisitionEngine):
+
+    timestamp      ISO-8601 wall-clock time of the tick
+    wall_time      time.time() of the tick
+    elapsed        monotonic seconds since the start of the run
+    cycle_ct       tick counter
+    cycle_time_ms  time since the previous tick
+    hw_wait_ms     time the coordinator spent waiting on the instruments
+    eff_int_pct    effective integration (%)            (spectrum runs)
+    coadd_n        sweeps co-added into this row         (spectrum runs)
+    pressure       float, nan when absent
+    pressure_unit  str,  'nan' when absent
+    amplitudes     list of floats, or None when there was no sweep
+    sumsq          list of floats in co-add mode, else None
+    total_sweeps   sweeps integrated since the start of the run
+
+Sinks
+-----
+    CSVSink             HSReader/ExperimentLog CSV rows (header written by
+                        AcquisitionEngine.write_csv_header)
+    BinarySink          fixed-size float32 records + JSON sidecar, readable
+                        with np.fromfile / np.memmap
+    GUISink             throttled updates to VisualInterface.data_received
+    NetworkSink         newline-delimited JSON to any TCP client that connects
+    OnlineAnalysisSink  running mean spectrum, off-ROI noise and ROI SNR
+
+Lossless sinks (CSV, binary) use unbounded queues.  Live sinks (GUI, network,
+online analysis) use bounded queues and drop the record when full.
+"""
+
+import os
+import csv
+import json
+import time
+import socket
+import threading
+from queue import Queue, Empty, Full
+
+import numpy as np
+
+from Instrumentation import METRICS
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+#  Base class
+# ──────────────────────────────────────────────────────────────────────────────
+
+class Sink():
+
+    name     = 'sink'
+    lossless = True     # False → bounded queue, records dropped when full
+    maxsize  = 64       # queue bound for lossy sinks
+
+    def __init__(self):
+        self._queue  = Queue() if self.lossless else Queue(maxsize=self.maxsize)
+        self._stop   = threading.Event()
+        self._thread = None
+        self.dropped = 0
+
+    # ── Lifecycle ─────────────────────────────────────────────────────────────
+
+    def start(self):
+        self.open()
+        self._thread = threading.Thread(target=self._consume,
+                                        name=f'Sink-{self.name}', daemon=True)
+        self._thread.start()
+        return self
+
+    def submit(self, record):
+        """Hand a record to the sink (never blocks the caller)."""
+        try:
+            self._queue.put_nowait(record)
+        except Full:
+            self.dropped += 1
+            METRICS.incr(f'sink.{self.name}.dropped')
+
+    def stop(self, timeout=10):
+        """Drain the queue, close the sink and join its thread."""
+        self._stop.set()
+        if self._thread is not None and self._thread.is_alive():
+            self._thread.join(timeout=timeout)
+
+    def _consume(self):
+        try:
+            while not self._stop.is_set() or not self._queue.empty():
+                try:
+                    record = self._queue.get(timeout=0.5)
+                except Empty:
+                    continue
+                try:
+                    with METRICS.span(f'sink.{self.name}.handle'):
+                        self.handle(record)
+                except Exception as e:
+                    METRICS.incr(f'sink.{self.name}.errors')
+                    print(f"[{self.name} Sink ERROR] {e}")
+                finally:
+                    self._queue.task_done()
+        finally:
+            self.close()
+
+    # ── Hooks ─────────────────────────────────────────────────────────────────
+
+    def open(self):
+        pass
+
+    def handle(self, record):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+    def mark_gap(self, message):
+        """
+        Called by the engine when acquisition was interrupted and resumed.
+        Lossless sinks record a marker; the default ignores it.
+        """
+        pass
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+#  CSV
+# ──────────────────────────────────────────────────────────────────────────────
+
+class CSVSink(Sink):
+    """
+    Appends one row per record to a CSV whose header (comment block + column
+    row) has already been written.  Flushes + fsyncs every `flush_every` rows
+    so a crash leaves valid data.
+    """
+
+    name = 'csv'
+
+    def __init__(self, file_path, non_freq_fields, flush_every=50):
+        super().__init__()
+        self.file_path       = file_path
+        self.non_freq_fields = non_freq_fields
+        self.flush_every     = flush_every
+        self._rows           = 0
+
+    def open(self):
+        self._fh     = open(self.file_path, mode='a', newline='')
+        self._writer = csv.writer(self._fh)
+
+    def handle(self, record):
+        if record.get('_gap') is not None:
+            self._fh.write(f"# GAP {record['timestamp']}: {record['_gap']}\n")
+            self._fh.flush()
+            return
+
+        data_map = {
+            'Timestamp':                    record['timestamp'],
+            'Elapsed Time (s)':             record['elapsed'],
+            'Cycle Count':                  record['cycle_ct'],
+            'Absolute Cycle Time (ms)':     record['cycle_time_ms'],
+            'Instrumental Cycle Time (ms)': record['hw_wait_ms'],
+            'Effective Integration (%)':    record['eff_int_pct'],
+            'Coadd Count':                  record['coadd_n'],
+            'Pressure':                     record['pressure'],        # float('nan') when absent
+            'Pressure_Unit':                record['pressure_unit'],   # 'nan' when absent
+        }
+        row = [data_map.get(f, '') for f in self.non_freq_fields]
+
+        # Append amplitude columns (may be empty if spectrum failed)
+        row.extend(record['amplitudes'] or [])
+        row.extend(record['sumsq'] or [])
+
+        with METRICS.span('writer.write'):
+            self._writer.writerow(row)
+        self._rows += 1
+        METRICS.incr('writer.rows')
+
+        if self._rows % self.flush_every == 0:
+            with METRICS.span('writer.fsync'):
+                self._fh.flush()
+                os.fsync(self._fh.fileno())
+
+    def mark_gap(self, message):
+        self.submit({'_gap': message,
+                     'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime())})
+
+    def close(self):
+        # Final flush on exit
+        self._fh.flush()
+        os.fsync(self._fh.fileno())
+        self._fh.close()
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+#  Binary
+# ──────────────────────────────────────────────────────────────────────────────
+
+class BinarySink(Sink):
+    """
+    Fixed-size little-endian records appended to `<base>.bin`:
+
+        wall_time f8 | elapsed f8 | cycle i8 | eff_int f8 | pressure f8 |
+        coadd_n i4 | amplitudes f4[N]
+
+    plus a `<base>.json` sidecar holding the numpy dtype description, the
+    spectral axis and the run metadata, so a run can be opened with
+
+        np.memmap(base + '.bin', dtype=np.dtype(..from sidecar..), mode='r')
+
+    Formatting cost is a single tobytes() per record instead of N float→str
+    conversions, and the file is ~4 bytes per point instead of ~20.
+    """
+
+    name = 'binary'
+
+    def __init__(self, base_path, spectral_axis, metadata=None, flush_every=50):
+        super().__init__()
+        self.base_path     = base_path
+        self.spectral_axis = list(spectral_axis)
+        self.metadata      = metadata or {}
+        self.flush_every   = flush_every
+        self.dtype = np.dtype([
+            ('wall_time', '<f8'),
+            ('elapsed',   '<f8'),
+            ('cycle',     '<i8'),
+            ('eff_int',   '<f8'),
+            ('pressure',  '<f8'),
+            ('coadd_n',   '<i4'),
+            ('amplitudes', '<f4', (len(self.spectral_axis),)),
+        ])
+        self._rec  = np.zeros(1, dtype=self.dtype)
+        self._rows = 0
+
+    def open(self):
+        with open(self.base_path + '.json', 'w') as fh:
+            json.dump({
+                'dtype':         self.dtype.descr,
+                'record_bytes':  self.dtype.itemsize,
+                'spectral_axis': self.spectral_axis,
+                'metadata':      self.metadata,
+            }, fh, indent=2)
+        self._fh = open(self.base_path + '.bin', 'ab')
+
+    def handle(self, record):
+        if record.get('_gap') is not None or record['amplitudes'] is None:
+            return
+        rec = self._rec
+        rec['wall_time']  = record['wall_time']
+        rec['elapsed']    = record['elapsed']
+        rec['cycle']      = record['cycle_ct']
+        rec['eff_int']    = record['eff_int_pct'] or 0.0
+        rec['pressure']   = record['pressure']
+        rec['coadd_n']    = record['coadd_n'] or 1
+        rec['amplitudes'] = record['amplitudes']
+        with METRICS.span('writer.binary_write'):
+            self._fh.write(rec.tobytes())
+        self._rows += 1
+        if self._rows % self.flush_every == 0:
+            self._fh.flush()
+            os.fsync(self._fh.fileno())
+
+    def close(self):
+        self._fh.flush()
+        os.fsync(self._fh.fileno())
+        self._fh.close()
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+#  GUI
+# ──────────────────────────────────────────────────────────────────────────────
+
+class GUISink(Sink):
+    """
+    Emits every `cadence`-th record to VisualInterface.data_received.  The
+    signal crosses into the Qt main thread through a queued connection.
+    """
+
+    name     = 'gui'
+    lossless = False
+    maxsize  = 4
+
+    def __init__(self, gui, cadence=10, size_path=None):
+        super().__init__()
+        self.gui       = gui
+        self.cadence   = max(1, int(cadence))
+        self.size_path = size_path
+
+    def submit(self, record):
+        if record.get('_gap') is None and record['cycle_ct'] % self.cadence == 0:
+            super().submit(record)
+
+    def handle(self, record):
+        elapsed = record['elapsed']
+        try:
+            curr_mem = os.path.getsize(self.size_path) if self.size_path else 0
+        except OSError:
+            curr_mem = 0
+        pressure = record['pressure']
+        self.gui.data_received.emit({
+            'amplitudes':             record['amplitudes'],
+            'pressure':               pressure if pressure == pressure else 0,
+            'elapsed_time':           elapsed,
+            'file_size_mb':           curr_mem / (1024**2),
+            'gb_hr':                  (curr_mem / 1e9) / (elapsed / 3600) if elapsed > 0 else 0,
+            'cadence':                (record['cycle_ct'] + 1) / elapsed if elapsed > 0 else 0,
+            'cycle':                  record['cycle_ct'],
+            'cycle_time_ms':          record['cycle_time_ms'],
+            'instrumental_time_ms':   record['hw_wait_ms'],
+            'integration_efficiency': record['eff_int_pct'] or 0.0,
+        })
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+#  Network
+# ──────────────────────────────────────────────────────────────────────────────
+
+class NetworkSink(Sink):
+    """
+    Listens on host:port and streams every record as one line of JSON to all
+    connected clients (e.g. `nc localhost 5555`).  Clients that stall or
+    disconnect are dropped; acquisition is never affected.
+    """
+
+    name     = 'network'
+    lossless = False
+    maxsize  = 256
+
+    def __init__(self, host='127.0.0.1', port=5555):
+        super().__init__()
+        self.host    = host
+        self.port    = port
+        self.clients = []
+
+    def open(self):
+        self._server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self._server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._server.bind((self.host, self.port))
+        self._server.listen()
+        self._server.setblocking(False)
+        print(f"[Network Sink] Streaming records on {self.host}:{self.port}")
+
+    def _accept(self):
+        while True:
+            try:
+                conn, _ = self._server.accept()
+            except (BlockingIOError, OSError):
+                return
+            conn.settimeout(1.0)
+            self.clients.append(conn)
+
+    def handle(self, record):
+        self._accept()
+        if not self.clients:
+            return
+        payload = dict(record)
+        for key in ('amplitudes', 'sumsq'):
+            if payload.get(key) is not None:
+                payload[key] = list(payload[key])
+        line = (json.dumps(payload) + '\n').encode('utf-8')
+        for conn in list(self.clients):
+            try:
+                conn.sendall(line)
+            except OSError:
+                self.clients.remove(conn)
+                conn.close()
+
+    def close(self):
+        for conn in self.clients:
+            conn.close()
+        self._server.close()
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+#  Online analysis
+# ──────────────────────────────────────────────────────────────────────────────
+
+class OnlineAnalysisSink(Sink):
+    """
+    Running integration of the incoming spectra.  Keeps an O(N) running sum,
+    and every `report_every` records prints the integrated off-ROI noise std
+    and the ROI peak SNR (same ROI convention as Analysis/Utilities: the band
+    center ± sigma is excluded from the noise estimate).
+
+    The latest figures are kept in `self.latest` for other consumers.
+    """
+
+    name     = 'online'
+    lossless = False
+    maxsize  = 256
+
+    def __init__(self, spectral_axis, center_freq, sigma, report_every=100):
+        super().__init__()
+        axis = np.asarray(spectral_axis, dtype=np.float64)
+        self.roi          = (axis >= center_freq - sigma) & (axis <= center_freq + sigma)
+        self.report_every = max(1, int(report_every))
+        self.sum          = np.zeros(axis.shape[0], dtype=np.float64)
+        self.count        = 0
+        self.latest       = {}
+
+    def handle(self, record):
+        if record.get('_gap') is not None or record['amplitudes'] is None:
+            return
+        n = record['coadd_n'] or 1
+        self.sum   += np.asarray(record['amplitudes'], dtype=np.float64) * n
+        self.count += n
+
+        if record['cycle_ct'] % self.report_every == 0 and self.roi.any() and (~self.roi).any():
+            mean  = self.sum / self.count
+            off   = mean[~self.roi]
+            noise = off.std()
+            snr   = (mean[self.roi].max() - off.mean()) / noise if noise > 0 else float('nan')
+            self.latest = {'sweeps': self.count, 'noise_std': noise, 'roi_snr': snr}
+            METRICS.gauge('online.noise_std', noise)
+            METRICS.gauge('online.roi_snr', snr)
+            print(f"[Online] {self.count} sweeps  noise std {noise:.3e}  ROI SNR {snr:.2f}")
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+#  Command-line helpers
+# ──────────────────────────────────────────────────────────────────────────────
+
+def add_sink_args(parser):
+    """Register the optional-sink command-line options on an argparse parser."""
+    parser.add_argument('--binary', default=False, action='store_true',
+                        help='Also write a float32 binary log (.bin + .json sidecar)')
+    parser.add_argument('-stream_port', type=int, default=None,
+                        help='Stream JSON records to TCP clients on this local port')
+    parser.add_argument('--online', default=False, action='store_true',
+                        help='Run online integration/SNR analysis on the live sweeps')
+    parser.add_argument('-online_sigma', type=float, default=2.5e6,
+                        help='Half-width (Hz) of the ROI around the center frequency for --online')
@@ -1,5 +1,8 @@
 import pyvisa
 import time
+
+from Instrumentation import METRICS
+from Recovery import retry_with_backoff
  
  
 # Tolerance for floating-point readback comparisons (relative, 0.1%)
@@ -10,6 +13,54 @@ _MAX_RETRIES = 3
  
 # Delay between retries (seconds) — gives the instrument time to settle
 _RETRY_DELAY = 2.5
+
+# Bus formatting settings, written before anything else: (config key, default)
+_WRITE_ONLY_FORMAT = [
+    ('data_format',  'REAL, 32'),
+    ('byte_order',   'SWAP'),
+]
+
+# All settings that have a paired query command.
+# Each tuple: (config_key, default, set_cmd, query_cmd, value_type)
+# value_type: 'float' → numeric tolerance check
+#             'str'   → case-insensitive string prefix check
+#             'int'   → exact integer check
+_VERIFIED_SETTINGS = [
+    # (config key,          default,   set cmd key,            query cmd key,             type )
+    ('center_frequency',    2.5e9,     'set_center_frequency', 'query_center_frequency',  'float'),
+    ('reference_level',     0,         'set_reference_level',  'query_reference_level',   'float'),
+    ('span',                1e8,       'set_span',             'query_span',               'float'),
+    ('power_unit',          'DBM',     'set_power_unit',       'query_power_unit',         'str'  ),
+    ('num_points',          401,       'set_num_points',       'query_sweep_points',       'int'  ),
+    ('detector_mode',       'AVER',    'set_detector_mode',    'query_detector_mode',      'str'  ),
+    ('attenuation',         20,        'set_attenuation',      'query_attenuation',        'float'),
+    ('RBW',                 1e6,       'set_RBW',              'query_RBW',                'float'),
+    ('VBW',                 1e5,       'set_VBW',              'query_VBW',                'float'),
+    ('amplitude_space',     'LOG',     'set_amplitude_space',  'query_amplitude_space',    'str'  ),
+]
+
+# Write-only modes applied after the sweep time: (config key, default)
+_WRITE_ONLY_MODES = [
+    ('auto_sweep',       'OFF'),
+    ('display_on',       'ON'),
+    ('averaging_state',  'OFF'),
+    ('pre_amp',          'OFF'),
+]
+_MODE_COMMANDS = {
+    'auto_sweep':       'set_sweep_mode',
+    'display_on':       'set_display_on',
+    'averaging_state':  'set_averaging_state',
+    'pre_amp':          'set_pre_amp',
+}
+
+# Settings that move the frequency axis
+_AXIS_SETTINGS = {'center_frequency', 'span', 'num_points'}
+
+
+def _rooted(cmd):
+    """Root a SCPI command so it can follow another in a ';'-joined message."""
+    cmd = cmd.strip()
+    return cmd if cmd.startswith((':', '*')) else ':' + cmd
  
  
 class SpectrumAnalyzer():
@@ -29,123 +80,233 @@ class SpectrumAnalyzer():
             raise ConnectionError(f"Failed to initialize VISA Resource Manager: {e}")
  
         # ── Connect ────────────────────────────────────────────────────────
+        self._open_session()
+ 
+        self.commands  = config['commands']
+
+        # Last value successfully applied for every setting; apply_settings()
+        # only writes entries whose desired value differs from this cache.
+        self.settings  = {}
+        self.auto_sweep = False
+        self.spectral_axis = []
+
+        self.apply_settings()
+
+    def _open_session(self):
         try:
-            resource_string = config['visa']['resource_string']
+            resource_string = self.config['visa']['resource_string']
             self.instrument = self.rm.open_resource(resource_string)
-            self.instrument.timeout = config['visa'].get('timeout', 5000)
+            self.instrument.timeout = self.config['visa'].get('timeout', 5000)
         except Exception as e:
             raise ConnectionError(f"Failed to connect to Spectrum Analyzer: {e}")
- 
-        self.commands  = config['commands']
-        visa           = config['visa']
- 
+
+    # ── Recovery ───────────────────────────────────────────────────────────────
+
+    def reconnect(self, stop_event=None, base_delay=0.5, max_delay=30.0, max_attempts=None):
+        """
+        Reopen a dead VISA session with exponential backoff and restore the
+        cached configuration.  Returns True once the instrument answers again,
+        False if `stop_event` was set or the attempts ran out.
+        """
+        try:
+            self.instrument.close()
+        except Exception:
+            pass
+
+        def attempt():
+            self._open_session()
+            self.restore_settings()
+
+        attempts = retry_with_backoff(attempt, 'SA', log=lambda m: self.log('error', m),
+                                      stop_event=stop_event, base_delay=base_delay,
+                                      max_delay=max_delay, max_attempts=max_attempts)
+        if attempts:
+            METRICS.incr('sa.reconnects')
+            self.log('message', f'[SA] Session restored after {attempts} attempt(s).')
+        return bool(attempts)
+
+    def restore_settings(self):
+        """
+        Re-send every cached (previously verified) setting as one concatenated
+        SCPI message with a single OPC, then read all queryable settings back
+        in one concatenated query.  Only settings whose readback disagrees go
+        through the slow one-by-one _verified_write path.  Raises if the
+        instrument does not answer, so reconnect() keeps retrying.
+        """
+        cached = self.settings
+        writes = self._setting_writes(cached)
+        checks = []   # (label, set cmd, query cmd, desired, vtype)
+        for cfg_key, _, set_cmd_key, query_cmd_key, vtype in _VERIFIED_SETTINGS:
+            if cfg_key in cached:
+                checks.append((cfg_key, self.commands[set_cmd_key],
+                               self.commands[query_cmd_key], cached[cfg_key], vtype))
+        if not self.auto_sweep and cached.get('sweep_time') is not None:
+            checks.append(('sweep_time', self.commands['set_sweep_time'],
+                           self.commands['query_sweep_time'], cached['sweep_time'] / 1000.0, 'float'))
+
+        t0 = time.perf_counter()
+        self.instrument.clear()
+        self.instrument.query(';'.join(_rooted(w) for w in writes) + ';*OPC?')
+
+        readbacks = []
+        if checks:
+            raw = self.instrument.query(';'.join(_rooted(c[2]) for c in checks))
+            readbacks = [r.strip() for r in raw.strip().split(';')]
+        if len(readbacks) != len(checks):
+            readbacks = [None] * len(checks)
+
+        failed = 0
+        for (label, set_cmd, query_cmd, desired, vtype), rb in zip(checks, readbacks):
+            if rb is None or not self._check_readback(desired, rb, vtype):
+                failed += 1
+                if not self._verified_write(set_cmd, query_cmd, desired, vtype, label):
+                    raise ConnectionError(f'{label} could not be restored')
+
+        METRICS.observe_ms('sa.restore', (time.perf_counter() - t0) * 1000)
+        print(f'[SA] Restored {len(writes)} settings in bulk '
+              f'({failed} re-verified individually).')
+
+    # ── Settings ───────────────────────────────────────────────────────────────
+
+    def _setting_writes(self, values):
+        """SCPI write strings for `values` ({setting: value}) in apply order."""
+        writes = [self.commands[f'set_{key}'].replace('value', str(values[key]))
+                  for key, _ in _WRITE_ONLY_FORMAT if key in values]
+        writes.extend(self.commands[set_cmd_key].replace('value', str(values[cfg_key]))
+                      for cfg_key, _, set_cmd_key, _, _ in _VERIFIED_SETTINGS if cfg_key in values)
+        if 'auto_sweep_time' in values:
+            writes.append(self.commands['set_sweep_time_auto'].replace('value', str(values['auto_sweep_time'])))
+        auto = values.get('auto_sweep_time', self.settings.get('auto_sweep_time', 0))
+        if values.get('sweep_time') is not None and auto != 1:
+            writes.append(self.commands['set_sweep_time'].replace('value', str(values['sweep_time'] / 1000.0)))
+        writes.extend(self.commands[_MODE_COMMANDS[key]].replace('value', str(values[key]))
+                      for key, _ in _WRITE_ONLY_MODES if key in values)
+        return writes
+
+    def hop(self, overrides, spectral_axis=None):
+        """
+        Fast reconfiguration between windows that were already verified once
+        with apply_settings(): the settings that differ from the cache go out
+        as one concatenated SCPI message with a single *OPC?, without
+        readback, settling sweep or axis queries.  `spectral_axis` is the
+        window's precomputed axis.
+
+        Returns:
+            dict: The settings that were written.
+        """
+        visa = dict(self.config['visa'])
+        visa.update(overrides)
+        desired = self.desired_settings(visa)
+        changed = {k: v for k, v in desired.items()
+                   if k not in self.settings or self.settings[k] != v}
+
+        writes = self._setting_writes(changed)
+        if writes:
+            self.instrument.query(';'.join(_rooted(w) for w in writes) + ';*OPC?')
+            self.settings.update(changed)
+            if 'auto_sweep_time' in changed:
+                self.auto_sweep = changed['auto_sweep_time'] == 1
+        if spectral_axis is not None:
+            self.spectral_axis = spectral_axis
+        return changed
+
+    def desired_settings(self, visa):
+        """Resolve every setting in `visa` (with defaults) into a flat dict."""
+        desired = {key: visa.get(key, default) for key, default in _WRITE_ONLY_FORMAT}
+        for cfg_key, default, _, _, vtype in _VERIFIED_SETTINGS:
+            value = visa.get(cfg_key, default)
+            # Numbers given as text (e.g. YAML '5.0e6') compare as numbers
+            if isinstance(value, str) and vtype != 'str':
+                value = int(value) if vtype == 'int' else float(value)
+            desired[cfg_key] = value
+        desired['auto_sweep_time'] = int(visa.get('auto_sweep_time', 0))
+        desired['sweep_time'] = visa.get('sweep_time', None)
+        for key, default in _WRITE_ONLY_MODES:
+            desired[key] = visa.get(key, default)
+        return desired
+
+    def apply_settings(self, overrides=None):
+        """
+        Bring the instrument to config['visa'] updated with `overrides`,
+        writing only the settings that differ from the last applied values.
+        The first call (from __init__) writes everything.  Overrides are not
+        sticky: a later call without them restores the config values.
+
+        Returns:
+            dict: The settings that were written, {key: value}.
+        """
+        visa = dict(self.config['visa'])
+        if overrides:
+            visa.update(overrides)
+        desired = self.desired_settings(visa)
+        changed = {k: v for k, v in desired.items()
+                   if k not in self.settings or self.settings[k] != v}
+
         # ── Data format & byte order (write-only, no numeric readback) ────
         # These are bus-level formatting commands; the instrument has no
         # corresponding query so we just write-and-OPC each one.
-        self._write_opc(
-            self.commands['set_data_format'],
-            visa.get('data_format', 'REAL, 32'),
-            label='data_format'
-        )
-        self._write_opc(
-            self.commands['set_byte_order'],
-            visa.get('byte_order', 'SWAP'),
-            label='byte_order'
-        )
- 
+        for key, _ in _WRITE_ONLY_FORMAT:
+            if key in changed and self._write_opc(self.commands[f'set_{key}'],
+                                                  desired[key], label=key):
+                self.settings[key] = desired[key]
+
         # ── All settings that have a paired query command ──────────────────
-        # Each tuple: (config_key, default, set_cmd, query_cmd, value_type)
-        # value_type: 'float' → numeric tolerance check
-        #             'str'   → case-insensitive string prefix check
-        #             'int'   → exact integer check
- 
-        settings = [
-            # (config key,          default,   set cmd key,            query cmd key,             type )
-            ('center_frequency',    2.5e9,     'set_center_frequency', 'query_center_frequency',  'float'),
-            ('reference_level',     0,         'set_reference_level',  'query_reference_level',   'float'),
-            ('span',                1e8,       'set_span',             'query_span',               'float'),
-            ('power_unit',          'DBM',     'set_power_unit',       'query_power_unit',         'str'  ),
-            ('num_points',          401,       'set_num_points',       'query_sweep_points',       'int'  ),
-            ('detector_mode',       'AVER',    'set_detector_mode',    'query_detector_mode',      'str'  ),
-            ('attenuation',         20,        'set_attenuation',      'query_attenuation',        'float'),
-            ('RBW',                 1e6,       'set_RBW',              'query_RBW',                'float'),
-            ('VBW',                 1e5,       'set_VBW',              'query_VBW',                'float'),
-            ('amplitude_space',     'LOG',     'set_amplitude_space',  'query_amplitude_space',    'str'  ),
-        ]
- 
-        for cfg_key, default, set_cmd_key, query_cmd_key, vtype in settings:
-            desired = visa.get(cfg_key, default)
-            self._verified_write(
+        for cfg_key, _, set_cmd_key, query_cmd_key, vtype in _VERIFIED_SETTINGS:
+            if cfg_key not in changed:
+                continue
+            if self._verified_write(
                 set_cmd   = self.commands[set_cmd_key],
                 query_cmd = self.commands[query_cmd_key],
-                desired   = desired,
+                desired   = desired[cfg_key],
                 vtype     = vtype,
                 label     = cfg_key,
-            )
- 
+            ):
+                self.settings[cfg_key] = desired[cfg_key]
+
         # ── Sweep time (special: auto vs manual) ──────────────────────────
-        auto_sweep = int(visa.get('auto_sweep_time', 0))
-        manual_sweep_ms = visa.get('sweep_time', None)
- 
-        if auto_sweep != 0 and manual_sweep_ms is not None:
-            self.log('error',
-                     'MAJOR ERROR: auto_sweep_time is enabled while sweep_time '
-                     'is also specified! Overriding with manual sweep_time.')
- 
-        # Always write the auto setting first so it is in a known state
-        self._write_opc(
-            self.commands['set_sweep_time_auto'],
-            str(auto_sweep),
-            label='auto_sweep_time'
-        )
- 
-        if auto_sweep != 1:
-            # Manual sweep time — write, OPC, then readback verify
-            sweep_time_s = manual_sweep_ms / 1000.0
-            self._verified_write(
-                set_cmd   = self.commands['set_sweep_time'],
-                query_cmd = self.commands['query_sweep_time'],
-                desired   = sweep_time_s,
-                vtype     = 'float',
-                label     = 'sweep_time',
-            )
-            self.auto_sweep = False
-        else:
-            self.auto_sweep = True
- 
-        # ── Sweep mode (single / continuous) ──────────────────────────────
-        # No standard query command for this; write-and-OPC only.
-        sweep_mode = visa.get('auto_sweep', 'OFF')
-        self._write_opc(
-            self.commands['set_sweep_mode'],
-            sweep_mode,
-            label='auto_sweep'
-        )
- 
-        # ── Display on/off ─────────────────────────────────────────────────
-        display_on = visa.get('display_on', 'ON')
-        self._write_opc(
-            self.commands['set_display_on'],
-            display_on,
-            label='display_on'
-        )
- 
-        # ── Averaging State ──────────────────────────────────────────
-        averaging_state = visa.get('averaging_state', 'OFF')
-        self._write_opc(
-            self.commands['set_averaging_state'],
-            averaging_state,
-            label='averaging_state'
-        )
-
-        # ── Pre-amp ────────────────────────────────────────────────────────
-        pre_amp = visa.get('pre_amp', 'OFF')
-        self._write_opc(
-            self.commands['set_pre_amp'],
-            pre_amp,
-            label='pre_amp'
-        )
- 
+        auto_sweep = desired['auto_sweep_time']
+        manual_sweep_ms = desired['sweep_time']
+
+        if 'auto_sweep_time' in changed or 'sweep_time' in changed:
+            if auto_sweep != 0 and manual_sweep_ms is not None:
+                self.log('error',
+                         'MAJOR ERROR: auto_sweep_time is enabled while sweep_time '
+                         'is also specified! Overriding with manual sweep_time.')
+
+            # Always write the auto setting first so it is in a known state
+            if self._write_opc(
+                self.commands['set_sweep_time_auto'],
+                str(auto_sweep),
+                label='auto_sweep_time'
+            ):
+                self.settings['auto_sweep_time'] = auto_sweep
+
+            if auto_sweep != 1:
+                # Manual sweep time — write, OPC, then readback verify
+                sweep_time_s = manual_sweep_ms / 1000.0
+                if self._verified_write(
+                    set_cmd   = self.commands['set_sweep_time'],
+                    query_cmd = self.commands['query_sweep_time'],
+                    desired   = sweep_time_s,
+                    vtype     = 'float',
+                    label     = 'sweep_time',
+                ):
+                    self.settings['sweep_time'] = manual_sweep_ms
+                self.auto_sweep = False
+            else:
+                self.settings['sweep_time'] = manual_sweep_ms
+                self.auto_sweep = True
+
+        # ── Sweep mode, display, averaging state, pre-amp ─────────────────
+        # No standard query command for these; write-and-OPC only.
+        for key, _ in _WRITE_ONLY_MODES:
+            if key in changed and self._write_opc(self.commands[_MODE_COMMANDS[key]],
+                                                  desired[key], label=key):
+                self.settings[key] = desired[key]
+
+        if not changed:
+            return changed
+
         # ── Settling sweep: apply all settings and discard result ──────────
         try:
             self.instrument.write(self.commands['initiate_sweep'])
@@ -157,8 +318,14 @@ class SpectrumAnalyzer():
             print('[SpectrumAnalyzer] Settling sweep complete.')
         except Exception as e:
             self.log('error', f"Error during settling sweep: {e}")
- 
+
         # ── Frequency axis ─────────────────────────────────────────────────
+        if not self.spectral_axis or changed.keys() & _AXIS_SETTINGS:
+            self._query_spectral_axis()
+
+        return changed
+
+    def _query_spectral_axis(self):
         try:
             self.start_freq       = self.instrument.query(self.commands['query_frequency_start'])
             self.stop_freq        = self.instrument.query(self.commands['query_frequency_stop'])
@@ -178,6 +345,7 @@ class SpectrumAnalyzer():
         """
         Write a setting, wait for OPC, read it back, and confirm it matches.
         Retries up to `max_retries` times before logging an error and giving up.
+        Returns True once the readback matched.
  
         Parameters
         ----------
@@ -205,7 +373,7 @@ class SpectrumAnalyzer():
  
                 if match:
                     print(f'[SA] {label} = {desired}  ✓  (readback: {readback_raw})')
-                    return
+                    return True
                 else:
                     self.log('error',
                              f'[SA] {label}: readback mismatch on attempt {attempt}/{max_retries} '
@@ -221,6 +389,7 @@ class SpectrumAnalyzer():
         self.log('error',
                  f'[SA] {label}: FAILED to verify after {max_retries} attempts. '
                  f'Continuing with potentially incorrect setting.')
+        return False
  
     def _check_readback(self, desired, readback_raw, vtype):
         """Return True if readback matches desired within tolerance."""
@@ -248,15 +417,18 @@ class SpectrumAnalyzer():
     def _write_opc(self, cmd, value, label):
         """
         Write a setting that has no corresponding query (data format, byte
-        order, sweep mode, display, pre-amp).  Waits for OPC only.
+        order, sweep mode, display, pre-amp).  Waits for OPC only and returns
+        True if the write went through.
         """
         try:
             self.instrument.write(cmd.replace('value', str(value)))
             while int(self.instrument.query(self.commands['operation_complete_query'])) != 1:
                 time.sleep(0.1)
             print(f'[SA] {label} = {value}')
+            return True
         except Exception as e:
             self.log('error', f'[SA] Error setting {label} to {value!r}: {e}')
+            return False
  
     # ── Runtime methods ────────────────────────────────────────────────────────
  
@@ -270,6 +442,7 @@ class SpectrumAnalyzer():
                 # 1. ATOMIC SWEEP: Tell it to sweep AND wait for completion in one string.
                 # This prevents Python from spamming the bus while the instrument is busy.
                 self.instrument.query(f"{self.commands['initiate_sweep']};*OPC?")
+                t_opc = time.perf_counter()
 
                 # 2. Now that we know for a fact it is done, safely fetch the data.
                 amplitudes = self.instrument.query_binary_values(
@@ -281,6 +454,11 @@ class SpectrumAnalyzer():
                 t1 = time.perf_counter()
                 fetch_ms = (t1 - t0) * 1000
 
+                METRICS.observe_ms('sa.opc_wait', (t_opc - t0) * 1000)
+                METRICS.observe_ms('sa.transfer', (t1 - t_opc) * 1000)
+                METRICS.observe_ms('sa.fetch', fetch_ms)
+                METRICS.incr('sa.sweeps')
+
                 # 3. We no longer re-arm the sweep here. It will be armed at the 
                 # start of the next cycle. This guarantees no dropped commands.
 
@@ -293,8 +471,12 @@ class SpectrumAnalyzer():
 
             except pyvisa.errors.VisaIOError as e:
                 # If a timeout DOES happen (e.g., sweep is actually longer than 10s)
+                METRICS.incr('sa.visa_errors')
                 print(f"\n[SA RECOVERY] VISA Timeout! Clearing bus...")
-                self.instrument.clear()
+                try:
+                    self.instrument.clear()
+                except Exception:
+                    pass
                 raise RuntimeError(f"Analyzer failed to complete sweep within 10s: {e}")
                          
     def get_instrument_data(self):